@@ -769,12 +769,13 @@ def build_legend(displaced_labels, width):
 def generate_diagram(filepath, layers, title, subject):
     """Generates the stack diagram and writes it to a PDF file.
 
-    :param filepath: the path to the PDF file that should be written
+    :param filepath: the path to the PDF file that should be written, or a
+      binary stream the PDF is written to
     :param layers: the layers of the stack in chronological order
     :param title: the title of the PDF file
     :param subject: the subject of the PDF file
 
-    :type filepath: Path
+    :type filepath: Path or binary stream
     :type layers: list of `Layer`
     :type title: str
     :type subject: str
@@ -798,7 +799,8 @@ def generate_diagram(filepath, layers, title, subject):
         height += 2 * red_line_space
         total_margin += red_line_space
 
-    c = canvas.Canvas(str(filepath), pagesize=(width, height), pageCompression=True)
+    c = canvas.Canvas(filepath if hasattr(filepath, "write") else str(filepath), pagesize=(width, height),
+                      pageCompression=True)
     c.setAuthor("JuliaBase samples database")
     c.setTitle(title)
     c.setSubject(subject)
@@ -208,9 +208,10 @@ class Layout:
     def generate_pdf(self, filename):
         """Draws the layout and writes it to a PDF file.
 
-        :param filename: the full path to the PDF that should be created
+        :param filename: the full path to the PDF that should be created, or a
+          binary stream the PDF is written to
 
-        :type filename: str
+        :type filename: str or binary stream
         """
         canvas = Canvas(filename, pagesize=(self.width, self.height))
         self.draw_layout(canvas)
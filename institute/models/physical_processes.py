@@ -38,7 +38,7 @@ from jb_common import search, model_fields
 from jb_common.utils.base import generate_permissions
 import jb_common.utils.base
 import samples.utils.views as utils
-from samples.utils.plots import PlotError
+from samples.utils.plots import PlotError, read_cached_columns
 import institute.layouts
 import institute.utils.base
 
@@ -103,7 +103,7 @@ class PDSMeasurement(PhysicalProcess):
         identifying_field = "number"
 
     def draw_plot(self, axes, plot_id, filename, for_thumbnail):
-        x_values, y_values = numpy.loadtxt(filename, comments="#", unpack=True)
+        x_values, y_values = read_cached_columns(filename, numpy.loadtxt, comments="#", unpack=True)
         axes.semilogy(x_values, y_values)
         axes.set_xlabel(_("energy in eV"))
         axes.set_ylabel(_("α in cm⁻¹"))
@@ -176,7 +176,8 @@ class SolarsimulatorMeasurement(PhysicalProcess):
         return data_node
 
     def draw_plot(self, axes, plot_id, filename, for_thumbnail):
-        x_values, y_values = institute.utils.base.read_solarsimulator_plot_file(filename, position=plot_id)
+        x_values, y_values = read_cached_columns(filename, institute.utils.base.read_solarsimulator_plot_file,
+                                                 position=plot_id)
         y_values = 1000 * numpy.array(y_values)
         related_cell = self.cells.get(position=plot_id)
         if not related_cell.area:
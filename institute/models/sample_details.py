@@ -235,11 +235,8 @@ class SampleDetails(models.Model):
         """
         data_node = DataNode(self)
         data_node.children.extend(layer.get_data_for_table_export() for layer in self.informal_layers.iterator())
-        if self.sample.split_origin:
-                ancestor_data = self.sample.split_origin.parent.get_data_for_table_export()
-                data_node.children.extend(ancestor_data.children)
-        for process in self.sample.processes.order_by("timestamp").iterator():
-            data_node.children.append(process.actual_instance.get_data_for_table_export())
+        data_node.children.extend(self.sample.get_ancestor_data_for_table_export())
+        data_node.children.extend(self.sample.get_process_data_for_table_export())
         return data_node
 
     @classmethod
@@ -0,0 +1,114 @@
+# This file is part of JuliaBase-Institute, see http://www.juliabase.org.
+# Copyright © 2008–2022 Forschungszentrum Jülich GmbH, Jülich, Germany
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# In particular, you may modify this file freely and even remove this license,
+# and offer it as part of a web service, as long as you do not distribute it.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import tempfile, shutil
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+import PIL.Image
+from django.test import SimpleTestCase, RequestFactory, override_settings
+from jb_common.utils import blobs
+from jb_common.utils.blobs.backends import Filesystem, PostgreSQL
+from jb_common.utils.base import blob_response
+from samples.views.result import generate_thumbnail
+
+
+class BlobResponseTest(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.storage = Filesystem(Path(self.root))
+        patcher = mock.patch.object(blobs, "storage", self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.content = bytes(range(256)) * 1000
+        with self.storage.open("results/1/data.pdf", "w") as file_:
+            file_.write(self.content)
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def get(self, **headers):
+        response = blob_response(self.factory.get("/", **headers), "results/1/data.pdf")
+        return response, b"".join(response.streaming_content) if response.streaming else response.content
+
+    def test_full_and_not_modified(self):
+        response, content = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(content, self.content)
+        response, content = self.get(HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        response, content = self.get(HTTP_RANGE="bytes=100000-199999")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 100000-199999/256000")
+        self.assertEqual(content, self.content[100000:200000])
+        response, content = self.get(HTTP_RANGE="bytes=-10")
+        self.assertEqual(content, self.content[-10:])
+        response, content = self.get(HTTP_RANGE="bytes=256000-")
+        self.assertEqual(response.status_code, 416)
+        response, content = self.get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"outdated"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(content), 256000)
+
+    @override_settings(THUMBNAIL_WIDTH=40)
+    def test_thumbnail(self):
+        image = BytesIO()
+        PIL.Image.new("CMYK", (200, 100)).save(image, "JPEG")
+        with self.storage.open("results/1/0.jpeg", "w") as file_:
+            file_.write(image.getvalue())
+        thumbnail = PIL.Image.open(generate_thumbnail(SimpleNamespace(image_type="jpeg"), "results/1/0.jpeg"))
+        self.assertEqual(thumbnail.format, "PNG")
+        self.assertEqual(thumbnail.size, (40, 20))
+
+
+class PostgreSQLPoolTest(SimpleTestCase):
+
+    def setUp(self):
+        def connect(*args, **kwargs):
+            connection = mock.MagicMock()
+            connection.closed = 0
+            return connection
+        patcher = mock.patch("psycopg2.connect", side_effect=connect)
+        self.connect = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.storage = PostgreSQL("juliabase", "juliabase", "", "localhost", max_connections=2,
+                                  connection_timeout=0.1)
+
+    def test_reuse(self):
+        connection = self.storage.get_connection()
+        self.storage.put_connection(connection)
+        number_of_connects = self.connect.call_count
+        for i in range(3):
+            self.assertIs(self.storage.get_connection(), connection)
+            self.storage.put_connection(connection)
+        self.assertEqual(self.connect.call_count, number_of_connects)
+        connection.close.assert_not_called()
+
+    def test_timeout(self):
+        connections = [self.storage.get_connection() for i in range(2)]
+        with self.assertRaises(TimeoutError):
+            self.storage.get_connection()
+        self.storage.put_connection(connections[0])
+        self.assertIs(self.storage.get_connection(), connections[0])
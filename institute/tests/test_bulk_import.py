@@ -0,0 +1,78 @@
+# This file is part of JuliaBase-Institute, see http://www.juliabase.org.
+# Copyright © 2008–2022 Forschungszentrum Jülich GmbH, Jülich, Germany
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# In particular, you may modify this file freely and even remove this license,
+# and offer it as part of a web service, as long as you do not distribute it.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+from django.test import TestCase, override_settings
+from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.db.models import signals
+from django.contrib.auth.models import User
+from institute.models import SolarsimulatorMeasurement, SolarsimulatorCellMeasurement
+
+
+@override_settings(ROOT_URLCONF="institute.tests.urls")
+class BulkImportTest(TestCase):
+    fixtures = ["test_main"]
+
+    def setUp(self):
+        self.client = Client()
+        assert self.client.login(username="juliabase", password="12345")
+        self.sample = User.objects.get(username="juliabase").my_samples.all()[0]
+
+    def get_item(self, data_file, **kwargs):
+        item = {"sample": self.sample.id, "timestamp": "2020-01-01 12:00:00", "timestamp_inaccuracy": 0,
+                "operator": User.objects.get(username="juliabase").id, "irradiation": "AM1.5", "temperature": 25,
+                "0-position": "1", "0-data_file": data_file, "1-position": "2", "1-data_file": data_file}
+        item.update(kwargs)
+        return item
+
+    def test_per_item_results(self):
+        number_of_measurements = SolarsimulatorMeasurement.objects.count()
+        items = [self.get_item("a.dat"), self.get_item("b.dat", irradiation="invalid"), self.get_item("c.dat"),
+                 self.get_item("a.dat")]
+        response = self.client.post("/solarsimulator_measurements/bulk_add/", json.dumps(items),
+                                    content_type="application/json", HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        self.assertEqual([isinstance(result, int) for result in results], [True, False, True, False])
+        self.assertEqual(results[1][0], 1)
+        self.assertIn("irradiation", results[1][1])
+        self.assertEqual(results[3][0], 5)
+        self.assertEqual(SolarsimulatorMeasurement.objects.count(), number_of_measurements + 2)
+        measurement = SolarsimulatorMeasurement.objects.get(pk=results[2])
+        self.assertEqual(list(measurement.samples.all()), [self.sample])
+        self.assertEqual([(cell.position, cell.data_file) for cell in measurement.cells.all()],
+                         [("1", "c.dat"), ("2", "c.dat")])
+
+    def test_bulk_inserted_cells(self):
+        saved_cells = []
+        def receiver(sender, instance, created, **kwargs):
+            saved_cells.append((instance.pk, created))
+        signals.post_save.connect(receiver, sender=SolarsimulatorCellMeasurement)
+        self.addCleanup(signals.post_save.disconnect, receiver, sender=SolarsimulatorCellMeasurement)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/solarsimulator_measurements/bulk_add/",
+                                        json.dumps([self.get_item("d.dat")]), content_type="application/json",
+                                        HTTP_ACCEPT="application/json")
+        measurement = SolarsimulatorMeasurement.objects.get(pk=response.json()[0])
+        self.assertEqual(saved_cells, [(cell.pk, True) for cell in measurement.cells.order_by("position")])
+        insert = 'INSERT INTO "{}"'.format(SolarsimulatorCellMeasurement._meta.db_table)
+        self.assertEqual(len([query for query in queries if query["sql"].startswith(insert)]), 1)
@@ -0,0 +1,151 @@
+# This file is part of JuliaBase-Institute, see http://www.juliabase.org.
+# Copyright © 2008–2022 Forschungszentrum Jülich GmbH, Jülich, Germany
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# In particular, you may modify this file freely and even remove this license,
+# and offer it as part of a web service, as long as you do not distribute it.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import threading, tempfile, shutil, datetime, os
+from io import BytesIO
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.client import Client, RequestFactory
+from django.core.cache import cache
+import django.utils.timezone
+from django.http import HttpResponse
+from jb_common.middleware import CacheStatisticsMiddleware
+from jb_common.utils.base import get_cache_generations, bump_cache_generation, get_cached_bytes_stream, \
+    get_from_cache, get_many_from_cache, cache_hit_rate
+from institute.models import FiveChamberDeposition
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                       "LOCATION": "cache-generations-test"}})
+class CacheGenerationsTest(SimpleTestCase):
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_bump(self):
+        generations = get_cache_generations(["sample:1", "sample:2"])
+        self.assertEqual(get_cache_generations(["sample:1", "sample:2"]), generations)
+        bump_cache_generation("sample:1")
+        self.assertEqual(get_cache_generations(["sample:1", "sample:2"]),
+                         {"sample:1": generations["sample:1"] + 1, "sample:2": generations["sample:2"]})
+
+    def test_concurrent_bumps(self):
+        generation = get_cache_generations(["process:1"])["process:1"]
+        threads = [threading.Thread(target=lambda: [bump_cache_generation("process:1") for i in range(50)])
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(get_cache_generations(["process:1"])["process:1"], generation + 8 * 50)
+
+    def test_lost_counter(self):
+        generation = get_cache_generations(["sample:1"])["sample:1"]
+        cache.delete("generation:sample:1")
+        bump_cache_generation("sample:1")
+        self.assertGreater(get_cache_generations(["sample:1"])["sample:1"], generation)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                       "LOCATION": "cache-statistics-test"}})
+class CacheStatisticsTest(SimpleTestCase):
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_flush_once_per_request(self):
+        cache.set_many({"a": 1, "b": 2})
+        def view(request):
+            get_from_cache("a")
+            get_from_cache("c")
+            get_many_from_cache(["a", "b", "d"])
+            self.assertIsNone(cache.get("samples-cache-hits"))
+            self.assertIsNone(cache.get("samples-cache-misses"))
+            return HttpResponse()
+        CacheStatisticsMiddleware(view)(RequestFactory().get("/"))
+        self.assertEqual(cache.get("samples-cache-hits"), 3)
+        self.assertEqual(cache.get("samples-cache-misses"), 2)
+        self.assertEqual(cache_hit_rate(), 0.6)
+
+    def test_outside_of_request(self):
+        get_from_cache("a")
+        self.assertEqual(cache.get("samples-cache-misses"), 1)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                       "LOCATION": "artefact-cache-test"}})
+class ArtefactCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        self.cache_root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        cache.clear()
+        shutil.rmtree(self.cache_root)
+
+    def test_freshness_and_eviction(self):
+        calls = []
+        def generator(content):
+            calls.append(content)
+            return BytesIO(content)
+        timestamp = datetime.datetime(2020, 1, 1)
+        with self.settings(CACHE_ROOT=self.cache_root, ARTEFACT_CACHE_SIZE=1500):
+            for i in range(2):
+                with get_cached_bytes_stream("plots/a.pdf", lambda: generator(b"a" * 1000), timestamps=[timestamp]) \
+                     as stream:
+                    self.assertEqual(stream.read(), b"a" * 1000)
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(cache.get("artefact:plots/a.pdf")[1], 1000)
+            get_cached_bytes_stream("plots/a.pdf", lambda: generator(b"b" * 1000),
+                                    timestamps=[timestamp + datetime.timedelta(seconds=1)])
+            self.assertEqual(len(calls), 2)
+            artefacts = os.path.join(self.cache_root, "artefacts")
+            self.assertEqual(len(os.listdir(artefacts)), 1)
+            get_cached_bytes_stream("plots/c.pdf", lambda: generator(b"c" * 1000))
+            self.assertEqual(len(os.listdir(artefacts)), 1)
+
+
+@override_settings(ROOT_URLCONF="institute.tests.urls",
+                   CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                       "LOCATION": "lab-notebook-cache-test"}})
+class LabNotebookCacheTest(TestCase):
+    fixtures = ["test_main"]
+
+    def setUp(self):
+        self.client = Client()
+        assert self.client.login(username="juliabase", password="12345")
+        self.deposition = FiveChamberDeposition.objects.all()[0]
+        timestamp = django.utils.timezone.localtime(self.deposition.timestamp)
+        self.generation_names = [FiveChamberDeposition.get_lab_notebook_generation_name(timestamp.year, month)
+                                 for month in (timestamp.month, timestamp.month % 12 + 1)]
+        self.url = "/5-chamber_depositions/lab_notebook/{0}/{1}".format(timestamp.year, timestamp.month)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_invalidation_of_month(self):
+        self.assertNotContains(self.client.get(self.url), "Cached month")
+        generations = get_cache_generations(self.generation_names)
+        self.deposition.comments = "Cached month"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.deposition.save()
+        new_generations = get_cache_generations(self.generation_names)
+        self.assertNotEqual(new_generations[self.generation_names[0]], generations[self.generation_names[0]])
+        self.assertEqual(new_generations[self.generation_names[1]], generations[self.generation_names[1]])
+        self.assertContains(self.client.get(self.url), "Cached month")
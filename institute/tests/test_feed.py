@@ -0,0 +1,113 @@
+# This file is part of JuliaBase-Institute, see http://www.juliabase.org.
+# Copyright © 2008–2022 Forschungszentrum Jülich GmbH, Jülich, Germany
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# In particular, you may modify this file freely and even remove this license,
+# and offer it as part of a web service, as long as you do not distribute it.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+from unittest import mock
+from xml.etree import ElementTree
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from jb_common.models import Topic
+from jb_common.signals import maintain
+from samples import models
+from institute.models import FiveChamberDeposition
+from samples.utils.views import Reporter
+from samples.views.feed import get_feed_entries, render_entries
+
+
+namespace = "{http://www.w3.org/2005/Atom}"
+
+
+@override_settings(ROOT_URLCONF="institute.tests.urls",
+                   CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                       "LOCATION": "feed-test"}})
+class FeedTest(TestCase):
+    fixtures = ["test_main"]
+
+    def setUp(self):
+        user = User.objects.get(username="juliabase")
+        sample = models.Sample.objects.first()
+        self.entries = []
+        for i in range(3):
+            entry = models.FeedEditedSamples.objects.create(originator=user, description="edited")
+            entry.samples.add(sample)
+            entry.users.add(user)
+            self.entries.append(entry)
+        self.orphan = models.FeedEditedSamples.objects.create(originator=user, description="orphaned")
+        self.orphan.users.add(user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_pagination(self):
+        ids = []
+        url = "/feeds/juliabase+b45a8775d0"
+        with mock.patch("samples.views.feed.entries_per_page", 2):
+            while url:
+                feed = ElementTree.fromstring(self.client.get(url).content)
+                ids.extend(entry.find(namespace + "id").text.rpartition(":")[2]
+                           for entry in feed.iter(namespace + "entry"))
+                next_link = feed.find(namespace + "link[@rel='next']")
+                url = next_link.attrib["href"].partition("testserver")[2] if next_link is not None else None
+        self.assertEqual(sorted(ids), sorted(entry.sha1_hash for entry in self.entries))
+
+    def test_process_entry_update(self):
+        user = User.objects.get(username="juliabase")
+        process = FiveChamberDeposition.objects.filter(samples__isnull=False)[0]
+        entry = models.FeedNewPhysicalProcess.objects.create(originator=user, process=process)
+        sample = process.samples.all()[0]
+        self.assertIn(sample.name, render_entries([entry], user)[0][2])
+        sample.name = "renamed-sample"
+        with self.captureOnCommitCallbacks(execute=True):
+            sample.save()
+        self.assertIn("renamed-sample", render_entries([entry], user)[0][2])
+
+    def test_orphan_cleanup(self):
+        maintain.send(sender=None)
+        self.assertFalse(models.FeedEntry.objects.filter(pk=self.orphan.pk).exists())
+        self.assertEqual(models.FeedEntry.objects.filter(pk__in=[entry.pk for entry in self.entries]).count(), 3)
+
+
+@override_settings(ROOT_URLCONF="institute.tests.urls")
+class FanOutOnReadTest(TestCase):
+    fixtures = ["test_main"]
+
+    def get_feeds(self):
+        originator = User.objects.get(username="juliabase")
+        sample = models.Sample.objects.filter(watchers__isnull=False, topic__isnull=False).distinct()[0]
+        old_topic = sample.topic
+        sample.topic = Topic.objects.exclude(pk=old_topic.pk)[0]
+        sample.save()
+        reporter = Reporter(originator)
+        reporter.report_changed_sample_topic([sample], old_topic, {"description": "moved", "important": True})
+        reporter.report_edited_samples([sample], {"description": "edited", "important": True})
+        Reporter(originator).report_edited_samples([sample], {"description": "edited again", "important": False})
+        feeds = {user.username: [entry.actual_instance.description for entry in get_feed_entries(user, 10)]
+                 for user in User.objects.all()}
+        models.FeedEntry.objects.all().delete()
+        sample.topic = old_topic
+        sample.save()
+        return feeds
+
+    def test_same_feeds(self):
+        feeds = self.get_feeds()
+        self.assertTrue(any(feeds.values()))
+        with self.settings(FEED_FAN_OUT_ON_READ=True):
+            self.assertEqual(self.get_feeds(), feeds)
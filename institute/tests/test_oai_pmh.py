@@ -0,0 +1,126 @@
+# This file is part of JuliaBase-Institute, see http://www.juliabase.org.
+# Copyright © 2008–2022 Forschungszentrum Jülich GmbH, Jülich, Germany
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# In particular, you may modify this file freely and even remove this license,
+# and offer it as part of a web service, as long as you do not distribute it.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import datetime
+from xml.etree import ElementTree
+from django.test import TestCase, RequestFactory, override_settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import translation
+from samples import models
+from oai_pmh.views import root, get_all_processes
+
+
+namespace = "{http://www.openarchives.org/OAI/2.0/}"
+
+
+@override_settings(ROOT_URLCONF="institute.tests.urls", OAI_PMH_PAGE_SIZE=2)
+class ResumptionTokenTest(TestCase):
+    fixtures = ["test_main"]
+
+    def request(self, **arguments):
+        response = root(RequestFactory().get("/oai-pmh", arguments))
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        return ElementTree.fromstring(content)
+
+    def test_harvest(self):
+        identifiers = []
+        arguments = {"verb": "ListIdentifiers", "metadataPrefix": "oai_dc"}
+        while True:
+            tree = self.request(**arguments)
+            list_element = tree.find(namespace + "ListIdentifiers")
+            headers = list_element.findall(namespace + "header")
+            self.assertLessEqual(len(headers), 2)
+            identifiers.extend(header.find(namespace + "identifier").text for header in headers)
+            token = list_element.find(namespace + "resumptionToken")
+            if token is None or not token.text:
+                break
+            arguments = {"verb": "ListIdentifiers", "resumptionToken": token.text}
+        processes = models.Process.objects.filter(
+            content_type__model__in=[name.lower() for name in get_all_processes()]).order_by("last_modified", "id")
+        self.assertGreater(len(processes), 2)
+        self.assertEqual(identifiers, ["{}:{}".format(process.content_type.model_class().__name__,
+                                                      process.actual_instance.pk) for process in processes])
+
+    def test_bad_token(self):
+        tree = self.request(verb="ListRecords", resumptionToken="foo")
+        self.assertEqual(tree.find(namespace + "error").attrib["code"], "badResumptionToken")
+
+
+@override_settings(ROOT_URLCONF="institute.tests.urls",
+                   CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                       "LOCATION": "oai-pmh-records-test"}})
+class RecordCacheTest(TestCase):
+    fixtures = ["test_main"]
+
+    def tearDown(self):
+        cache.clear()
+
+    def get_dates(self):
+        response = root(RequestFactory().get("/oai-pmh", {"verb": "ListRecords", "metadataPrefix": "oai_dc"}))
+        tree = ElementTree.fromstring(b"".join(response.streaming_content))
+        return {record.find(namespace + "header/" + namespace + "identifier").text:
+                record.find(".//{http://purl.org/dc/elements/1.1/}date").text
+                for record in tree.iter(namespace + "record")}
+
+    def test_invalidation(self):
+        dates = self.get_dates()
+        with self.assertNumQueries(2):
+            self.assertEqual(self.get_dates(), dates)
+        identifier = min(dates)
+        model_name, __, pk = identifier.partition(":")
+        process = get_all_processes()[model_name].objects.get(pk=pk)
+        process.timestamp = datetime.datetime(2001, 2, 3, tzinfo=datetime.timezone.utc)
+        process.save()
+        dates[identifier] = "2001-02-03"
+        self.assertEqual(self.get_dates(), dates)
+
+    def get_titles(self):
+        response = root(RequestFactory().get("/oai-pmh", {"verb": "ListRecords", "metadataPrefix": "oai_dc"}))
+        tree = ElementTree.fromstring(b"".join(response.streaming_content))
+        return [title.text for title in tree.iter("{http://purl.org/dc/elements/1.1/}title")]
+
+    def test_sample_rename(self):
+        """Tests that the records of the processes of a renamed sample are
+        rebuilt.  The sample name may be part of the record title, see
+        `samples.models.Process.__str__`.
+        """
+        titles = self.get_titles()
+        deposition = models.Deposition.objects.get(number="14S-001")
+        sample = deposition.samples.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            sample.name = "renamed-sample"
+            sample.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_titles(), titles)
+        self.assertGreater(len(queries), 2)
+        with self.assertNumQueries(2):
+            self.get_titles()
+
+    def test_language(self):
+        with translation.override("en"):
+            self.get_titles()
+        with translation.override("de"):
+            with CaptureQueriesContext(connection) as queries:
+                self.get_titles()
+            self.assertGreater(len(queries), 2)
+            with self.assertNumQueries(2):
+                self.get_titles()
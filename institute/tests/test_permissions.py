@@ -0,0 +1,60 @@
+# This file is part of JuliaBase-Institute, see http://www.juliabase.org.
+# Copyright © 2008–2022 Forschungszentrum Jülich GmbH, Jülich, Germany
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# In particular, you may modify this file freely and even remove this license,
+# and offer it as part of a web service, as long as you do not distribute it.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User, Permission
+from django.contrib.contenttypes.models import ContentType
+from samples import models, permissions
+
+
+@override_settings(ROOT_URLCONF="institute.tests.urls")
+class PermissionsCacheTest(TestCase):
+    fixtures = ["test_main"]
+
+    def test_repeated_checks(self):
+        user = User.objects.get(username="r.calvert")
+        samples = list(models.Sample.objects.select_related("currently_responsible_person", "topic"))
+        results = [permissions.has_permission_to_fully_view_sample(user, sample) for sample in samples]
+        permissions.get_allowed_physical_processes(user)
+        with self.assertNumQueries(0):
+            self.assertEqual([permissions.has_permission_to_fully_view_sample(user, sample) for sample in samples],
+                             results)
+            permissions.get_allowed_physical_processes(user)
+
+
+    def test_permission_changes(self):
+        # The deletion of the permission is rolled back after the test.
+        self.addCleanup(permissions.clear_class_permissions_cache)
+        deposition_class = models.Deposition.objects.get(number="14S-001").content_type.model_class()
+        self.assertTrue(permissions._get_class_permission(deposition_class, "add"))
+        codename = "add_" + deposition_class.__name__.lower()
+        Permission.objects.get(codename=codename, content_type=ContentType.objects.get_for_model(deposition_class)). \
+            delete()
+        self.assertIsNone(permissions._get_class_permission(deposition_class, "add"))
+        self.assertFalse([permission for permission, __ in permissions.get_addable_physical_process_permissions()
+                          if permission and permission.endswith("." + codename)])
+
+    def test_clearances(self):
+        user = User.objects.get(username="nobody")
+        process = models.Deposition.objects.get(number="14S-001")
+        self.assertFalse(permissions.has_permission_to_view_physical_process(user, process))
+        clearance = models.Clearance.objects.create(user=user, sample=process.samples.first())
+        clearance.processes.add(process)
+        self.assertTrue(permissions.has_permission_to_view_physical_process(user, process))
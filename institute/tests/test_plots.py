@@ -0,0 +1,138 @@
+# This file is part of JuliaBase-Institute, see http://www.juliabase.org.
+# Copyright © 2008–2022 Forschungszentrum Jülich GmbH, Jülich, Germany
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# In particular, you may modify this file freely and even remove this license,
+# and offer it as part of a web service, as long as you do not distribute it.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import tempfile, os, math, shutil
+from pathlib import Path
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from django.core.cache import cache
+import jb_common.utils.blobs
+from jb_common.utils.blobs.backends import Filesystem
+from samples.utils.plots import PlotError, read_plot_file_beginning_at_line_number, \
+    read_plot_file_beginning_after_start_value, read_cached_columns
+from samples.utils import plot_rendering
+
+
+class PlotFileReadersTest(SimpleTestCase):
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile("w", encoding="cp1252", delete=False) as datafile:
+            datafile.write("Operator: n.burkhardt\nBEGIN DATA\n1,5 10 100\n\n2.5 x 200\n3.5 30 300\nEND\n4.5 40\n")
+        self.filename = datafile.name
+
+    def tearDown(self):
+        os.unlink(self.filename)
+
+    def test_line_number(self):
+        for memory_map in (False, True):
+            x_values, y_values = read_plot_file_beginning_at_line_number(self.filename, [0, 2], 3, 6,
+                                                                         memory_map=memory_map)
+            self.assertEqual(list(x_values), [1.5, 2.5, 3.5])
+            self.assertEqual(list(y_values), [100, 200, 300])
+        x_values, y_values = read_plot_file_beginning_at_line_number(self.filename, [0, 1], 3, 5)
+        self.assertEqual(x_values[0], 1.5)
+        self.assertTrue(math.isnan(y_values[1]))
+        with self.assertRaises(PlotError):
+            read_plot_file_beginning_at_line_number(self.filename, [0, 2], 3)
+
+    def test_start_value(self):
+        x_values, y_values = read_plot_file_beginning_after_start_value(self.filename, [0, 2], "begin data", "end")
+        self.assertEqual(list(x_values), [1.5, 2.5, 3.5])
+        self.assertEqual(list(y_values), [100, 200, 300])
+        with self.assertRaises(PlotError):
+            read_plot_file_beginning_after_start_value(self.filename, [0, 2], "begin data")
+
+
+class ParsedDataCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        self.cache_root = tempfile.mkdtemp()
+        self.filenames = []
+        for i in range(3):
+            with tempfile.NamedTemporaryFile("w", delete=False) as datafile:
+                datafile.write("".join("{} {}\n".format(j, i * j) for j in range(100)))
+            self.filenames.append(datafile.name)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_root)
+        for filename in self.filenames:
+            os.unlink(filename)
+
+    def test_cache(self):
+        calls = []
+        def reader(filename):
+            calls.append(filename)
+            return [[1.0, 2.0], [3.0, 4.0]]
+        with self.settings(CACHE_ROOT=self.cache_root, PARSED_DATA_CACHE_SIZE=10**6):
+            for i in range(2):
+                x_values, y_values = read_cached_columns(self.filenames[0], reader)
+                self.assertEqual(list(y_values), [3, 4])
+            self.assertEqual(len(calls), 1)
+            os.utime(self.filenames[0], ns=(0, 0))
+            read_cached_columns(self.filenames[0], reader)
+            self.assertEqual(len(calls), 2)
+
+    def test_eviction(self):
+        cache_directory = os.path.join(self.cache_root, "parsed_data")
+        os.makedirs(cache_directory)
+        temporary_path = os.path.join(cache_directory, "0.npy.3c5a.part")
+        with open(temporary_path, "wb") as temporary_file:
+            temporary_file.write(b"\0" * 5000)
+        with self.settings(CACHE_ROOT=self.cache_root, PARSED_DATA_CACHE_SIZE=2000):
+            for filename in self.filenames:
+                read_cached_columns(filename, read_plot_file_beginning_at_line_number, [0, 1], 1)
+            entries = [entry for entry in os.scandir(cache_directory) if entry.path != temporary_path]
+            self.assertLess(sum(entry.stat().st_size for entry in entries), 2000)
+            self.assertLess(len(entries), 3)
+            self.assertGreater(len(entries), 0)
+            self.assertTrue(os.path.exists(temporary_path))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                       "LOCATION": "plot-artefacts-test"}})
+class PlotArtefactTest(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        patcher = mock.patch.object(jb_common.utils.blobs, "storage", Filesystem(Path(self.root)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        cache.clear()
+
+    def test_superseded_artefacts(self):
+        storage = jb_common.utils.blobs.storage
+        directory = "plots/samples-pdsmeasurement-en-1-.svg"
+        for name in ("0000000000.svg", "1111111111.svg", "1111111111.svg.3c5a", "2222222222.svg"):
+            with storage.open(os.path.join(directory, name), "w") as file_:
+                file_.write(b"<svg/>")
+        plot_rendering._delete_superseded_plot_artefacts(os.path.join(directory, "2222222222.svg"))
+        self.assertEqual(sorted(storage.list(directory)), ["1111111111.svg.3c5a", "2222222222.svg"])
+
+    def test_unexpected_error(self):
+        path = "plots/samples-pdsmeasurement-en-1-.svg/0000000000.svg"
+        cache.set("plot-rendering:" + path, True)
+        with mock.patch.object(plot_rendering, "plot_artefact_exists", side_effect=RuntimeError), \
+             self.assertLogs("samples.utils.plot_rendering", "ERROR"):
+            plot_rendering._render_plot_artefact(1, "", True, "en", path)
+        self.assertTrue(plot_rendering.get_plot_error(path))
+        self.assertIsNone(cache.get("plot-rendering:" + path))
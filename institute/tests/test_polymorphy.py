@@ -0,0 +1,48 @@
+# This file is part of JuliaBase-Institute, see http://www.juliabase.org.
+# Copyright © 2008–2022 Forschungszentrum Jülich GmbH, Jülich, Germany
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# In particular, you may modify this file freely and even remove this license,
+# and offer it as part of a web service, as long as you do not distribute it.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from django.test import TestCase, override_settings
+from django.contrib.contenttypes.models import ContentType
+from samples.models import Process
+
+
+@override_settings(ROOT_URLCONF="institute.tests.urls")
+class ResolveActualInstancesTest(TestCase):
+    fixtures = ["test_main"]
+
+    def test_same_result_as_actual_instance(self):
+        expected = [process.actual_instance for process in Process.objects.all()]
+        self.assertEqual(Process.resolve_actual_instances(Process.objects.all()), expected)
+        self.assertEqual([type(process) for process in Process.resolve_actual_instances(Process.objects.all())],
+                         [type(process) for process in expected])
+
+    def test_number_of_queries(self):
+        processes = list(Process.objects.all())
+        content_types = {process.content_type_id for process in processes}
+        self.assertGreater(len(processes), len(content_types))
+        for content_type_id in content_types:
+            ContentType.objects.get_for_id(content_type_id)
+        with self.assertNumQueries(len(content_types)):
+            actual_instances = Process.resolve_actual_instances(processes)
+        with self.assertNumQueries(0):
+            for process, actual_instance in zip(processes, actual_instances):
+                self.assertIs(process.actual_instance, actual_instance)
+                self.assertIs(actual_instance.actual_instance, actual_instance)
+                actual_instance.operator
@@ -0,0 +1,126 @@
+# This file is part of JuliaBase-Institute, see http://www.juliabase.org.
+# Copyright © 2008–2022 Forschungszentrum Jülich GmbH, Jülich, Germany
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# In particular, you may modify this file freely and even remove this license,
+# and offer it as part of a web service, as long as you do not distribute it.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import threading, time
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.db import connection, transaction, OperationalError
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from samples import models
+from samples.views.sample import SamplesAndProcesses
+
+
+@override_settings(ROOT_URLCONF="institute.tests.urls",
+                   CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                       "LOCATION": "samples-and-processes-test"}})
+class SamplesAndProcessesCacheTest(TestCase):
+    fixtures = ["test_main"]
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.get(username="juliabase")
+        self.sample = models.Sample.objects.filter(processes__isnull=False).distinct()[0]
+
+    def tearDown(self):
+        cache.clear()
+
+    def get_process_ids(self):
+        samples_and_processes = SamplesAndProcesses.samples_and_processes(self.sample.name, self.user)
+        return [process_context["process"].id for process_context in samples_and_processes.process_contexts]
+
+    def test_update(self):
+        process_ids = list(self.sample.processes.order_by("timestamp").values_list("id", flat=True))
+        self.assertEqual(self.get_process_ids(), process_ids)
+        self.assertEqual(self.get_process_ids(), process_ids)
+        process = models.Process.objects.get(pk=process_ids[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sample.processes.remove(process)
+        self.assertEqual(self.get_process_ids(), process_ids[1:])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sample.processes.add(process)
+        self.assertEqual(self.get_process_ids(), process_ids)
+
+
+@override_settings(ROOT_URLCONF="institute.tests.urls",
+                   CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                       "LOCATION": "samples-and-processes-stress-test"}})
+class ConcurrentSampleWritersTest(TransactionTestCase):
+    """Writers add processes to one sample in their own transactions, readers
+    get the processes of the sample through the cache at the same time.  Each
+    thread has its own database connection.
+    """
+    fixtures = ["test_main"]
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.get(username="juliabase")
+        self.sample = models.Sample.objects.filter(processes__isnull=False).distinct()[0]
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_no_stale_process_lists(self):
+        new_process_ids = list(models.Process.objects.exclude(samples=self.sample).
+                               exclude(content_type__model="samplesplit").values_list("id", flat=True)[:12])
+        lock = threading.Lock()
+        committed_process_ids = set()
+        stale_reads = []
+        writers_done = threading.Event()
+        def write(process_ids):
+            try:
+                for process_id in process_ids:
+                    while True:
+                        try:
+                            with transaction.atomic():
+                                models.Sample.objects.get(pk=self.sample.pk).processes.add(process_id)
+                        except OperationalError:
+                            # SQLite lets concurrent write transactions fail.
+                            time.sleep(0.01)
+                        else:
+                            break
+                    with lock:
+                        committed_process_ids.add(process_id)
+            finally:
+                connection.close()
+        def read():
+            try:
+                while not writers_done.is_set():
+                    with lock:
+                        expected_process_ids = set(committed_process_ids)
+                    samples_and_processes = SamplesAndProcesses.samples_and_processes(self.sample.name, self.user)
+                    process_ids = {process_context["process"].id
+                                   for process_context in samples_and_processes.process_contexts}
+                    if not expected_process_ids <= process_ids:
+                        stale_reads.append(expected_process_ids - process_ids)
+            finally:
+                connection.close()
+        writers = [threading.Thread(target=write, args=(new_process_ids[i::4],)) for i in range(4)]
+        readers = [threading.Thread(target=read) for i in range(4)]
+        for thread in writers + readers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        writers_done.set()
+        for thread in readers:
+            thread.join()
+        self.assertEqual(stale_reads, [])
+        samples_and_processes = SamplesAndProcesses.samples_and_processes(self.sample.name, self.user)
+        self.assertTrue(set(new_process_ids) <= {process_context["process"].id
+                                                 for process_context in samples_and_processes.process_contexts})
@@ -0,0 +1,160 @@
+# This file is part of JuliaBase-Institute, see http://www.juliabase.org.
+# Copyright © 2008–2022 Forschungszentrum Jülich GmbH, Jülich, Germany
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# In particular, you may modify this file freely and even remove this license,
+# and offer it as part of a web service, as long as you do not distribute it.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import csv, json, urllib.parse, io, unittest
+try:
+    import pyarrow, pyarrow.parquet
+except ImportError:
+    pyarrow = None
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.client import Client
+from django.contrib.auth.models import User
+import django.utils.timezone
+from samples import models
+from samples.data_tree import DataNode, DataItem
+from samples.views.table_export import prepare_row_tree, flatten_row_tree, build_column_group_list
+
+
+@override_settings(ROOT_URLCONF="institute.tests.urls")
+class TableExportTest(TestCase):
+    fixtures = ["test_main"]
+
+    def setUp(self):
+        self.client = Client()
+        assert self.client.login(username="juliabase", password="12345")
+        self.user = user = User.objects.get(username="juliabase")
+        samples = models.Sample.objects.filter(processes__isnull=False).distinct()[:3]
+        sample_series = models.SampleSeries.objects.create(
+            name="juliabase-20-test", timestamp=django.utils.timezone.now(), currently_responsible_person=user,
+            description="", topic=samples[0].topic)
+        sample_series.samples.set(samples)
+        self.sample_series = sample_series
+        self.url = "/sample_series/{}/export/".format(urllib.parse.quote(sample_series.name))
+
+    def get_export_query(self):
+        """Goes through the selection steps of the export view like a browser.
+
+        :return:
+          the query parameters for the final export, the rows of the preview
+
+        :rtype: dict, list of list of str
+        """
+        response = self.client.get(self.url)
+        column_groups = [name for name, __ in response.context["column_groups"].fields["column_groups"].choices]
+        query = {"__-column_groups": column_groups, "__old_data-column_groups": "\t".join(column_groups)}
+        response = self.client.get(self.url, query)
+        columns = [str(index) for __, choices in response.context["columns"].fields["columns"].choices
+                   for index, __ in choices]
+        query["__-columns"] = columns
+        response = self.client.get(self.url, query)
+        preview = [[str(cell) for cell in row] for row, __ in response.context["rows"]]
+        self.assertGreater(len(preview), 1)
+        query["__old_data-columns"] = " ".join(columns)
+        query.update(("{}__-active".format(i), "on") for i in range(len(preview)))
+        return query, preview
+
+    def test_streamed_export(self):
+        query, preview = self.get_export_query()
+        response = self.client.get(self.url, query)
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(list(csv.reader(lines, dialect=csv.excel_tab)), preview)
+        response = self.client.get(self.url, query, HTTP_ACCEPT="application/json")
+        self.assertEqual(len(json.loads(b"".join(response.streaming_content))), len(preview) - 1)
+
+    def test_rows_changed_while_streaming(self):
+        query, preview = self.get_export_query()
+        response = self.client.get(self.url, query)
+        sample = models.Sample.objects.exclude(series=self.sample_series).filter(processes__isnull=False)[0]
+        self.sample_series.samples.add(sample)
+        self.sample_series.samples.remove(self.sample_series.samples.all()[0])
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(list(csv.reader(lines, dialect=csv.excel_tab)), preview)
+
+    @unittest.skipUnless(pyarrow, "pyarrow is not installed")
+    def test_parquet_export(self):
+        query, preview = self.get_export_query()
+        response = self.client.get(self.url, query, HTTP_ACCEPT="application/vnd.apache.parquet")
+        table = pyarrow.parquet.read_table(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(table.column_names, preview[0])
+        self.assertEqual(table.num_rows, len(preview) - 1)
+        self.assertIn(pyarrow.timestamp("us", tz="UTC"), table.schema.types)
+
+    def test_prefetched_trees(self):
+        parent = models.Sample.objects.filter(processes__isnull=False).distinct()[0]
+        split = models.SampleSplit.objects.create(operator=self.user, parent=parent,
+                                                  timestamp=django.utils.timezone.now())
+        parent.processes.add(split)
+        for i in range(2):
+            models.Sample.objects.create(name="piece-{}".format(i), currently_responsible_person=self.user,
+                                         split_origin=split, topic=parent.topic)
+        samples = models.Sample.objects.filter(name__startswith="piece-").order_by("name")
+        expected = [flatten_row_tree(prepare_row_tree(sample.get_data_for_table_export())) for sample in samples]
+        samples = [parent] + list(samples)
+        models.Sample.prefetch_data_for_table_export(samples)
+        with self.assertNumQueries(4):
+            row_trees = [sample.get_data_for_table_export() for sample in samples[1:]]
+        self.assertTrue({id(node) for node in row_trees[0].children} & {id(node) for node in row_trees[1].children})
+        self.assertEqual([flatten_row_tree(prepare_row_tree(row_tree)) for row_tree in row_trees], expected)
+
+
+class ColumnGroupListTest(SimpleTestCase):
+
+    @staticmethod
+    def create_node(name, items, children=()):
+        node = DataNode(name)
+        node.items = [DataItem(key, value) for key, value in items]
+        node.children = list(children)
+        return node
+
+    def create_deposition(self, number, number_of_layers):
+        return self.create_node("deposition", [("number", number), ("timestamp", "2020-01-01")],
+                                [self.create_node("layer", [("thickness", i)]) for i in range(number_of_layers)])
+
+    def test_order_and_disambiguation(self):
+        row_trees = [
+            self.create_node("sample", [("name", "a")],
+                             [self.create_deposition("1", 2), self.create_node("measurement", [("value", 1)])]),
+            self.create_node("sample", [("name", "b")],
+                             [self.create_node("measurement", [("value", 2), ("number", 7)]),
+                              self.create_deposition("2", 1), self.create_deposition("3", 2)])]
+        column_groups, columns = build_column_group_list(prepare_row_tree(row_tree) for row_tree in row_trees)
+        self.assertEqual([(column_group.name, column_group.key_indices) for column_group in column_groups],
+                         [("sample", {"name": 0}),
+                          ("deposition", {"number": 1, "timestamp": 2}),
+                          ("deposition, layer", {"thickness": 3}),
+                          ("deposition\u00a0#2", {"number": 7, "timestamp": 8}),
+                          ("deposition\u00a0#2, layer", {"thickness": 9}),
+                          ("deposition\u00a0#2, layer\u00a0#2", {"thickness": 10}),
+                          ("deposition, layer\u00a0#2", {"thickness": 4}),
+                          ("measurement", {"value": 5, "number": 6})])
+        self.assertEqual([(column.column_group_names, column.key, column.heading) for column in columns],
+                         [(["sample"], "name", "name"),
+                          (["deposition"], "number", "number {deposition}"),
+                          (["deposition"], "timestamp", "timestamp {deposition}"),
+                          (["deposition, layer"], "thickness", "thickness {deposition, layer}"),
+                          (["deposition, layer\u00a0#2"], "thickness", "thickness {deposition, layer\u00a0#2}"),
+                          (["measurement"], "value", "value"),
+                          (["measurement"], "number", "number {measurement}"),
+                          (["deposition\u00a0#2"], "number", "number {deposition\u00a0#2}"),
+                          (["deposition\u00a0#2"], "timestamp", "timestamp {deposition\u00a0#2}"),
+                          (["deposition\u00a0#2, layer"], "thickness", "thickness {deposition\u00a0#2, layer}"),
+                          (["deposition\u00a0#2, layer\u00a0#2"], "thickness",
+                           "thickness {deposition\u00a0#2, layer\u00a0#2}")])
@@ -18,7 +18,7 @@
 # this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-import os, subprocess, uuid
+import os
 from io import BytesIO
 from functools import partial
 from django.conf import settings
@@ -32,15 +32,12 @@ from institute import layouts
 
 
 def generate_layout(sample, process):
-    # FixMe: This should be implemented without writing to the disk.
-    pdf_filename = "/tmp/layouts_{}.pdf".format(uuid.uuid4())
     layout = layouts.get_layout(sample, process)
     if not layout:
         raise Http404("error")
-    layout.generate_pdf(pdf_filename)
-    content = subprocess.run(["pdf2svg", pdf_filename, "/dev/stdout"], check=True, capture_output=True).stdout
-    os.unlink(pdf_filename)
-    return BytesIO(content)
+    pdf = BytesIO()
+    layout.generate_pdf(pdf)
+    return BytesIO(jb_common.utils.base.run_converter(["pdf2svg", "{input}", "/dev/stdout"], pdf.getvalue()))
 
 
 @login_required
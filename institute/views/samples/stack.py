@@ -21,9 +21,8 @@
 """View for showing an informal layer stack as a PDF file.
 """
 
-import subprocess, uuid, os, io
+import io
 from functools import partial
-from pathlib import Path
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.decorators import login_required
@@ -36,16 +35,13 @@ from institute import models, informal_stacks
 
 
 def generate_stack(thumbnail, locations, sample, sample_details):
-    # FixMe: This should be implemented without writing to the disk.
-    pdf_filename = Path("/tmp")/"stack_{}.pdf".format(uuid.uuid4())
+    stream = io.BytesIO()
     informal_stacks.generate_diagram(
-        pdf_filename, [informal_stacks.Layer(layer) for layer in sample_details.informal_layers.all()],
+        stream, [informal_stacks.Layer(layer) for layer in sample_details.informal_layers.all()],
         str(sample), _("Layer stack of {0}").format(sample))
     if thumbnail:
-        stream = io.BytesIO(subprocess.run(["pdf2svg", pdf_filename, "/dev/stdout"], check=True, capture_output=True).stdout)
-        os.remove(pdf_filename)
-    else:
-        stream = jb_common.utils.base.open_and_unlink(pdf_filename)
+        stream = io.BytesIO(jb_common.utils.base.run_converter(["pdf2svg", "{input}", "/dev/stdout"], stream.getvalue()))
+    stream.seek(0)
     return stream
 
 
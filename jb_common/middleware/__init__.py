@@ -23,7 +23,7 @@ from django.template import loader, RequestContext
 from django.contrib.auth import logout
 import django.urls
 from jb_common.models import UserDetails, ErrorPage
-from jb_common.utils.base import is_json_requested, JSONRequestException
+from jb_common.utils.base import is_json_requested, JSONRequestException, collect_cache_statistics
 from django.conf import settings
 from django.utils.translation import gettext as _
 import django.http
@@ -229,3 +229,18 @@ class LoggingMiddleware:
     def __call__(self, request):
         self.logger.info(f"{request.user} {request.method} {request.path}")
         return self.get_response(request)
+
+
+class CacheStatisticsMiddleware:
+    """Collects the statistics of the cache accesses of a request and writes
+    them to the cache once at the end of the request, see
+    `jb_common.utils.base.collect_cache_statistics`.  Cache accesses while a
+    streaming response is sent are recorded immediately.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with collect_cache_statistics():
+            return self.get_response(request)
@@ -247,6 +247,67 @@ class PolymorphicModel(models.Model):
             self.actual_instance = self
             super().save()
 
+    @classmethod
+    def get_actual_instances_query_set(cls):
+        """Returns the query set which is used by
+        :py:meth:`resolve_actual_instances` for fetching instances of this
+        concrete class.  Override it in order to add ``select_related`` or
+        ``prefetch_related`` calls that the callers of
+        ``resolve_actual_instances`` typically need.
+
+        :return:
+          the query set for fetching actual instances of this class
+
+        :rtype: QuerySet
+        """
+        return cls._base_manager.all()
+
+    @staticmethod
+    def resolve_actual_instances(instances):
+        """Returns the actual instances of the given model instances.  In contrast
+        to accessing :py:attr:`actual_instance` of every single instance, this
+        method groups the instances by their content type and fetches all actual
+        instances of one concrete class in one query.  Thus, the number of
+        queries does not depend on the number of instances, but only on the
+        number of different concrete classes.
+
+        The result is also stored in the :py:attr:`actual_instance` cache of the
+        given instances, as well as of the actual instances themselves, so that
+        later accesses to this attribute don't hit the database either.
+
+        :param instances: the model instances to resolve; they may be a query set
+
+        :type instances: iterable of `PolymorphicModel`
+
+        :return:
+          the actual instances, in the same order as `instances`; instances
+          without content type are returned unchanged
+
+        :rtype: list of `PolymorphicModel`
+        """
+        instances = list(instances)
+        object_ids_by_content_type = {}
+        for instance in instances:
+            if instance.content_type_id is not None:
+                object_ids_by_content_type.setdefault(instance.content_type_id, set()).add(instance.actual_object_id)
+        actual_instances = {}
+        for content_type_id, object_ids in object_ids_by_content_type.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            if model is None:
+                continue
+            for actual_instance in model.get_actual_instances_query_set().filter(pk__in=object_ids):
+                actual_instance._meta.get_field("actual_instance").set_cached_value(actual_instance, actual_instance)
+                actual_instances[content_type_id, actual_instance.pk] = actual_instance
+        result = []
+        for instance in instances:
+            actual_instance = actual_instances.get((instance.content_type_id, instance.actual_object_id))
+            if actual_instance is None:
+                result.append(instance)
+            else:
+                instance._meta.get_field("actual_instance").set_cached_value(instance, actual_instance)
+                result.append(actual_instance)
+        return result
+
     class Meta:
         abstract = True
 
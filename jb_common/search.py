@@ -501,7 +501,7 @@ def get_search_results(search_tree, max_results, base_query=None):
         results = results[:max_results]
     results = search_tree.model_class.objects.filter(pk__in=results)
     if isinstance(search_tree, AbstractSearchTreeNode):
-        results = [result.actual_instance for result in results]
+        results = search_tree.model_class.resolve_actual_instances(results)
     return results, too_many_results
 
 
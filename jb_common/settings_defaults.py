@@ -23,6 +23,8 @@ from django.utils.translation import gettext_lazy as _, gettext
 from django.utils.crypto import get_random_string
 
 
+ARTEFACT_CACHE_SIZE = 1024**3
+CONVERTER_PROCESSES = 2
 DEBUG_EMAIL_REDIRECT_USERNAME = ""
 JAVASCRIPT_I18N_APPS = ["django.contrib.auth", "samples", "jb_common"]
 BLOB_STORAGE_BACKEND = ("jb_common.utils.blobs.backends.Filesystem", ())
@@ -41,6 +41,7 @@ from django.dispatch import receiver
 import django.dispatch
 from django.contrib.auth.models import User
 from jb_common import models
+import jb_common.utils.base
 
 
 maintain = django.dispatch.Signal()
@@ -86,3 +87,11 @@ def expire_error_pages(sender, **kwargs):
     now = django.utils.timezone.now()
     six_weeks_ago = now - datetime.timedelta(weeks=6)
     models.ErrorPage.objects.filter(timestamp__lt=six_weeks_ago).delete()
+
+
+@receiver(maintain)
+def clean_artefact_cache(sender, **kwargs):
+    """Cleans up the file cache of
+    :py:func:`jb_common.utils.base.get_cached_bytes_stream`.
+    """
+    jb_common.utils.base.clean_artefact_cache()
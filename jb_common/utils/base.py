@@ -15,8 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-import codecs, re, os, os.path, time, datetime, copy, mimetypes, string, hashlib, urllib
-from io import BytesIO
+import codecs, re, os, os.path, time, datetime, copy, mimetypes, string, hashlib, urllib, threading, uuid, subprocess
 from contextlib import contextmanager
 from functools import wraps
 from smtplib import SMTPException
@@ -25,6 +24,7 @@ from pathlib import Path
 import django.http
 import django.contrib.auth.models
 import django.urls
+import django.utils.http
 from django.core.cache import cache
 from django.core.serializers.json import DjangoJSONEncoder
 from django.apps.registry import apps
@@ -530,7 +530,8 @@ def get_file_timestamps(paths):
             return [getmtime_utc(filepath) for filepath in paths]
         else:
             assert all(isinstance(path, str) for path in paths)
-            return [blobs.storage.getmtime(filepath) for filepath in paths]
+            mtimes = blobs.storage.getmtime_many(paths)
+            return [mtimes[filepath] for filepath in paths]
     return []
 
 
@@ -592,6 +593,73 @@ def open_and_unlink(path):
     return file_
 
 
+def evict_least_recently_used(directory, max_size):
+    """Removes the least recently used files in a cache directory until the
+    total size of the files in it is not larger than ``max_size``.  The
+    modification time of a file is taken as its time of last use, so readers
+    of the cache should update it on every hit.  Temporary files, i.e. files
+    ending in ``.part``, are neither counted nor removed because they may
+    still be written to; left-over ones are removed by `clean_artefact_cache`.
+
+    :param directory: the cache directory; it must not contain subdirectories
+    :param max_size: the maximal total size of the files in bytes
+
+    :type directory: Path
+    :type max_size: int
+    """
+    entries = []
+    try:
+        directory_entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    for entry in directory_entries:
+        if entry.name.endswith(".part"):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total_size = sum(size for __, size, __ in entries)
+    for __, size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+
+def clean_artefact_cache(directory=None, max_size=None):
+    """Removes left-over temporary files from a file cache and shrinks it to its
+    maximal size.  By default, this is the artefact cache of
+    `get_cached_bytes_stream`, limited to ``ARTEFACT_CACHE_SIZE``.  This is
+    called by the ``maintenance`` command.
+
+    :param directory: the cache directory; see `evict_least_recently_used`
+    :param max_size: the maximal total size of the files in bytes
+
+    :type directory: Path
+    :type max_size: int
+    """
+    if directory is None:
+        directory, max_size = Path(settings.CACHE_ROOT)/"artefacts", settings.ARTEFACT_CACHE_SIZE
+    one_hour_ago = time.time() - 60 * 60
+    try:
+        directory_entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    for entry in directory_entries:
+        if entry.name.endswith(".part"):
+            try:
+                if entry.stat().st_mtime < one_hour_ago:
+                    os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+    evict_least_recently_used(directory, max_size)
+
+
 def get_cached_bytes_stream(path, generator, source_files=[], timestamps=[]):
     """Returns the content of the file denoted by ``path``.  It tries to get this
     from cache, taking the timestamps of all ``source_files`` and the
@@ -599,6 +667,14 @@ def get_cached_bytes_stream(path, generator, source_files=[], timestamps=[]):
     called (without arguments!) to generate the file content, which is then
     cached.
 
+    The files are cached in the directory ``artefacts`` in ``CACHE_ROOT``,
+    which is limited to ``ARTEFACT_CACHE_SIZE`` bytes by removing the least
+    recently used files.  The Django cache contains only a small index entry
+    with the filename, the size, and the hash of the timestamps, so that big
+    files don't evict the hot items there.  If the index entry or the file is
+    missing (e.g. because the file was created on another node), it is a
+    cache miss.
+
     :param path: the path to the destination file; may also be a symbolic name
     :param generator: Callable which returns the file content as a binary
       stream.  It is only called of the cache lookup yields a miss.  The
@@ -623,17 +699,78 @@ def get_cached_bytes_stream(path, generator, source_files=[], timestamps=[]):
     all_timestamps = copy.copy(timestamps) + get_file_timestamps(source_files)
     hash_ = hashlib.sha1()
     hash_.update(";".join(str(timestamp) for timestamp in sorted(all_timestamps)).encode())
-    key = "file:{timestamp_hash}:{path}".format(timestamp_hash=hash_.hexdigest()[:10], path=path)
+    source_hash = hash_.hexdigest()[:10]
+    key = "artefact:" + path
+    directory = Path(settings.CACHE_ROOT)/"artefacts"
     cache_result = get_from_cache(key)
-    if cache_result is None:
-        stream = generator()
-        cache.set(key, stream.read())
-        stream.seek(0)
-    else:
-        stream = BytesIO(cache_result)
+    if cache_result is not None:
+        filename, size, cached_source_hash = cache_result
+        if cached_source_hash == source_hash:
+            try:
+                file_ = open(directory/filename, "rb")
+            except FileNotFoundError:
+                pass
+            else:
+                os.utime(file_.fileno())
+                return file_
+        else:
+            try:
+                os.unlink(directory/filename)
+            except FileNotFoundError:
+                pass
+    stream = generator()
+    content = stream.read()
+    stream.seek(0)
+    filename = "{}-{}".format(hashlib.sha1(path.encode()).hexdigest(), source_hash)
+    os.makedirs(directory, exist_ok=True)
+    temporary_path = directory/"{}.{}.part".format(filename, uuid.uuid4())
+    with open(temporary_path, "wb") as file_:
+        file_.write(content)
+    os.replace(temporary_path, directory/filename)
+    cache.set(key, (filename, len(content), source_hash))
+    evict_least_recently_used(directory, settings.ARTEFACT_CACHE_SIZE)
     return stream
 
 
+converter_semaphore = None
+_converter_semaphore_lock = threading.Lock()
+
+def run_converter(command, content):
+    """Runs an external converter program (e.g. ``pdf2svg``) on in-memory
+    content.  The content is passed as an anonymous in-memory file, so nothing
+    is written to the disk.  At most ``CONVERTER_PROCESSES`` converters run at
+    the same time in this process; further calls wait.
+
+    :param command: the command line; the argument ``"{input}"`` (also as a
+        part of an argument) is replaced by the path to the input file
+    :param content: the input of the converter
+
+    :type command: list of str
+    :type content: bytes
+
+    :return:
+      the standard output of the converter
+
+    :rtype: bytes
+
+    :raises subprocess.CalledProcessError: if the converter failed
+    """
+    global converter_semaphore
+    with _converter_semaphore_lock:
+        if converter_semaphore is None:
+            converter_semaphore = threading.BoundedSemaphore(settings.CONVERTER_PROCESSES)
+    with converter_semaphore:
+        input_file = os.memfd_create("juliabase-converter-input")
+        try:
+            with open(input_file, "wb", closefd=False) as file_:
+                file_.write(content)
+            path = "/dev/fd/{}".format(input_file)
+            return subprocess.run([argument.replace("{input}", path) for argument in command], check=True,
+                                  capture_output=True, pass_fds=(input_file,)).stdout
+        finally:
+            os.close(input_file)
+
+
 def static_response(stream, served_filename=None, content_type=None):
     """Serves a bytes string as static content.
 
@@ -660,6 +797,69 @@ def static_response(stream, served_filename=None, content_type=None):
     return django.http.FileResponse(stream, **kwargs)
 
 
+range_pattern = re.compile(r"bytes=(\d*)-(\d*)\Z")
+
+def blob_response(request, path, served_filename=None, content_type=None):
+    """Serves a file from the blob storage.  The file is streamed in chunks, so
+    that it is never read into memory as a whole.  The response carries an
+    ETag, and requests with a matching ``If-None-Match`` header are answered
+    with 304 (Not Modified).  Moreover, single byte ranges are supported, so
+    that big files can be loaded partially.
+
+    :param request: the current HTTP Request object
+    :param path: the path to the file in the blob storage
+    :param served_filename: the filename the should be transmitted; if given,
+        the response will be an "attachment"
+    :param content_type: the MIME type of the content; if not given, it is
+        guessed from ``path``
+
+    :type request: HttpRequest
+    :type path: str
+    :type served_filename: str
+    :type content_type: str
+
+    :return:
+      the HTTP response with the file
+
+    :rtype: ``django.http.HttpResponse``
+
+    :raises FileNotFoundError: if the file does not exist
+    """
+    size = blobs.storage.getsize(path)
+    hash_ = hashlib.sha1()
+    hash_.update("{}:{}:{}".format(path, blobs.storage.getmtime(path), size).encode())
+    etag = '"{}"'.format(hash_.hexdigest())
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match and (if_none_match.strip() == "*" or
+                          etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))):
+        response = django.http.HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+    start, end = 0, size
+    match = range_pattern.match(request.META.get("HTTP_RANGE", "").replace(" ", ""))
+    if match and request.META.get("HTTP_IF_RANGE", etag) == etag and any(match.groups()):
+        first, last = match.groups()
+        if first:
+            start, end = int(first), min(int(last) + 1, size) if last else size
+        else:
+            start = max(size - int(last), 0)
+        if start >= end:
+            response = django.http.HttpResponse(status=416)
+            response["Content-Range"] = "bytes */{}".format(size)
+            return response
+        response = django.http.StreamingHttpResponse(blobs.storage.iter_chunks(path, start, end), status=206)
+        response["Content-Range"] = "bytes {}-{}/{}".format(start, end - 1, size)
+    else:
+        response = django.http.StreamingHttpResponse(blobs.storage.iter_chunks(path))
+    response["Content-Type"] = content_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+    response["Content-Length"] = str(end - start)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    if served_filename:
+        response["Content-Disposition"] = django.utils.http.content_disposition_header(True, served_filename)
+    return response
+
+
 def mkdirs(path):
     """Creates a directory and all of its parents if necessary.  The given path
     is interpreted as a filename, i.e. its parent directory is created.  If the
@@ -675,30 +875,81 @@ def mkdirs(path):
 @contextmanager
 def cache_key_locked(key):
     """Locks the ``key`` in the cache.  If ``key`` already exists, it waits for
-    max. 6 seconds.  If it's still not released, the whole cache is cleared.
-    In all cases, ``key`` is hold in the context.  After the context is left
-    (even via an exception), the key is deleted, i.e. the lock is removed.  Use
-    it like this::
+    max. 6 seconds.  If it's still not released, the lock is considered stale
+    and is taken over.  In all cases, ``key`` is hold in the context.  After
+    the context is left (even via an exception), the key is deleted, i.e. the
+    lock is removed.  Use it like this::
 
         with cache_key_locked("my_lock_name"):
             ...
     """
     cycles = 20
     while cycles:
-        if cache.add(key, 1):
+        if cache.add(key, 1, 10):
             break
         cycles -= 1
         time.sleep(0.3)
     else:
-        cache.clear()
-        successful = cache.add(key, 1)
-        assert successful
+        cache.set(key, 1, 10)
     try:
         yield
     finally:
         cache.delete(key)
 
 
+def get_cache_generations(names):
+    """Returns the current cache generations of the given objects.  A
+    generation is a counter which is part of the cache keys of all cache items
+    that depend on the object.  It is increased by `bump_cache_generation`
+    whenever the object changes.  This way, outdated cache items are simply
+    never read again and expire eventually.
+
+    If the counter of an object doesn't exist (yet, or any more), it is
+    initialised with the current time in nanoseconds, so that it doesn't
+    collide with earlier generations of the same object.
+
+    :param names: the names of the objects, e.g. ``"sample:42"``
+
+    :type names: iterable of str
+
+    :return:
+      the current generation of every object
+
+    :rtype: dict mapping str to int
+    """
+    keys = {name: "generation:" + name for name in names}
+    generations = cache.get_many(keys.values())
+    missing_keys = [key for key in keys.values() if key not in generations]
+    if missing_keys:
+        initial_generation = time.time_ns()
+        for key in missing_keys:
+            cache.add(key, initial_generation, None)
+        generations.update(cache.get_many(missing_keys))
+        for key in missing_keys:
+            generations.setdefault(key, initial_generation)
+    return {name: generations[key] for name, key in keys.items()}
+
+
+def bump_cache_generation(name):
+    """Increases the cache generation of an object atomically.  This makes all
+    cache items which depend on this object outdated.  See
+    `get_cache_generations` for further information.
+
+    :param name: the name of the object, e.g. ``"sample:42"``
+
+    :type name: str
+    """
+    key = "generation:" + name
+    while True:
+        try:
+            cache.incr(key)
+        except ValueError:
+            if cache.add(key, time.time_ns(), None):
+                break
+        else:
+            break
+
+
 class MyNone:
     """Singleton class for detecting cache misses in `get_from_cache`
     reliably.
@@ -718,6 +969,45 @@ def _incr_cache_item(key, increment):
         cache.add(key, increment)
 
 
+_cache_statistics = threading.local()
+
+def _record_cache_accesses(hits, misses):
+    """Internal routine for recording hits and misses for `cache_hit_rate`.
+    Within `collect_cache_statistics`, they are only summed up in the current
+    thread.  Otherwise, they are written to the cache immediately.
+    """
+    counts = getattr(_cache_statistics, "counts", None)
+    if counts is None:
+        if hits:
+            _incr_cache_item("samples-cache-hits", hits)
+        if misses:
+            _incr_cache_item("samples-cache-misses", misses)
+    else:
+        counts[0] += hits
+        counts[1] += misses
+
+
+@contextmanager
+def collect_cache_statistics():
+    """Context manager which collects the cache statistics recorded by
+    `get_from_cache` and `get_many_from_cache` in the current thread and writes
+    them to the cache once at the end.  This way, a request with many cache
+    accesses needs at most two further round trips to the cache for the
+    statistics.  It is used by
+    :py:class:`jb_common.middleware.CacheStatisticsMiddleware`.  Nested uses are
+    merged into the outermost one.
+    """
+    if getattr(_cache_statistics, "counts", None) is not None:
+        yield
+        return
+    _cache_statistics.counts = counts = [0, 0]
+    try:
+        yield
+    finally:
+        _cache_statistics.counts = None
+        _record_cache_accesses(*counts)
+
+
 def get_from_cache(key, default=None, hits=1, misses=1):
     """Gets an item from the cache and records statistics for
     `cache_hit_rate`.  The semantics of this routine are the same as for
@@ -731,13 +1021,46 @@ def get_from_cache(key, default=None, hits=1, misses=1):
     """
     result = cache.get(key, my_none)
     if result is my_none:
-        _incr_cache_item("samples-cache-misses", misses)
+        _record_cache_accesses(0, misses)
         return default
     else:
-        _incr_cache_item("samples-cache-hits", hits)
+        _record_cache_accesses(hits, 0)
         return result
 
 
+def get_many_from_cache(keys, hits=1, misses=1):
+    """Gets many items from the cache in one go and records statistics for
+    `cache_hit_rate`.  The semantics of this routine are the same as for
+    Django's `cache.get_many`, i.e. missing keys are simply not contained in
+    the result.
+
+    In contrast to calling `get_from_cache` for every key, this needs only one
+    round trip to the cache for fetching the items.  The statistics are
+    written like those of `get_from_cache`, i.e. once per request within
+    `collect_cache_statistics`.
+
+    :param keys: the cache keys to look up
+    :param hits: number of hits that should be equivalent with one found key
+    :param misses: number of misses that should be equivalent with one missing
+      key
+
+    :type keys: iterable of str
+    :type hits: int
+    :type misses: int
+
+    :return:
+      the found cache items
+
+    :rtype: dict mapping str to ``object``
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    result = cache.get_many(keys)
+    _record_cache_accesses(hits * len(result), misses * (len(keys) - len(result)))
+    return result
+
+
 def cache_hit_rate():
     """Returns the current cache hit rate.  This value is between 0 and 1.  It
     returns ``None`` if caching is deactivated.
@@ -23,10 +23,10 @@
                             (MEDIA_ROOT,))
 """
 
-import os, uuid, datetime, io
+import os, uuid, datetime, io, threading
 from contextlib import contextmanager
 from pathlib import Path
-import psycopg2
+import psycopg2, psycopg2.pool
 from django.conf import settings
 from jb_common.utils.base import mkdirs, getmtime_utc
 from jb_common.signals import storage_changed
@@ -40,6 +40,7 @@ class BlobStorage:
     Note the “full path” means that it must be complete.  *Important*: Any
     paths in the blob storage must not start with a slash.
     """
+    chunk_size = 64 * 1024
 
     def list(self, path):
         """Lists all files in the directory ``path``.  If ``path`` points to a file, an
@@ -71,6 +72,88 @@ class BlobStorage:
         """
         raise NotImplementedError
 
+    def getmtime_many(self, paths):
+        """Returns the modification timestamps of many files at once.  Backends
+        should override this if they can do it more efficiently than calling
+        `getmtime` for every path.
+
+        :param paths: full paths to files
+
+        :type paths: iterable of str
+
+        :return:
+          the modification timestamps of the files
+
+        :rtype: dict mapping str to datetime.datetime
+
+        :raises FileNotFoundError: if one of the files does not exist
+        """
+        return {path: self.getmtime(path) for path in paths}
+
+    def exists_many(self, paths):
+        """Returns whether the given files exist.  Backends should override this
+        if they can do it more efficiently than calling `getmtime` for every
+        path.
+
+        :param paths: full paths to files
+
+        :type paths: iterable of str
+
+        :return:
+          whether the files exist
+
+        :rtype: dict mapping str to bool
+        """
+        result = {}
+        for path in paths:
+            try:
+                self.getmtime(path)
+            except FileNotFoundError:
+                result[path] = False
+            else:
+                result[path] = True
+        return result
+
+    def getsize(self, path):
+        """Returns the size of the file at ``path``.
+
+        :param path: full path to a file
+
+        :type path: str
+
+        :return:
+          the size of the file in bytes
+
+        :rtype: int
+
+        :raises FileNotFoundError: if the file does not exist
+        """
+        raise NotImplementedError
+
+    def iter_chunks(self, path, start=0, end=None):
+        """Iterates over the content of the file at ``path`` in chunks of at most
+        `chunk_size` bytes.  This way, big files can be served without reading
+        them into memory.
+
+        :param path: full path to a file
+        :param start: offset of the first byte to be read
+        :param end: offset after the last byte to be read; if ``None``, the file
+          is read until its end
+
+        :type path: str
+        :type start: int
+        :type end: int or NoneType
+
+        :return:
+          the chunks of the file
+
+        :rtype: iterator over bytes
+
+        :raises FileNotFoundError: if the file does not exist; this is raised
+          when the iteration starts
+        """
+        raise NotImplementedError
+
     def unlink(self, path):
         """Removes the file at ``path``.  This must not be a directory.
 
@@ -157,9 +240,30 @@ class Filesystem(BlobStorage):
         """
         self.root = root or Path(settings.MEDIA_ROOT)
 
+    def list(self, path):
+        try:
+            return [entry.name for entry in os.scandir(self.root/path) if entry.is_file()]
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+
     def getmtime(self, path):
         return getmtime_utc(self.root/path)
 
+    def getsize(self, path):
+        return os.path.getsize(self.root/path)
+
+    def iter_chunks(self, path, start=0, end=None):
+        with open(self.root/path, "rb") as file_:
+            file_.seek(start)
+            remaining = end - start if end is not None else None
+            while remaining is None or remaining > 0:
+                chunk = file_.read(self.chunk_size if remaining is None else min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
     def unlink(self, path):
         os.unlink(self.root/path)
 
@@ -205,23 +309,30 @@ class PostgreSQL(BlobStorage):
     database using PostgreSQL's “large object” facility.  Moreover, it creates
     one table called “blobs” in the database to link the large object IDs
     (OIDs) with the pathname and an mtime timestamp.
+
+    Database connections are taken from a thread-safe pool and re-used.  If
+    all connections are in use, the calling thread waits until one is
+    returned, but not longer than ``connection_timeout`` seconds.  Note that
+    streamed responses hold a connection until they are finished.
     """
 
     class BlobFile(psycopg2.extensions.lobject):
 
-        def init_additional_attributes(self, path, connection, cursor):
-            self.path, self.connection, self.cursor = path, connection, cursor
+        def init_additional_attributes(self, path, storage, connection, cursor):
+            self.path, self.storage, self.connection, self.cursor = path, storage, connection, cursor
 
         def close(self):
-            if self.mode == "wb":
-                self.cursor.execute("UPDATE blobs SET mtime=now() WHERE path=%s;", (self.path,))
-            super().close()
-            self.connection.commit()
-            self.cursor.close()
-            self.connection.close()
+            try:
+                if self.mode == "wb":
+                    self.cursor.execute("UPDATE blobs SET mtime=now() WHERE path=%s;", (self.path,))
+                super().close()
+                self.connection.commit()
+                self.cursor.close()
+            finally:
+                self.storage.put_connection(self.connection)
 
 
-    def __init__(self, database, user, password, host):
+    def __init__(self, database, user, password, host, max_connections=10, connection_timeout=30):
         """Class constructor.  It creates the table “blobs” in the database if
         it doesn't exist yet.
 
@@ -229,13 +340,22 @@ class PostgreSQL(BlobStorage):
         :param user: PostgreSQL user name
         :param password: PostgreSQL password
         :param host: PostgreSQL hostname
+        :param max_connections: maximal number of database connections in the
+          pool of every process
+        :param connection_timeout: maximal number of seconds to wait for a free
+          database connection
 
         :type database: str
         :type user: str
         :type password: str
         :type host: str
+        :type max_connections: int
+        :type connection_timeout: int or float
         """
         self.database, self.user, self.password, self.host = database, user, password, host
+        self.max_connections, self.connection_timeout = max_connections, connection_timeout
+        self.pool = None
+        self.pool_lock = threading.Lock()
         with psycopg2.connect(database=self.database, user=self.user, password=self.password, host=self.host) \
              as connection, connection.cursor() as cursor:
             try:
@@ -244,6 +364,75 @@ class PostgreSQL(BlobStorage):
                                "PRIMARY KEY (path), UNIQUE (large_object_id));")
             except psycopg2.ProgrammingError:
                 connection.reset()
+        connection.close()
+
+    def get_connection(self):
+        """Takes a database connection from the pool.  It must be returned with
+        `put_connection`.  The pool is created lazily, and re-created in forked
+        processes, so that no connection is shared between processes.
+
+        :return:
+          a database connection
+
+        :rtype: psycopg2.extensions.connection
+
+        :raises TimeoutError: if no connection became free within
+          ``connection_timeout`` seconds
+        """
+        with self.pool_lock:
+            if self.pool is None or self.pool_pid != os.getpid():
+                # psycopg2 keeps returned connections only up to ``minconn``,
+                # so this must be the maximal number for re-using them.
+                self.pool = psycopg2.pool.ThreadedConnectionPool(
+                    self.max_connections, self.max_connections,
+                    database=self.database, user=self.user, password=self.password, host=self.host)
+                self.pool_pid = os.getpid()
+                self.pool_semaphore = threading.BoundedSemaphore(self.max_connections)
+            pool, semaphore = self.pool, self.pool_semaphore
+        if not semaphore.acquire(timeout=self.connection_timeout):
+            raise TimeoutError("All {} blob storage database connections were in use for {} seconds.".format(
+                self.max_connections, self.connection_timeout))
+        try:
+            return pool.getconn()
+        except psycopg2.Error:
+            semaphore.release()
+            raise
+
+    def put_connection(self, connection):
+        """Returns a database connection to the pool.  Uncommitted changes are
+        rolled back.
+
+        :param connection: the database connection taken with
+          `get_connection`
+
+        :type connection: psycopg2.extensions.connection
+        """
+        pool, semaphore = self.pool, self.pool_semaphore
+        if not connection.closed:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                pass
+        try:
+            pool.putconn(connection, close=bool(connection.closed))
+        except psycopg2.pool.PoolError:
+            # The connection belongs to a pool of the parent process.
+            pass
+        finally:
+            semaphore.release()
+
+    @contextmanager
+    def cursor(self):
+        """Context manager for a database cursor with a connection from the
+        pool.  The transaction is committed at the end, or rolled back if an
+        exception occurred.
+        """
+        connection = self.get_connection()
+        try:
+            with connection, connection.cursor() as cursor:
+                yield cursor
+        finally:
+            self.put_connection(connection)
 
     @staticmethod
     def get_oid(cursor, path):
@@ -278,22 +467,64 @@ class PostgreSQL(BlobStorage):
 
         :raises FileNotFoundError: if no file with that path exists
         """
-        with psycopg2.connect(database=self.database, user=self.user, password=self.password, host=self.host) \
-             as connection, connection.cursor() as cursor:
+        with self.cursor() as cursor:
             oid = self.get_oid(cursor, path)
             if oid is None:
                 raise FileNotFoundError("No such blob: {}".format(repr(path)))
-            large_object = connection.lobject(oid, "rb")
+            large_object = cursor.connection.lobject(oid, "rb")
             try:
                 yield large_object, cursor
             finally:
                 if not large_object.closed:
                     large_object.close()
 
+    def list(self, path):
+        prefix = path.rstrip("/") + "/"
+        with self.cursor() as cursor:
+            cursor.execute("SELECT path FROM blobs WHERE left(path, %s)=%s;", (len(prefix), prefix))
+            names = [row[0][len(prefix):] for row in cursor.fetchall()]
+        return [name for name in names if "/" not in name]
+
     def getmtime(self, path):
+        with self.cursor() as cursor:
+            cursor.execute("SELECT mtime FROM blobs WHERE path=%s;", (path,))
+            result = cursor.fetchone()
+        if result is None:
+            raise FileNotFoundError("No such blob: {}".format(repr(path)))
+        return result[0]
+
+    def getmtime_many(self, paths):
+        paths = list(paths)
+        with self.cursor() as cursor:
+            cursor.execute("SELECT path, mtime FROM blobs WHERE path = ANY(%s);", (paths,))
+            mtimes = dict(cursor.fetchall())
+        missing_paths = [path for path in paths if path not in mtimes]
+        if missing_paths:
+            raise FileNotFoundError("No such blob: {}".format(repr(missing_paths[0])))
+        return mtimes
+
+    def exists_many(self, paths):
+        paths = list(paths)
+        with self.cursor() as cursor:
+            cursor.execute("SELECT path FROM blobs WHERE path = ANY(%s);", (paths,))
+            existing_paths = {row[0] for row in cursor.fetchall()}
+        return {path: path in existing_paths for path in paths}
+
+    def getsize(self, path):
         with self.existing_large_object(path) as (large_object, cursor):
-            cursor.execute("SELECT mtime FROM blobs WHERE large_object_id=%s;", (large_object.oid,))
-            return cursor.fetchone()[0]
+            return large_object.seek(0, os.SEEK_END)
+
+    def iter_chunks(self, path, start=0, end=None):
+        with self.existing_large_object(path) as (large_object, cursor):
+            large_object.seek(start)
+            remaining = end - start if end is not None else None
+            while remaining is None or remaining > 0:
+                chunk = large_object.read(self.chunk_size if remaining is None else min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
 
     def unlink(self, path):
         with self.existing_large_object(path) as (large_object, cursor):
@@ -302,16 +533,20 @@ class PostgreSQL(BlobStorage):
 
     def open(self, path, mode="r"):
         mode += "b"
-        connection = psycopg2.connect(database=self.database, user=self.user, password=self.password, host=self.host)
-        cursor = connection.cursor()
-        oid = self.get_oid(cursor, path)
-        if oid is None:
-            large_object = connection.lobject(mode=mode, lobject_factory=self.BlobFile)
-            cursor.execute("INSERT INTO blobs VALUES (%s, %s, now());", (path, large_object.oid))
-        else:
-            large_object = connection.lobject(oid, mode, lobject_factory=self.BlobFile)
-            large_object.truncate()
-        large_object.init_additional_attributes(path, connection, cursor)
+        connection = self.get_connection()
+        try:
+            cursor = connection.cursor()
+            oid = self.get_oid(cursor, path)
+            if oid is None:
+                large_object = connection.lobject(mode=mode, lobject_factory=self.BlobFile)
+                cursor.execute("INSERT INTO blobs VALUES (%s, %s, now());", (path, large_object.oid))
+            else:
+                large_object = connection.lobject(oid, mode, lobject_factory=self.BlobFile)
+                large_object.truncate()
+        except psycopg2.Error:
+            self.put_connection(connection)
+            raise
+        large_object.init_additional_attributes(path, self, connection, cursor)
         return large_object
 
     def move(self, path, new_path):
@@ -17,17 +17,28 @@
 """Views for the OAI-PMH app.  Here, I implement everything realising the
 OAI-PMH protocol.
 
+`ListIdentifiers` and `ListRecords` deliver their results in pages of
+``OAI_PMH_PAGE_SIZE`` items.  The pages are ordered by (last modification, ID)
+of the processes, and the ``resumptionToken`` contains the last such pair of
+the previous page plus the original arguments.  Thus, the server does not need to
+keep any state of the harvest, and harvesters may resume a harvest even after a
+failure.  The responses are serialised record by record while they are sent.
+
+The datestamps of the items, as well as the ``from`` and ``until`` arguments,
+refer to the time of the last modification of the processes.  The serialised
+records are cached, so that incremental harvests only build the records of
+processes that have changed.
+
 Todos:
 
-- resumptionToken is not implemented at all.  It may be advisable to implement
-  it at least for `ListIdentifiers` and `ListRecords`.
 - Besides oai_dc, I need to implement Dataverse’s own OAI_PMH metadata format,
   filling the fields with the same content also used for CSV export.
 - Authentication needs to be added by moving the root of the OAI-PMH endpoints
   into a secret subpath like ``https://jb.example.com/krz54kr9182ad/oai-pmh/``.
 """
 
-import datetime
+import datetime, hashlib
+from collections import defaultdict
 from functools import lru_cache
 from xml.etree import ElementTree
 from xml.etree.ElementTree import SubElement
@@ -35,11 +46,14 @@ from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
 from django.utils.timezone import make_aware
 from django.conf import settings
+from django.core import signing
 from django.core.cache import cache
+from django.db.models import Q
 from django.utils import timezone
-from django.http import HttpResponse, Http404
-from jb_common.utils.base import get_all_models
-from samples.models import Process
+from django.utils.translation import get_language
+from django.http import HttpResponse, StreamingHttpResponse, Http404
+from jb_common.utils.base import get_all_models, get_many_from_cache, get_cache_generations
+from samples.models import Process, Sample
 
 
 def timestamp_isoformat(timestamp):
@@ -122,6 +136,44 @@ class HttpPmhResponse(HttpResponse):
         super().__init__(ElementTree.tostring(tree, encoding="utf8", method="xml"), content_type="application/xml")
 
 
+class StreamingPmhResponse(StreamingHttpResponse):
+    """HTTP response class for OAI-PMH responses with many items.  In contrast
+    to `HttpPmhResponse`, it never holds the complete XML tree in memory.
+    Instead, it sends the serialised items one by one.
+    """
+    def __init__(self, tree, verb, items):
+        """Class constructor.
+
+        :param ElementTree.Element tree: the XML tree as returned by
+          `create_response_tree`
+        :param str verb: the name of the element that contains the items,
+          e.g. ``"ListRecords"``
+        :param items: the serialised XML elements to be included into the
+          response element
+        :type items: iterable of bytes
+        """
+        def serialise():
+            head = ElementTree.tostring(tree, encoding="unicode", method="xml")
+            assert head.endswith("</OAI-PMH>")
+            yield ("<?xml version='1.0' encoding='UTF-8'?>\n" + head[:-len("</OAI-PMH>")] + "<{}>".format(verb)).encode()
+            yield from items
+            yield "</{}></OAI-PMH>".format(verb).encode()
+        super().__init__(serialise(), content_type="application/xml")
+
+
+def serialise_element(element):
+    """Serialises an XML element for `StreamingPmhResponse`.
+
+    :param ElementTree.Element element: the XML element
+
+    :returns:
+      the UTF-8-encoded XML, without XML declaration
+
+    :rtype: bytes
+    """
+    return ElementTree.tostring(element, encoding="unicode", method="xml").encode()
+
+
 def create_response_tree(request):
     """Creates an XML tree with fixed OAI-PMH elements.  In particular, it contains
     the ``<responseDate>`` and ``<request>`` elements.
@@ -177,20 +229,20 @@ class PmhError(Exception):
         return HttpPmhResponse(tree)
 
 
-def parse_timestamp(request, query_string_key):
-    """Returns the timestamp found in the query string.  Note that the timestamp
-    may be optional, so this function may return ``None``.
+def parse_timestamp(timestamp):
+    """Returns the timestamp given in an argument of the request.  Note that the
+    timestamp may be optional, so this function may return ``None``.
 
-    :param HttpRequest request: the original HTTP request object
-    :param str query_string_key: name of the query string parameter containing
-      the timestamp
+    :param timestamp: the value of the argument containing the timestamp, or
+      ``None`` if it was not given
+
+    :type timestamp: str or NoneType
 
     :returns:
       the timestamp, or ``None`` of none was given
 
     :rtype: datetime.datetime or ``NoneType``
     """
-    timestamp = request.GET.get(query_string_key)
     if timestamp:
         try:
             timestamp = datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ")
@@ -200,6 +252,30 @@ def parse_timestamp(request, query_string_key):
     return timestamp
 
 
+def build_header(model_name, pk, last_modified):
+    """Returns the header of an item, ready to be included into an OAI-PMH
+    response.  Its datestamp is the time of the last modification of the
+    process, because this is what the ``from`` and ``until`` arguments refer
+    to.
+
+    :param str model_name: the class name of the process
+    :param object pk: the primary key of the process
+    :param datetime.datetime last_modified: the time of the last modification
+      of the process
+
+    :returns:
+      the XML fragment with the ``<header>`` element as the top-level element
+
+    :rtype: ElementTree.Element
+    """
+    header = ElementTree.Element("header")
+    SubElement(header, "identifier").text = model_name + ":" + escape_pk(pk)
+    SubElement(header, "datestamp").text = timestamp_isoformat(last_modified)
+    SubElement(header, "setSpec").text = "all"
+    SubElement(header, "setSpec").text = model_name
+    return header
+
+
 def build_record(process):
     """Returns the metadata record for the given process, ready to be included into
     an OAI-PMH response.
@@ -210,14 +286,10 @@ def build_record(process):
       the XML fragment with the ``<record>`` element as the top-level element
       representing the data for the given process.
 
-    :rtype: ElementTree.ElementTree
+    :rtype: ElementTree.Element
     """
     record = ElementTree.Element("record")
-    header = SubElement(record, "header")
-    SubElement(header, "identifier").text = process.__class__.__name__ + ":" + escape_pk(process.pk)
-    SubElement(header, "datestamp").text = process.timestamp.date().strftime("%Y-%m-%d")
-    SubElement(header, "setSpec").text = "all"
-    SubElement(header, "setSpec").text = process.__class__.__name__
+    record.append(build_header(process.__class__.__name__, process.pk, process.last_modified))
     metadata = SubElement(record, "metadata")
     oai_dc = SubElement(metadata, "oai_dc:dc", {"xmlns:oai_dc": "http://www.openarchives.org/OAI/2.0/oai_dc/",
                                                 "xmlns:dc": "http://purl.org/dc/elements/1.1/",
@@ -231,6 +303,49 @@ def build_record(process):
     return record
 
 
+def get_serialised_records(processes):
+    """Returns the serialised metadata records for the given processes.  The
+    records are taken from the cache if possible.  The cache key contains the
+    time of the last modification of the process, the current language, and the
+    cache generations of the samples of the process (their names are part of
+    the title), so a record is rebuilt exactly when its process or one of its
+    samples has changed.  Only for the rebuilt records, the
+    actual instances of the processes are fetched from the database.
+
+    :param processes: the processes to get the records for; they need not be
+      actual instances
+
+    :type processes: list of `samples.models.Process`
+
+    :returns:
+      the serialised ``<record>`` elements, in the same order as `processes`
+
+    :rtype: list of bytes
+    """
+    sample_ids = defaultdict(set)
+    for process_id, sample_id in Sample.processes.through.objects.filter(
+            process_id__in=[process.id for process in processes]).values_list("process_id", "sample_id"):
+        sample_ids[process_id].add(sample_id)
+    generations = get_cache_generations("sample:{}".format(sample_id)
+                                        for sample_id in set().union(*sample_ids.values()))
+    language = get_language()
+    keys = {}
+    for process in processes:
+        sample_generations = ";".join("{}:{}".format(sample_id, generations["sample:{}".format(sample_id)])
+                                      for sample_id in sorted(sample_ids[process.id]))
+        keys[process.id] = "oai-pmh-record:{}:{}:{}:{}".format(
+            process.id, process.last_modified.timestamp(), language,
+            hashlib.sha1(sample_generations.encode()).hexdigest()[:10])
+    records = get_many_from_cache(keys.values())
+    missing_processes = [process for process in processes if keys[process.id] not in records]
+    if missing_processes:
+        new_records = {keys[process.id]: serialise_element(build_record(process))
+                       for process in Process.resolve_actual_instances(missing_processes)}
+        cache.set_many(new_records)
+        records.update(new_records)
+    return [records[keys[process.id]] for process in processes]
+
+
 def get_record(request):
     """Handles the ``GetRecord`` verb of the OAI-PMH protocol.
 
@@ -239,10 +354,9 @@ def get_record(request):
     :returns:
       the HTTP response to the request
 
-    :rtype: HttpPmhResponse
+    :rtype: StreamingPmhResponse
     """
     tree = create_response_tree(request)
-    response_element = ElementTree.Element("GetRecord")
     try:
         if request.GET["metadataPrefix"] != "oai_dc":
             raise PmhError("cannotDisseminateFormat", "Only oai_dc is allowed currently")
@@ -260,9 +374,7 @@ def get_record(request):
         process = model.objects.get(pk=pk)
     except model.DoesNotExist:
         raise PmhError("idDoesNotExist")
-    response_element.append(build_record(process))
-    tree.append(response_element)
-    return HttpPmhResponse(tree)
+    return StreamingPmhResponse(tree, "GetRecord", get_serialised_records([process]))
 
 
 def identify(request):
@@ -282,8 +394,8 @@ def identify(request):
     SubElement(response_element, "protocolVersion").text = "2.0"
     timestamp = cache.get("oai-pmh:first-timestamp")
     if not timestamp:
-        first_process = Process.objects.first()
-        timestamp = first_process.timestamp if first_process else datetime.datetime(1900, 0, 0)
+        first_process = Process.objects.order_by("last_modified").first()
+        timestamp = first_process.last_modified if first_process else datetime.datetime(1900, 0, 0)
         cache.set("oai-pmh:first-timestamp", timestamp, 3600)
     SubElement(response_element, "earliestDatestamp").text = timestamp_isoformat(timestamp)
     SubElement(response_element, "deletedRecord").text = "no"
@@ -293,47 +405,138 @@ def identify(request):
     return HttpPmhResponse(tree)
 
 
-def list_identifiers(request):
-    """Handles the ``ListIdentifiers`` verb of the OAI-PMH protocol.
+def parse_list_arguments(request, verb):
+    """Returns the arguments of a ``ListIdentifiers`` or ``ListRecords`` request.
+    If the request contains a ``resumptionToken``, the arguments of the
+    original request are taken from the token.
+
+    :param HttpRequest request: the original HTTP request object
+    :param str verb: the OAI-PMH verb of the request
+
+    :returns:
+      the arguments of the original request, the (last modification, ID) pair
+      of the last process of the previous page or ``None`` for the first page, and the
+      number of items delivered in the previous pages
+
+    :rtype: dict[str, str], (datetime.datetime, int) or NoneType, int
+
+    :raises PmhError: if the resumption token is invalid or given together with
+      other arguments
+    """
+    token = request.GET.get("resumptionToken")
+    if token is None:
+        return request.GET.dict(), None, 0
+    if set(request.GET) != {"verb", "resumptionToken"}:
+        raise PmhError("badArgument", "resumptionToken is an exclusive argument")
+    try:
+        token = signing.loads(token, salt="oai-pmh:resumption-token")
+    except signing.BadSignature:
+        raise PmhError("badResumptionToken")
+    if token["verb"] != verb:
+        raise PmhError("badResumptionToken")
+    last_item = datetime.datetime.fromisoformat(token["timestamp"]), token["id"]
+    return token["arguments"], last_item, token["cursor"]
+
+
+def create_resumption_token(verb, arguments, process, cursor):
+    """Returns the resumption token for the next page of a ``ListIdentifiers`` or
+    ``ListRecords`` response.  The token is signed so that it cannot be
+    tampered with, but it is not encrypted.  It does not expire.
+
+    :param str verb: the OAI-PMH verb of the request
+    :param dict[str, str] arguments: the arguments of the original request
+    :param Process process: the last process on the current page
+    :param int cursor: the number of items delivered so far, including the
+      current page
+
+    :returns:
+      the resumption token
+
+    :rtype: str
+    """
+    arguments = {key: value for key, value in arguments.items() if key in {"metadataPrefix", "from", "until", "set"}}
+    return signing.dumps({"verb": verb, "arguments": arguments, "timestamp": process.last_modified.isoformat(),
+                          "id": process.id, "cursor": cursor}, salt="oai-pmh:resumption-token", compress=True)
+
+
+def list_items(request, verb, serialise_items):
+    """Handles the ``ListIdentifiers`` and ``ListRecords`` verbs of the OAI-PMH
+    protocol.  The processes of all process classes are delivered in pages of
+    ``OAI_PMH_PAGE_SIZE`` items, ordered by time of last modification and ID.
+    The next page is found by the (last modification, ID) pair of the last
+    process of the previous page.  If a process is modified during a harvest,
+    it moves to the end and is delivered again; no process is skipped.
 
     :param HttpRequest request: the original HTTP request object
+    :param str verb: the OAI-PMH verb of the request
+    :param serialise_items: function which takes a list of processes and
+      returns the serialised XML elements representing them; the processes
+      are no actual instances, and only their fields ``id``,
+      ``content_type``, ``actual_object_id``, and ``last_modified`` are loaded
+
+    :type serialise_items: callable
 
     :returns:
       the HTTP response to the request
 
-    :rtype: HttpPmhResponse
+    :rtype: StreamingPmhResponse
     """
-    def process_model(response_element, model, from_, until):
-        query = model.objects.values_list("pk", "timestamp")
-        if from_:
-            query = query.filter(timestamp__gte=from_)
-        if until:
-            query = query.filter(timestamp__lte=until)
-        if not query.exists():
-            raise PmhError("noRecordsMatch")
-        for id_, timestamp in query.iterator():
-            header = SubElement(response_element, "header")
-            SubElement(header, "identifier").text = model.__name__ + ":" + escape_pk(id_)
-            SubElement(header, "datestamp").text = timestamp.date().strftime("%Y-%m-%d")
-            SubElement(header, "setSpec").text = "all"
-            SubElement(header, "setSpec").text = model.__name__
-    tree = create_response_tree(request)
-    response_element = ElementTree.Element("ListIdentifiers")
+    arguments, last_item, cursor = parse_list_arguments(request, verb)
     try:
-        if request.GET["metadataPrefix"] != "oai_dc":
+        if arguments["metadataPrefix"] != "oai_dc":
             raise PmhError("cannotDisseminateFormat", "Only oai_dc is allowed currently")
     except KeyError:
         raise PmhError("badArgument", "metadataPrefix is missing")
-    from_ = parse_timestamp(request, "from")
-    until = parse_timestamp(request, "until")
-    set_spec = request.GET.get("set", "all")
+    from_ = parse_timestamp(arguments.get("from"))
+    until = parse_timestamp(arguments.get("until"))
+    set_spec = arguments.get("set", "all")
     if set_spec == "all":
-        for model in get_all_processes().values():
-            process_model(response_element, model, from_, until)
+        process_models = get_all_processes().values()
     else:
-        process_model(response_element, get_all_processes()[set_spec], from_, until)
-    tree.append(response_element)
-    return HttpPmhResponse(tree)
+        try:
+            process_models = [get_all_processes()[set_spec]]
+        except KeyError:
+            raise PmhError("badArgument", "This set name is unknown")
+    query = Process.objects.filter(content_type__in=ContentType.objects.get_for_models(*process_models).values())
+    if from_:
+        query = query.filter(last_modified__gte=from_)
+    if until:
+        query = query.filter(last_modified__lt=until + datetime.timedelta(seconds=1))
+    if last_item:
+        last_modified, id_ = last_item
+        query = query.filter(Q(last_modified__gt=last_modified) | Q(last_modified=last_modified, id__gt=id_))
+    page_size = settings.OAI_PMH_PAGE_SIZE
+    query = query.only("id", "content_type", "actual_object_id", "last_modified")
+    page = list(query.order_by("last_modified", "id")[:page_size + 1])
+    if not page and not last_item:
+        raise PmhError("noRecordsMatch")
+    complete = len(page) <= page_size
+    page = page[:page_size]
+    def items():
+        yield from serialise_items(page)
+        if cursor or not complete:
+            token = ElementTree.Element("resumptionToken", {"cursor": str(cursor)})
+            if not complete:
+                token.text = create_resumption_token(verb, arguments, page[-1], cursor + len(page))
+            yield serialise_element(token)
+    return StreamingPmhResponse(create_response_tree(request), verb, items())
+
+
+def list_identifiers(request):
+    """Handles the ``ListIdentifiers`` verb of the OAI-PMH protocol.
+
+    :param HttpRequest request: the original HTTP request object
+
+    :returns:
+      the HTTP response to the request
+
+    :rtype: StreamingPmhResponse
+    """
+    def serialise_headers(processes):
+        for process in processes:
+            model_name = ContentType.objects.get_for_id(process.content_type_id).model_class().__name__
+            yield serialise_element(build_header(model_name, process.actual_object_id, process.last_modified))
+    return list_items(request, "ListIdentifiers", serialise_headers)
 
 
 def list_metadata_formats(request):
@@ -364,39 +567,9 @@ def list_records(request):
     :returns:
       the HTTP response to the request
 
-    :rtype: HttpPmhResponse
+    :rtype: StreamingPmhResponse
     """
-    def process_model(response_element, model, from_, until):
-        query = model.objects.all()
-        if from_:
-            query = query.filter(timestamp__gte=from_)
-        if until:
-            query = query.filter(timestamp__lte=until)
-        if not query.exists():
-            raise PmhError("noRecordsMatch")
-        for process in query.iterator():
-            response_element.append(build_record(process))
-    tree = create_response_tree(request)
-    response_element = ElementTree.Element("ListRecords")
-    try:
-        if request.GET["metadataPrefix"] != "oai_dc":
-            raise PmhError("cannotDisseminateFormat", "Only oai_dc is allowed currently")
-    except KeyError:
-        raise PmhError("badArgument", "metadataPrefix is missing")
-    from_ = parse_timestamp(request, "from")
-    until = parse_timestamp(request, "until")
-    set_spec = request.GET.get("set", "all")
-    if set_spec == "all":
-        for model in get_all_processes().values():
-            process_model(response_element, model, from_, until)
-    else:
-        try:
-            model = get_all_processes()[set_spec]
-        except KeyError:
-            raise PmhError("badArgument", "This set name is unknown")
-        process_model(response_element, model, from_, until)
-    tree.append(response_element)
-    return HttpPmhResponse(tree)
+    return list_items(request, "ListRecords", get_serialised_records)
 
 
 def list_sets(request):
@@ -35,12 +35,13 @@
             mapping topic names to topic IDs.
 """
 
-import mimetypes, json, logging, os, datetime, time, random, re, decimal, urllib, _thread, io
+import mimetypes, json, logging, os, datetime, time, random, re, decimal, _thread, threading, io, concurrent.futures
+import http.client, urllib.error, urllib.parse, urllib.request, urllib.response
 from http import cookiejar
 from . import settings
 
 
-__all__ = ["login", "logout", "connection", "primary_keys", "JuliaBaseError", "setup_logging",
+__all__ = ["login", "logout", "connection", "primary_keys", "JuliaBaseError", "Pipeline", "setup_logging",
            "format_timestamp", "parse_timestamp", "as_json"]
 
 
@@ -282,7 +283,8 @@ class JuliaBaseError(Exception):
       JuliaBase apps for the tables with the error codes.
 
     :ivar error_message: A description of the error.  If `error_code` is ``1``, it
-      contains the URL to the error page (without the domain name).
+      contains the URL to the error page (without the domain name), or, for
+      items of :py:func:`~jb_remote.samples.submit_many`, the form errors.
 
     :type error_code: int
     :type error_message: str
@@ -299,49 +301,159 @@ class JuliaBaseConnection:
     """Class for the routines that connect to the database at HTTP level.
     This is a singleton class, and its only instance resides at top-level in
     this module.
+
+    Every thread keeps its own persistent HTTP connections to the server, so
+    that consecutive requests don't pay for new TCP and TLS handshakes, and so
+    that requests from different threads (see :py:class:`Pipeline`) can run
+    concurrently.  The session and CSRF cookies are shared by all threads.
     """
     cookie_jar = cookiejar.CookieJar()
-    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(cookie_jar))
     http_headers = [("User-agent", "JuliaBase-Remote/1.0"),
                     ("X-requested-with", "XMLHttpRequest"),
                     ("Accept", "application/json,text/html;q=0.9,application/xhtml+xml;q=0.9,text/*;q=0.8,*/*;q=0.7")]
-    opener.addheaders = http_headers
+    redirect_codes = {301, 302, 303, 307, 308}
 
     def __init__(self):
         self.username = None
         self.root_url = None
+        self.csrf_token = None
+        self.local = threading.local()
+
+    def _get_http_connection(self, scheme, netloc):
+        """Returns the persistent HTTP connection of the current thread to the
+        given server.  It is created if necessary.
+
+        :param scheme: the URL scheme, i.e. ``"http"`` or ``"https"``
+        :param netloc: the host, with an optional port
+
+        :type scheme: str
+        :type netloc: str
+
+        :return:
+          the HTTP connection, whether it has been used before
+
+        :rtype: ``http.client.HTTPConnection``, bool
+        """
+        try:
+            http_connections = self.local.http_connections
+        except AttributeError:
+            http_connections = self.local.http_connections = {}
+        http_connection = http_connections.get((scheme, netloc))
+        if http_connection:
+            return http_connection, True
+        connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        http_connection = http_connections[scheme, netloc] = connection_class(netloc, timeout=settings.HTTP_TIMEOUT)
+        return http_connection, False
+
+    def _drop_http_connection(self, scheme, netloc):
+        http_connection = self.local.http_connections.pop((scheme, netloc), None)
+        if http_connection:
+            http_connection.close()
+
+    def _send(self, method, url, body, headers):
+        """Sends one HTTP request over the persistent connection of the current
+        thread and reads the complete response, so that the connection is free
+        for the next request.  If the server has closed a re-used connection
+        in the meantime, the request is repeated once over a new connection.
+
+        :param method: the HTTP method
+        :param url: the absolute URL
+        :param body: the request body
+        :param headers: the request headers, without cookies
+
+        :type method: str
+        :type url: str
+        :type body: bytes or NoneType
+        :type headers: dict mapping str to str
+
+        :return:
+          the response
+
+        :rtype: ``urllib.response.addinfourl``
+
+        :raises OSError: if a network error occurred
+        :raises http.client.HTTPException: if the server's response was
+            invalid
+        """
+        scheme, netloc, path, query, __ = urllib.parse.urlsplit(url)
+        selector = path + "?" + query if query else path
+        cookie_request = urllib.request.Request(url, method=method)
+        self.cookie_jar.add_cookie_header(cookie_request)
+        headers = dict(headers, **dict(cookie_request.header_items()))
+        while True:
+            http_connection, reused = self._get_http_connection(scheme, netloc)
+            try:
+                http_connection.request(method, selector, body, headers)
+                response = http_connection.getresponse()
+                content = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self._drop_http_connection(scheme, netloc)
+                if not reused:
+                    raise
+            except (OSError, http.client.HTTPException):
+                self._drop_http_connection(scheme, netloc)
+                raise
+            else:
+                break
+        if response.will_close:
+            self._drop_http_connection(scheme, netloc)
+        self.cookie_jar.extract_cookies(response, cookie_request)
+        return urllib.response.addinfourl(io.BytesIO(content), response.msg, url, response.status)
 
     def _do_http_request(self, url, data=None):
         logging.debug("{0} {1!r}".format(url, data))
+        headers = dict(self.http_headers)
+        if self.csrf_token:
+            headers["X-CSRFToken"] = self.csrf_token
         if data is None:
-            request = urllib.request.Request(url)
+            method, body = "GET", None
         else:
-            content_type, body = encode_multipart_formdata(data)
-            headers = {"Content-Type": content_type, "Referer": url}
-            request = urllib.request.Request(url, body, headers)
+            if isinstance(data, list):
+                content_type, body = "application/json", json.dumps(data).encode()
+            else:
+                content_type, body = encode_multipart_formdata(data)
+            if isinstance(body, str):
+                body = body.encode()
+            method = "POST"
+            headers.update({"Content-Type": content_type, "Referer": url})
         max_cycles = 10
+        max_redirections = 10
         while max_cycles > 0:
             max_cycles -= 1
-            logging.debug(f"Request against {request.get_full_url()}")
+            logging.debug(f"Request against {url}")
             try:
-                return self.opener.open(request)
-            except urllib.error.HTTPError as error:
-                if error.code in [404, 422] and error.info()["Content-Type"].startswith("application/json"):
-                    error_code, error_message = json.loads(error.read().decode())
-                    raise JuliaBaseError(error_code, error_message)
-                server_error_message = error.read().decode()
-                error.msg = "{}\n\n{}".format(error.msg, server_error_message)
-                raise error
-            except urllib.error.URLError:
+                response = self._send(method, url, body, headers)
+            except (OSError, http.client.HTTPException):
                 if max_cycles == 0:
                     logging.error("Request failed.")
                     raise
+            else:
+                if response.status in self.redirect_codes and max_redirections > 0:
+                    max_redirections -= 1
+                    max_cycles += 1
+                    url = urllib.parse.urljoin(url, response.info()["Location"])
+                    if response.status not in {307, 308}:
+                        method, body = "GET", None
+                        headers.pop("Content-Type", None)
+                    continue
+                if response.status >= 400:
+                    content_type = response.info()["Content-Type"] or ""
+                    if response.status in [404, 422] and content_type.startswith("application/json"):
+                        error_code, error_message = json.loads(response.read().decode())
+                        raise JuliaBaseError(error_code, error_message)
+                    server_error_message = response.read().decode(errors="replace")
+                    raise urllib.error.HTTPError(url, response.status, "{}\n\n{}".format(
+                        http.client.responses.get(response.status, ""), server_error_message), response.info(),
+                        io.BytesIO(server_error_message.encode()))
+                return response
             time.sleep(3 * random.random())
 
     @staticmethod
     def _clean_data(data):
         if data is None:
             return None
+        if isinstance(data, list):
+            return [JuliaBaseConnection._clean_data(item) for item in data]
         cleaned_data = {}
         for key, value in data.items():
             key = clean_header(key)
@@ -364,12 +476,13 @@ class JuliaBaseConnection:
             ``"/samples/10-TB-1"``.  “Relative” may be misguiding here: only
             the domain is omitted.
         :param data: the POST data, or ``None`` if it's supposed to be a GET
-            request.
+            request.  If it is a list of dicts, it is sent as a JSON array.
         :param response_is_json: whether the content type of the response must
             be JSON
 
         :type relative_url: str
-        :type data: dict mapping str to str, int, float, bool, file, or list
+        :type data: dict mapping str to str, int, float, bool, file, or list;
+          or list of dict
         :type response_is_json: bool
 
         :return:
@@ -397,7 +510,7 @@ class JuliaBaseConnection:
         csrf_cookies = {cookie for cookie in self.cookie_jar if cookie.name == "csrftoken"}
         if csrf_cookies:
             assert len(csrf_cookies) == 1
-            self.opener.addheaders = self.http_headers + [("X-CSRFToken", csrf_cookies.pop().value)]
+            self.csrf_token = csrf_cookies.pop().value
 
     def login(self, root_url, username, password):
         self.root_url = root_url
@@ -412,7 +525,7 @@ class JuliaBaseConnection:
 
     def logout(self):
         self.open("logout_remote_client")
-        self.username = self.root_url = None
+        self.username = self.root_url = self.csrf_token = None
 
 connection = JuliaBaseConnection()
 
@@ -444,6 +557,81 @@ def logout():
     logging.info("Successfully logged-out.")
 
 
+class Pipeline:
+    """Context manager for sending requests to JuliaBase concurrently.  Every
+    worker thread uses its own keep-alive connection, while the login session
+    is shared.  It should be used like this::
+
+        with Pipeline() as pipeline:
+            for measurement in measurements:
+                pipeline.submit(measurement.submit)
+
+    When leaving the ``with`` block, all calls have finished.  Every call has
+    its own future in :py:attr:`futures`, in the order of submission, holding
+    its result or its exception.  Failed calls are logged in the order of
+    submission, too, and the exception of the first failed call is re-raised,
+    unless the ``with`` block itself raised an exception.  This way, error
+    reporting doesn't depend on the order in which the requests happen to
+    complete.
+
+    Note that calls in the same pipeline must not depend on each other, e.g.
+    a process must not refer to a sample which is created in the same
+    pipeline.
+
+    :ivar futures: the futures of all calls, in the order of submission
+
+    :type futures: list of ``concurrent.futures.Future``
+    """
+
+    def __init__(self, max_workers=None):
+        """
+        :param max_workers: the maximal number of concurrent requests; defaults
+            to ``settings.MAX_PARALLEL_REQUESTS``
+
+        :type max_workers: int
+        """
+        self.max_workers = max_workers or settings.MAX_PARALLEL_REQUESTS
+        self.futures = []
+        self.executor = None
+
+    def submit(self, function, *args, **kwargs):
+        """Schedules a call in the background.
+
+        :param function: the callable to be run in a worker thread, e.g. the
+            ``submit`` method of a process
+        :param args: the positional arguments of the call
+        :param kwargs: the keyword arguments of the call
+
+        :type function: callable
+
+        :return:
+          the future of the call
+
+        :rtype: ``concurrent.futures.Future``
+        """
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(self.max_workers)
+        future = self.executor.submit(function, *args, **kwargs)
+        self.futures.append(future)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, tb):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        first_error = None
+        for i, future in enumerate(self.futures):
+            error = future.exception()
+            if error:
+                logging.error("Pipelined call #{0} failed: {1}".format(i, error))
+                first_error = first_error or error
+        if first_error and type_ is None:
+            raise first_error
+
+
 class PrimaryKeys:
     """Dictionary-like class for storing primary keys.  I use this class only
     to delay the costly loading of the primary keys until they are really
@@ -15,10 +15,13 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-from .common import connection, primary_keys, comma_separated_ids, double_urlquote, format_timestamp, parse_timestamp, logging
+import threading, collections
+from .common import connection, primary_keys, comma_separated_ids, double_urlquote, format_timestamp, parse_timestamp, \
+    logging, JuliaBaseError
+from . import settings
 
 
-__all__ = ["TemporaryMySamples", "Sample", "Result", "User"]
+__all__ = ["TemporaryMySamples", "submit_many", "Sample", "Result", "User"]
 
 
 primary_keys.components.add("external_operators=*")
@@ -39,7 +42,18 @@ class TemporaryMySamples:
     added to “My Samples”.  After having executed this code, those samples that
     hadn’t been on “My Samples” already are removed from “My Samples”.  This
     way, the “My Samples” list is unchanged eventually.
+
+    It may be used by concurrent threads (see :py:class:`~jb_remote.common.Pipeline`):
+    The samples are counted, so that a sample is removed only after the last
+    thread that needs it has left the ``with`` block.
     """
+    lock = threading.Lock()
+    usages = collections.Counter()
+    """Mapping of sample IDs to the number of currently active context managers
+    needing them."""
+    added_sample_ids = set()
+    """IDs of the samples which have been added to “My Samples” by this class
+    and must be removed again eventually."""
 
     def __init__(self, sample_ids):
         """
@@ -48,14 +62,63 @@ class TemporaryMySamples:
 
         :type sample_ids: list of int or int
         """
-        self.sample_ids = sample_ids if isinstance(sample_ids, (list, tuple, set)) else [sample_ids]
+        self.sample_ids = set(sample_ids if isinstance(sample_ids, (list, tuple, set)) else [sample_ids])
 
     def __enter__(self):
-        self.changed_sample_ids = connection.open("change_my_samples", {"add": comma_separated_ids(self.sample_ids)})
+        with self.lock:
+            new_sample_ids = {sample_id for sample_id in self.sample_ids if not self.usages[sample_id]}
+            if new_sample_ids:
+                self.added_sample_ids.update(
+                    connection.open("change_my_samples", {"add": comma_separated_ids(new_sample_ids)}))
+            self.usages.update(self.sample_ids)
 
     def __exit__(self, type_, value, tb):
-        if self.changed_sample_ids:
-            connection.open("change_my_samples", {"remove": comma_separated_ids(self.changed_sample_ids)})
+        with self.lock:
+            self.usages.subtract(self.sample_ids)
+            obsolete_sample_ids = {sample_id for sample_id in self.sample_ids
+                                   if not self.usages[sample_id] and sample_id in self.added_sample_ids}
+            for sample_id in self.sample_ids:
+                if not self.usages[sample_id]:
+                    del self.usages[sample_id]
+            if obsolete_sample_ids:
+                self.added_sample_ids.difference_update(obsolete_sample_ids)
+                connection.open("change_my_samples", {"remove": comma_separated_ids(obsolete_sample_ids)})
+
+
+def submit_many(relative_url, items, sample_ids=()):
+    """Adds many processes of the same class to the database with the bulk
+    import of the server.  The items are sent in chunks of
+    ``settings.BULK_SUBMIT_SIZE``.  Items which could not be added don't stop
+    the others from being added.
+
+    :param relative_url: the URL of the bulk import of the process class,
+        e.g. ``"solarsimulator_measurements/bulk_add/"``
+    :param items: the POST data of the processes, as it would be sent for a
+        single submission
+    :param sample_ids: the IDs of all samples the processes refer to; they are
+        put on “My Samples” temporarily
+
+    :type relative_url: str
+    :type items: list of dict mapping str to object
+    :type sample_ids: iterable of int
+
+    :return:
+      the results of the items, in the same order; it is the ID of the new
+      process, or the error if it couldn't be added
+
+    :rtype: list of int or `JuliaBaseError`
+    """
+    results = []
+    with TemporaryMySamples(set(sample_ids)):
+        for i in range(0, len(items), settings.BULK_SUBMIT_SIZE):
+            for result in connection.open(relative_url, items[i:i + settings.BULK_SUBMIT_SIZE]):
+                if isinstance(result, list):
+                    error = JuliaBaseError(*result)
+                    logging.error("Item #{0} could not be added: {1}".format(len(results), error))
+                    results.append(error)
+                else:
+                    results.append(result)
+    return results
 
 
 class Sample:
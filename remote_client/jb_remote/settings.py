@@ -38,6 +38,12 @@ from pathlib import Path
 # Must end in "/".
 ROOT_URL = None
 TESTSERVER_ROOT_URL = "https://demo.juliabase.org/"
+# In seconds.
+HTTP_TIMEOUT = 120
+# Maximal number of concurrent requests of a ``Pipeline``.
+MAX_PARALLEL_REQUESTS = 4
+# Number of processes sent in one request by ``submit_many``.
+BULK_SUBMIT_SIZE = 200
 
 SMTP_SERVER = "mailrelay.example.com:587"
 # If not empty, TLS is used.
@@ -376,7 +376,7 @@ class SolarsimulatorMeasurement:
         self.edit_important = True
         self.edit_description = None
 
-    def submit(self, only_single_cell_added=False):
+    def get_data(self):
         if not self.operator:
             self.operator = connection.username
         data = {"sample": self.sample_id,
@@ -391,6 +391,10 @@ class SolarsimulatorMeasurement:
                 "edit_description-important": self.edit_important}
         for index, cell in enumerate(self.cells.values()):
             data.update(cell.get_data(index))
+        return data
+
+    def submit(self, only_single_cell_added=False):
+        data = self.get_data()
         with TemporaryMySamples(self.sample_id):
             if self.id:
                 query_string = "?only_single_cell_added=true" if only_single_cell_added else ""
@@ -401,6 +405,32 @@ class SolarsimulatorMeasurement:
                 logging.info("Added solarsimulator measurement {0}.".format(self.id))
         return self.id
 
+    @staticmethod
+    def submit_many(measurements):
+        """Adds many new measurements at once.  Measurements which could not be
+        added keep ``None`` as their ID.
+
+        :param measurements: the new measurements
+
+        :type measurements: list of `SolarsimulatorMeasurement`
+
+        :return:
+          the results of the measurements, see
+          :py:func:`~jb_remote.samples.submit_many`
+
+        :rtype: list of int or `JuliaBaseError`
+        """
+        assert not any(measurement.id for measurement in measurements)
+        results = submit_many("solarsimulator_measurements/bulk_add/",
+                              [measurement.get_data() for measurement in measurements],
+                              {measurement.sample_id for measurement in measurements})
+        for measurement, result in zip(measurements, results):
+            if not isinstance(result, JuliaBaseError):
+                measurement.id = result
+        logging.info("Added {0} of {1} solarsimulator measurements.".format(
+            sum(measurement.id is not None for measurement in measurements), len(measurements)))
+        return results
+
 
 class SolarsimulatorCellMeasurement:
 
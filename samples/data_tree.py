@@ -20,6 +20,7 @@ data contain in a certain model instance.  Such tree-like representations are
 used e.g. for the CSV export of model instances.
 """
 
+import copy, itertools
 from django.utils.functional import Promise
 
 
@@ -40,7 +41,7 @@ class DataNode:
     :type name: str
     :type descriptive_name: str
     :type items: list of `DataItem`
-    :type childen: list of `DataNode`
+    :type childen: list of `DataNode` or `LazyChildren`
     """
 
     def __init__(self, instance, descriptive_name=""):
@@ -76,6 +77,11 @@ class DataNode:
         2. The names of the ancestor nodes are prepended, e.g. ``"5-chamber
            deposition, layer #2"``
 
+        The nodes below the renaming level are not renamed in place but
+        replaced by copies (see `copy`), because they may be shared with other
+        trees, e.g. the history of a parent sample with the trees of all of its
+        pieces.
+
         :param renaming_offset: number of the nesting levels still to be stepped
             down before disambiguation of the node names takes place.
 
@@ -84,6 +90,7 @@ class DataNode:
         names = [child.name for child in self.children]
         for i, child in enumerate(self.children):
             if renaming_offset < 1:
+                child = self.children[i] = child.copy()
                 if names.count(child.name) > 1:
                     process_index = names[:i].count(child.name) + 1
                     if process_index > 1:
@@ -92,6 +99,21 @@ class DataNode:
                     child.name = self.name + ", " + child.name
             child.find_unambiguous_names(renaming_offset - 1)
 
+    def copy(self):
+        """Returns a shallow copy of this node.  The copy has its own lists of
+        items and children, so that they can be changed without affecting this
+        node.  The items and children themselves are shared.
+
+        :return:
+          the copy of this node
+
+        :rtype: `DataNode`
+        """
+        node = copy.copy(self)
+        node.items = list(self.items)
+        node.children = list(self.children)
+        return node
+
     def complete_items_in_children(self, key_sets=None, item_cache=None):
         """Assures that all decendents of this node that have the same node
         name also have the same item keys.  This is interesting for kinds of
@@ -154,6 +176,81 @@ class DataNode:
         return repr(self.name)
 
 
+class LazyChildren:
+    """Children of a `DataNode` which are created only while being iterated
+    over.  It is used for the row nodes of big table exports, so that
+    :py:func:`samples.utils.views.table_export` can walk through them twice
+    without holding all of their data trees in memory.  The instances are read
+    from the database with a server-side cursor where available.
+
+    Contrary to a list, it can't be modified.  Moreover, after the first
+    complete iteration, all further ones yield the nodes of exactly the same
+    instances in the same order, even if the query would have a different
+    result by now.  For an instance which was deleted in the meantime, an
+    empty node is yielded, so that rows can still be matched by their
+    position.
+    """
+
+    chunk_size = 100
+    """Number of instances fetched from the database at once."""
+
+    def __init__(self, instances, get_node=None, prefetch=None):
+        """
+        :param instances: the instances the child nodes are made of
+        :param get_node: function which creates the child node of an
+            instance; by default, the instance's ``get_data_for_table_export``
+            method is called
+        :param prefetch: function which is called with every chunk of
+            instances (as a list) before their child nodes are created, so that
+            the data needed by ``get_node`` can be fetched for the whole chunk
+            at once
+
+        :type instances: ``QuerySet``
+        :type get_node: callable
+        :type prefetch: callable
+        """
+        self.instances = instances
+        self.get_node = get_node or (lambda instance: instance.get_data_for_table_export())
+        self.prefetch = prefetch
+        self.primary_keys = None
+
+    def iter_chunks(self):
+        """Yields the instances in chunks.  The first complete iteration records
+        the primary keys of the instances, and all further ones fetch exactly
+        these instances again.
+
+        :return:
+          the chunks of instances; deleted instances are ``None``
+
+        :rtype: iterator over list of ``Model`` or NoneType
+        """
+        if self.primary_keys is None:
+            primary_keys = []
+            instances = self.instances.iterator(chunk_size=self.chunk_size)
+            chunk = list(itertools.islice(instances, self.chunk_size))
+            while chunk:
+                primary_keys.extend(instance.pk for instance in chunk)
+                yield chunk
+                chunk = list(itertools.islice(instances, self.chunk_size))
+            self.primary_keys = primary_keys
+        else:
+            manager = self.instances.model._default_manager
+            for i in range(0, len(self.primary_keys), self.chunk_size):
+                primary_keys = self.primary_keys[i:i + self.chunk_size]
+                instances = manager.in_bulk(primary_keys)
+                yield [instances.get(primary_key) for primary_key in primary_keys]
+
+    def __iter__(self):
+        for chunk in self.iter_chunks():
+            if self.prefetch is not None:
+                self.prefetch([instance for instance in chunk if instance is not None])
+            for instance in chunk:
+                yield self.get_node(instance) if instance is not None else DataNode(self.instances.model)
+
+    def __bool__(self):
+        return self.instances.exists()
+
+
 class DataItem:
     """This class represents a key–value pair, holding the actual data in a
     `DataNode` tree.
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.14 on 2026-10-16 22:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('samples', '0009_auto_20200901_1457'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='process',
+            index=models.Index(fields=['last_modified', 'id'], name='samples_pro_last_mo_705cbe_idx'),
+        ),
+    ]
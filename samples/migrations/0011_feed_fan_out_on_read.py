@@ -0,0 +1,46 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('jb_common', '0003_add_topic_parent_to_uniqueness_constraint'),
+        ('samples', '0010_process_last_modified_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedentry',
+            name='report',
+            field=models.UUIDField(blank=True, editable=False, null=True, verbose_name='report'),
+        ),
+        migrations.AddField(
+            model_name='feedentry',
+            name='sending_model',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype', verbose_name='sending model'),
+        ),
+        migrations.CreateModel(
+            name='FeedAudience',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(verbose_name='timestamp')),
+                ('important', models.BooleanField(default=True, verbose_name='is important')),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audiences', to='samples.feedentry', verbose_name='feed entry')),
+                ('process_class', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype', verbose_name='process class')),
+                ('sample', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='samples.sample', verbose_name='sample')),
+                ('topic', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='jb_common.topic', verbose_name='topic')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'feed audience',
+                'verbose_name_plural': 'feed audiences',
+                'indexes': [models.Index(fields=['sample', '-timestamp', '-entry'], name='samples_fee_sample__0e1b42_idx'), models.Index(fields=['topic', '-timestamp', '-entry'], name='samples_fee_topic_i_b7e5b6_idx'), models.Index(fields=['process_class', '-timestamp', '-entry'], name='samples_fee_process_8b63bf_idx'), models.Index(fields=['user', '-timestamp', '-entry'], name='samples_fee_user_id_56c6e9_idx')],
+            },
+        ),
+    ]
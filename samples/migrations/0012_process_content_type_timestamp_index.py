@@ -0,0 +1,20 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('samples', '0011_feed_fan_out_on_read'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='process',
+            index=models.Index(fields=['content_type', 'timestamp'], name='samples_pro_content_424474_idx'),
+        ),
+    ]
@@ -35,13 +35,16 @@ import django.utils.text
 from django.template.loader import render_to_string
 import django.urls
 from django.conf import settings
-from django.db import models
-from django.core.cache import cache
-from jb_common.utils.base import get_really_full_name, cache_key_locked, format_enumeration, camel_case_to_underscores
+from django.db import models, transaction
+import django.apps
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from jb_common.utils.base import get_really_full_name, bump_cache_generation, format_enumeration, camel_case_to_underscores
 from jb_common.models import Topic, PolymorphicModel, Department
 import samples.permissions
 from jb_common import search
-from samples.data_tree import DataNode, DataItem
+from samples.data_tree import DataNode, DataItem, LazyChildren
 
 
 def empty_list():
@@ -54,6 +57,30 @@ def empty_double_list():
     return [[], []]
 
 
+def _get_month_range(year, month):
+    """Returns the beginning of the given month and the beginning of the
+    following month, in the current time zone.  In contrast to filtering by
+    ``timestamp__month``, filtering by this range lets the database use an
+    index on the timestamp.
+
+    :param year: the year of the month
+    :param month: the month
+
+    :type year: int
+    :type month: int
+
+    :return:
+      the first moment of the month, the first moment of the next month
+
+    :rtype: datetime.datetime, datetime.datetime
+    """
+    begin = datetime.datetime(year, month, 1)
+    end = datetime.datetime(year + month // 12, month % 12 + 1, 1)
+    if settings.USE_TZ:
+        begin, end = django.utils.timezone.make_aware(begin), django.utils.timezone.make_aware(end)
+    return begin, end
+
+
 _table_export_blacklist = {"actual_object_id", "id", "content_type", "timestamp_inaccuracy", "last_modified"}
 """Set of field names that should never be included by `fields_to_data_items`.
 """
@@ -198,9 +225,12 @@ class Process(PolymorphicModel):
         get_latest_by = "timestamp"
         verbose_name = _("process")
         verbose_name_plural = _("processes")
+        indexes = [models.Index(fields=["last_modified", "id"]), models.Index(fields=["content_type", "timestamp"])]
 
     def save(self, *args, **kwargs):
-        """Saves the instance and clears stalled cache items.
+        """Saves the instance and makes its cache items obsolete.  The latter
+        happens only after the current transaction has been committed, so that
+        no cache item can be built from the old data under the new generation.
 
         :param with_relations: If ``True`` (default), also touch the related
             samples.  Should be set to ``False`` if called from another
@@ -208,15 +238,21 @@ class Process(PolymorphicModel):
 
         :type with_relations: bool
         """
-        keys_list_key = "process-keys:{0}".format(self.id)
-        with cache_key_locked("process-lock:{0}".format(self.id)):
-            keys = cache.get(keys_list_key)
-            if keys:
-                cache.delete_many(keys)
-            cache.delete(keys_list_key)
         with_relations = kwargs.pop("with_relations", True)
+        adding = self._state.adding
+        old_timestamp = Process.objects.filter(pk=self.pk).values_list("timestamp", flat=True).first() \
+            if self.pk else None
         super().save(*args, **kwargs)
+        if not adding:
+            generation_name = "process:{0}".format(self.id)
+            transaction.on_commit(lambda: bump_cache_generation(generation_name))
+        self.touch_lab_notebooks(self.timestamp)
+        if old_timestamp and old_timestamp != self.timestamp:
+            self.touch_lab_notebooks(old_timestamp)
         if with_relations:
+            if old_timestamp and old_timestamp != self.timestamp:
+                for sample in Sample.objects.filter(Q(processes=self) | Q(series__results__pk=self.pk)).distinct():
+                    sample.touch_history(min(old_timestamp, self.timestamp))
             for sample in self.samples.all():
                 sample.save(with_relations=False)
 
@@ -432,9 +468,83 @@ class Process(PolymorphicModel):
 
     @classmethod
     def get_lab_notebook_context(cls, year, month):
-        processes = cls.objects.filter(timestamp__year=year, timestamp__month=month).select_related()
+        begin, end = _get_month_range(year, month)
+        processes = cls.objects.filter(content_type__in=cls.get_content_types(), timestamp__gte=begin,
+                                       timestamp__lt=end).select_related()
         return {"processes": processes}
 
+    @classmethod
+    def get_content_types(cls):
+        """Returns the content types of this class and all of its subclasses.
+        Filtering processes by them, e.g. in lab notebooks, lets the database
+        use the index on content type and timestamp.
+
+        :return:
+          the content types of this class and its subclasses
+
+        :rtype: list of ``ContentType``
+        """
+        return list(ContentType.objects.get_for_models(
+            *(model for model in django.apps.apps.get_models() if issubclass(model, cls))).values())
+
+    @classmethod
+    def get_lab_notebook_generation_name(cls, year, month):
+        """Returns the name of the cache generation of the lab notebook page of
+        this class for the given month.  See
+        :py:func:`jb_common.utils.base.get_cache_generations`.
+
+        :param year: the year of the lab notebook page
+        :param month: the month of the lab notebook page
+
+        :type year: int
+        :type month: int
+
+        :return:
+          the name of the cache generation
+
+        :rtype: str
+        """
+        return "lab-notebook:{0}:{1}-{2}".format(cls._meta.label_lower, year, month)
+
+    def touch_lab_notebooks(self, timestamp):
+        """Makes the cached lab notebook pages obsolete which show this process
+        at the given timestamp.  These are the pages of the month of
+        ``timestamp`` of the process class and its parent classes.  The pages
+        are made obsolete only after the current transaction has been
+        committed.  Otherwise, a page rendered from the old data in the
+        meantime could be cached as the new one.
+
+        Call this method if the process is added, changed, or deleted, for
+        both its old and new timestamp.  `save` and deletion do this already.
+        But if you change objects shown in the lab notebook without saving the
+        process, e.g. its layers, you have to call it yourself.
+
+        :param timestamp: the timestamp of the process
+
+        :type timestamp: datetime.datetime
+        """
+        if django.utils.timezone.is_aware(timestamp):
+            timestamp = django.utils.timezone.localtime(timestamp)
+        process_class = ContentType.objects.get_for_id(self.content_type_id).model_class() \
+            if self.content_type_id else type(self)
+        names = {cls.get_lab_notebook_generation_name(timestamp.year, timestamp.month)
+                 for cls in process_class.__mro__ if issubclass(cls, Process)}
+        transaction.on_commit(lambda: [bump_cache_generation(name) for name in names])
+
+    @classmethod
+    def get_actual_instances_query_set(cls):
+        """Returns the query set used for resolving the actual instances of
+        processes in bulk.  It fetches the operators along with the processes,
+        and for processes with sample positions, also their samples.
+
+        For the return value see
+        :py:meth:`jb_common.models.PolymorphicModel.get_actual_instances_query_set`.
+        """
+        query_set = super().get_actual_instances_query_set().select_related("operator", "external_operator")
+        if hasattr(cls, "get_sample_position_context"):
+            query_set = query_set.prefetch_related("samples__topic")
+        return query_set
+
     def get_cache_key(self, user_settings_hash, local_context):
         """Calculate a cache key for this context instance of the process.
         Note that there may be many cache items to one process, e. g. one for
@@ -454,6 +564,10 @@ class Process(PolymorphicModel):
         :type user_settings_hash: str
         :type local_context: dict mapping str to ``object``
 
+        The current cache generation of the process is appended to this key by
+        :py:func:`samples.utils.views.digest_processes`, so it doesn't need to
+        be included here.
+
         :return:
           the cache key for this process instance
 
@@ -717,7 +831,7 @@ class PhysicalProcess(Process):
         """
         measurements = cls.get_lab_notebook_context(year, month)["processes"]
         data = DataNode(_("lab notebook for {process_name}").format(process_name=cls._meta.verbose_name_plural))
-        data.children.extend(measurement.get_data_for_table_export() for measurement in measurements)
+        data.children = LazyChildren(measurements)
         return data
 
     def delete(self, *args, **kwargs):
@@ -751,6 +865,37 @@ def get_all_searchable_physical_processes():
     return all_searchable_physical_processes
 
 
+def _get_ancestor_splits(sample_ids):
+    """Returns the splits the given samples and all of their ancestors originate
+    from.  The whole ancestry chains are fetched with one query (a recursive
+    common table expression), no matter how many generations they have.
+
+    :param sample_ids: the IDs of the samples whose ancestry is fetched
+
+    :type sample_ids: list of int
+
+    :return:
+      the splits, with their ``parent`` samples already fetched
+
+    :rtype: dict mapping int to `SampleSplit`
+    """
+    sample_table, split_table = Sample._meta.db_table, SampleSplit._meta.db_table
+    ancestors_query = """WITH RECURSIVE ancestors(split_id) AS (
+                             SELECT {split_origin} FROM {sample_table} WHERE {sample_pk} IN ({placeholders})
+                             UNION
+                             SELECT sample.{split_origin} FROM ancestors
+                                 JOIN {split_table} AS split ON split.{split_pk} = ancestors.split_id
+                                 JOIN {sample_table} AS sample ON sample.{sample_pk} = split.{parent}
+                         )
+                         SELECT split_id FROM ancestors""".format(
+                             split_origin=Sample._meta.get_field("split_origin").column, sample_table=sample_table,
+                             sample_pk=Sample._meta.pk.column, placeholders=", ".join(len(sample_ids) * ["%s"]),
+                             split_table=split_table, split_pk=SampleSplit._meta.pk.column,
+                             parent=SampleSplit._meta.get_field("parent").column)
+    splits = SampleSplit.objects.filter(pk__in=RawSQL(ancestors_query, sample_ids)).select_related("parent")
+    return {split.pk: split for split in splits}
+
+
 class Sample(models.Model):
     """The model for samples.
     """
@@ -781,7 +926,9 @@ class Sample(models.Model):
                        ("rename_samples", _("Can rename samples from his/her department")))
 
     def save(self, *args, **kwargs):
-        """Saves the instance and clears stalled cache items.
+        """Saves the instance and makes its cache items obsolete.  The latter
+        happens only after the current transaction has been committed, see
+        `Process.save`.
 
         It also touches all ancestors and children and the associated split
         processes.
@@ -799,15 +946,13 @@ class Sample(models.Model):
         :type with_relations: bool
         :type from_split: `SampleSplit` or NoneType
         """
-        keys_list_key = "sample-keys:{0}".format(self.pk)
-        with cache_key_locked("sample-lock:{0}".format(self.pk)):
-            keys = cache.get(keys_list_key)
-            if keys:
-                cache.delete_many(keys)
-            cache.delete(keys_list_key)
         with_relations = kwargs.pop("with_relations", True)
         from_split = kwargs.pop("from_split", None)
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        if not adding:
+            generation_name = "sample:{0}".format(self.pk)
+            transaction.on_commit(lambda: bump_cache_generation(generation_name))
         UserDetails.objects.filter(user__in=self.watchers.all()).update(my_samples_list_timestamp=django.utils.timezone.now())
         if with_relations:
             for series in self.series.all():
@@ -907,6 +1052,46 @@ class Sample(models.Model):
     def is_dead(self):
         return self.processes.filter(sampledeath__timestamp__isnull=False).exists()
 
+    def get_ancestor_splits(self):
+        """Returns the splits this sample and its ancestors originate from.
+        The whole ancestry chain is fetched with one query (a recursive common
+        table expression), no matter how many generations it has.
+
+        :return:
+          the splits, beginning with the split this sample originates from and
+          ending with the split of the first parent; their ``parent`` samples
+          are already fetched
+
+        :rtype: list of `SampleSplit`
+        """
+        if not self.split_origin_id:
+            return []
+        splits = _get_ancestor_splits([self.pk])
+        result = []
+        split = splits.get(self.split_origin_id)
+        while split:
+            result.append(split)
+            split = splits.get(split.parent.split_origin_id)
+        return result
+
+    def touch_history(self, timestamp):
+        """Makes the cached histories of this sample obsolete which are
+        affected by a change at ``timestamp``.  A history is the list of
+        processes up to a split of this sample, as shown on the data sheets of
+        the pieces.  Thus, only the histories of splits not earlier than
+        ``timestamp`` are affected.
+
+        Call this method if a process with the given timestamp is added to or
+        removed from this sample (also indirectly, as a result of a sample
+        series), or if such a process changes its timestamp.
+
+        :param timestamp: the timestamp of the added, removed, or moved process
+
+        :type timestamp: datetime.datetime
+        """
+        for split_id in SampleSplit.objects.filter(parent=self, timestamp__gte=timestamp).values_list("id", flat=True):
+            bump_cache_generation("sample-history:{0}".format(split_id))
+
     def last_process_if_split(self):
         """Test whether the most recent process applied to the sample – except
         for result processes – was a split.
@@ -1000,13 +1185,89 @@ class Sample(models.Model):
             sample_details_data = sample_details.get_data_for_table_export()
             data_node.children = sample_details_data.children
         else:
-            if self.split_origin:
-                ancestor_data = self.split_origin.parent.get_data_for_table_export()
-                data_node.children.extend(ancestor_data.children)
-            data_node.children.extend(process.actual_instance.get_data_for_table_export()
-                                  for process in self.processes.order_by("timestamp").iterator())
+            data_node.children.extend(self.get_ancestor_data_for_table_export())
+            data_node.children.extend(self.get_process_data_for_table_export())
         return data_node
 
+    def get_ancestor_data_for_table_export(self):
+        """Returns the nodes of the table export which this sample inherits from
+        its parent, i.e. the children of the parent's node.  They are created
+        only once for every parent instance, so that the pieces of a parent
+        which were passed to `prefetch_data_for_table_export` together share
+        them.  Therefore, the nodes must not be modified.
+
+        :return:
+          the inherited nodes for building a data tree
+
+        :rtype: tuple of `samples.data_tree.DataNode`
+        """
+        if not self.split_origin:
+            return ()
+        parent = self.split_origin.parent
+        try:
+            return parent._children_for_table_export
+        except AttributeError:
+            parent._children_for_table_export = tuple(parent.get_data_for_table_export().children)
+            return parent._children_for_table_export
+
+    def get_process_data_for_table_export(self):
+        """Returns the nodes of the table export for the processes of this
+        sample, in chronological order.  If the sample was passed to
+        `prefetch_data_for_table_export`, the nodes are already there, and they
+        may be shared with other samples.  Therefore, they must not be
+        modified.
+
+        :return:
+          the process nodes for building a data tree
+
+        :rtype: tuple of `samples.data_tree.DataNode`
+        """
+        try:
+            return self._process_data_for_table_export
+        except AttributeError:
+            return tuple(process.actual_instance.get_data_for_table_export()
+                         for process in self.processes.order_by("timestamp").iterator())
+
+    @staticmethod
+    def prefetch_data_for_table_export(samples):
+        """Fetches the data needed by `get_data_for_table_export` for the given
+        samples and all of their ancestors in a handful of queries.  In
+        particular, the actual instances of all processes are resolved in bulk,
+        and the node of every process is created only once, even if it belongs
+        to several of the samples or to a common ancestor of them.  The
+        results are stored in the sample instances.
+
+        :param samples: the samples whose data is going to be exported
+
+        :type samples: list of `Sample`
+        """
+        all_samples = {sample.pk: sample for sample in samples}
+        splits = _get_ancestor_splits(list(all_samples)) if any(sample.split_origin_id for sample in samples) else {}
+        for split in splits.values():
+            parent = all_samples.setdefault(split.parent_id, split.parent)
+            SampleSplit._meta.get_field("parent").set_cached_value(split, parent)
+        for sample in all_samples.values():
+            if sample.split_origin_id:
+                Sample._meta.get_field("split_origin").set_cached_value(sample, splits[sample.split_origin_id])
+        sample_ids_by_process_id = {}
+        for sample_id, process_id in Sample.processes.through.objects.filter(sample__in=list(all_samples)). \
+                values_list("sample_id", "process_id"):
+            sample_ids_by_process_id.setdefault(process_id, []).append(sample_id)
+        process_data = {sample_id: [] for sample_id in all_samples}
+        processes = Process.objects.filter(pk__in=list(sample_ids_by_process_id)).order_by("timestamp")
+        for process in Process.resolve_actual_instances(processes):
+            data_node = process.get_data_for_table_export()
+            for sample_id in sample_ids_by_process_id[process.pk]:
+                process_data[sample_id].append(data_node)
+        for sample_id, sample in all_samples.items():
+            sample._process_data_for_table_export = tuple(process_data[sample_id])
+        try:
+            Sample._meta.get_field("sample_details")
+        except FieldDoesNotExist:
+            pass
+        else:
+            models.prefetch_related_objects(list(all_samples.values()), "sample_details")
+
     @classmethod
     def get_search_tree_node(cls):
         """Class method for generating the search tree node for this model
@@ -1488,7 +1749,7 @@ class SampleSeries(models.Model):
         :rtype: `samples.data_tree.DataNode`
         """
         data_node = DataNode(self, str(self))
-        data_node.children.extend(sample.get_data_for_table_export() for sample in self.samples.all())
+        data_node.children = LazyChildren(self.samples.all(), prefetch=Sample.prefetch_data_for_table_export)
         # I don't think that any sample series properties are interesting for
         # table export; people only want to see the *sample* data.  Thus, I
         # don't set ``cvs_note.items``.
@@ -1797,7 +2058,7 @@ class ProcessWithSamplePositions(models.Model):
                                                  user, self, self.content_type.model_class())
                                              else _("confidential sample"),
                                              sample_positions_dict.get(str(sample.id)))
-                                            for sample in self.samples.order_by("name").iterator())
+                                            for sample in sorted(self.samples.all(), key=lambda sample: sample.name))
         return context
 
 
@@ -52,6 +52,23 @@ class FeedEntry(PolymorphicModel):
     """You'll never calculate the SHA-1 hash yourself.  It is done in
     `save`.
     """
+    sending_model = models.ForeignKey(ContentType, on_delete=models.CASCADE, verbose_name=_("sending model"),
+                                      null=True, blank=True, editable=False, related_name="+")
+    """Only used if ``FEED_FAN_OUT_ON_READ`` is ``True``.  If given, only users
+    who subscribed to this model see the entry.
+    """
+    report = models.UUIDField(_("report"), null=True, blank=True, editable=False)
+    """Only used if ``FEED_FAN_OUT_ON_READ`` is ``True``.  All entries generated
+    by the same `samples.utils.views.Reporter` share this value.  A user sees
+    only the first of them that is meant for them.
+    """
+    user_dependent_content = False
+    """Whether `get_additional_template_context` depends on the user.  Feed
+    entries never change, so their rendered content is cached and shared by
+    all users the entry is shown to.  If this is ``True``, the content is
+    cached for every user separately.  If the content shows objects which may
+    change, override `get_content_generation_names`.
+    """
 
     class Meta:
         verbose_name = _("feed entry")
@@ -94,6 +111,36 @@ class FeedEntry(PolymorphicModel):
         """
         raise NotImplementedError
 
+    @classmethod
+    def get_actual_instances_query_set(cls):
+        """Returns the query set used for resolving the actual instances of feed
+        entries in bulk.  It fetches the originators along with the entries.
+
+        For the return value see
+        :py:meth:`jb_common.models.PolymorphicModel.get_actual_instances_query_set`.
+        """
+        return super().get_actual_instances_query_set().select_related("originator")
+
+    @classmethod
+    def get_content_generation_names(cls, entry_ids):
+        """Returns the names of the cache generations the rendered content of
+        the given entries depends on, see
+        :py:func:`jb_common.utils.base.get_cache_generations`.  They become part
+        of the cache key of the content.  If not overridden, this method
+        returns an empty dictionary, i.e. the content never changes.
+
+        :param entry_ids: the IDs of feed entries of this class
+
+        :type entry_ids: list of int
+
+        :return:
+          the generation names of the entries; entries which depend on nothing
+          may be missing
+
+        :rtype: dict mapping int to list of str
+        """
+        return {}
+
     def get_additional_template_context(self, user):
         """Return a dictionary with additional context that should be available
         in the template.  It is implemented in the abstract base class, so it
@@ -122,6 +169,7 @@ class FeedNewSamples(FeedEntry):
     topic = models.ForeignKey(Topic, on_delete=models.CASCADE, verbose_name=_("topic"), related_name="new_samples_news")
     purpose = models.CharField(_("purpose"), max_length=80, blank=True)
     auto_adders = models.ManyToManyField(django.contrib.auth.models.User, verbose_name=_("auto adders"), blank=True)
+    user_dependent_content = True
 
     class Meta(PolymorphicModel.Meta):
         # FixMe: The labels are gramatically unfortunate.  “feed entry for new
@@ -149,6 +197,7 @@ class FeedMovedSamples(FeedEntry):
     old_topic = models.ForeignKey(Topic, on_delete=models.CASCADE, verbose_name=_("old topic"), null=True, blank=True)
     auto_adders = models.ManyToManyField(django.contrib.auth.models.User, verbose_name=_("auto adders"), blank=True)
     description = models.TextField(_("description"))
+    user_dependent_content = True
 
     class Meta(PolymorphicModel.Meta):
         verbose_name = _("moved samples feed entry")
@@ -166,6 +215,32 @@ class FeedMovedSamples(FeedEntry):
         return {"auto_added": self.auto_adders.filter(pk=user.pk).exists()}
 
 
+def _get_process_generation_names(feed_entry_class, entry_ids):
+    """Returns the names of the cache generations of the processes of the given
+    feed entries and of their samples.  It implements
+    `FeedEntry.get_content_generation_names` for feed entries with a
+    ``process`` field.
+
+    :param feed_entry_class: the class of the feed entries
+    :param entry_ids: the IDs of the feed entries
+
+    :type feed_entry_class: type
+    :type entry_ids: list of int
+
+    :return:
+      the generation names of the entries
+
+    :rtype: dict mapping int to list of str
+    """
+    generation_names = {}
+    for entry_id, process_id, sample_id in feed_entry_class.objects.filter(id__in=entry_ids). \
+            values_list("id", "process_id", "process__samples__id"):
+        names = generation_names.setdefault(entry_id, ["process:{}".format(process_id)])
+        if sample_id is not None:
+            names.append("sample:{}".format(sample_id))
+    return generation_names
+
+
 class FeedNewPhysicalProcess(FeedEntry):
     """Model for feed entries about new physical processes.
     """
@@ -184,6 +259,10 @@ class FeedNewPhysicalProcess(FeedEntry):
         result["link"] = process.get_absolute_url()
         return result
 
+    @classmethod
+    def get_content_generation_names(cls, entry_ids):
+        return _get_process_generation_names(cls, entry_ids)
+
     def get_additional_template_context(self, user):
         return {"process": self.process.actual_instance}
 
@@ -207,6 +286,10 @@ class FeedEditedPhysicalProcess(FeedEntry):
         metadata["link"] = process.get_absolute_url()
         return metadata
 
+    @classmethod
+    def get_content_generation_names(cls, entry_ids):
+        return _get_process_generation_names(cls, entry_ids)
+
     def get_additional_template_context(self, user):
         return {"process": self.process.actual_instance}
 
@@ -367,6 +450,7 @@ class FeedNewSampleSeries(FeedEntry):
     sample_series = models.ForeignKey(SampleSeries, on_delete=models.CASCADE, verbose_name=_("sample series"))
     topic = models.ForeignKey(Topic, on_delete=models.CASCADE, verbose_name=_("topic"))
     subscribers = models.ManyToManyField(django.contrib.auth.models.User, verbose_name=_("subscribers"), blank=True)
+    user_dependent_content = True
 
     class Meta(PolymorphicModel.Meta):
         verbose_name = _("new sample series feed entry")
@@ -394,6 +478,7 @@ class FeedMovedSampleSeries(FeedEntry):
                                   related_name="news_ex_sample_series")
     description = models.TextField(_("description"))
     subscribers = models.ManyToManyField(django.contrib.auth.models.User, verbose_name=_("subscribers"), blank=True)
+    user_dependent_content = True
 
     class Meta(PolymorphicModel.Meta):
         verbose_name = _("moved sample series feed entry")
@@ -536,4 +621,41 @@ class FeedRemovedTask(FeedEntry):
         return metadata
 
 
+class FeedAudience(models.Model):
+    """Model for the recipients of a feed entry if ``FEED_FAN_OUT_ON_READ`` is
+    ``True``.  Then, `FeedEntry.users` is not used.  Instead, every instance of
+    this model denotes one group of users who should see the entry: the
+    watchers of a sample, the members of a topic, the subscribers of a process
+    class, or a single user.  Exactly one of the respective fields is set.  The
+    feed of a user is calculated when it is read, see
+    :py:func:`samples.views.feed.get_entries_fanned_out_on_read`.
+
+    The timestamp of the entry is duplicated here so that all audiences of a
+    kind can be read in the order of the feed from one index.
+    """
+    entry = models.ForeignKey(FeedEntry, on_delete=models.CASCADE, verbose_name=_("feed entry"), related_name="audiences")
+    timestamp = models.DateTimeField(_("timestamp"))
+    important = models.BooleanField(_("is important"), default=True)
+    """Users who only want to get important news see the entry only if this is
+    ``True``.
+    """
+    sample = models.ForeignKey(Sample, on_delete=models.CASCADE, verbose_name=_("sample"), null=True, blank=True,
+                               related_name="+")
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE, verbose_name=_("topic"), null=True, blank=True,
+                              related_name="+")
+    process_class = models.ForeignKey(ContentType, on_delete=models.CASCADE, verbose_name=_("process class"),
+                                      null=True, blank=True, related_name="+")
+    user = models.ForeignKey(django.contrib.auth.models.User, on_delete=models.CASCADE, verbose_name=_("user"),
+                             null=True, blank=True, related_name="+")
+
+    class Meta:
+        verbose_name = _("feed audience")
+        verbose_name_plural = _("feed audiences")
+        indexes = [models.Index(fields=[field_name, "-timestamp", "-entry"])
+                   for field_name in ("sample", "topic", "process_class", "user")]
+
+    def __str__(self):
+        return _("audience of {entry}").format(entry=self.entry)
+
+
 _ = gettext
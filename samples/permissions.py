@@ -137,6 +137,157 @@ def get_user_hash(user):
     return user_hash.hexdigest()[:10]
 
 
+def _get_permissions_cache(user):
+    """Returns the permissions cache of the user.  It contains data about the
+    user which is needed for many permission checks, e.g. the user's topics.
+    Like Django's own permissions cache, it is stored in the user instance, so
+    it lives as long as the instance, i.e. typically one request.
+
+    :param user: the user whose permissions cache should be returned
+
+    :type user: django.contrib.auth.models.User
+
+    :return:
+      the permissions cache
+
+    :rtype: dict mapping str to ``object``
+    """
+    try:
+        return user._samples_permissions_cache
+    except AttributeError:
+        user._samples_permissions_cache = {}
+        return user._samples_permissions_cache
+
+
+def clear_permissions_cache(user):
+    """Removes the permissions cache of the user instance, see
+    `_get_permissions_cache`.  Call this if you change data of the user which
+    is relevant for permissions, and you want to check permissions with the
+    same user instance afterwards.
+
+    :param user: the user whose permissions cache should be removed
+
+    :type user: django.contrib.auth.models.User
+    """
+    try:
+        del user._samples_permissions_cache
+    except AttributeError:
+        pass
+
+
+def _get_topic_ids(user):
+    """Returns the IDs of all topics the user is a member of.  The result is
+    cached in the user instance.
+
+    :param user: the user whose topics should be returned
+
+    :type user: django.contrib.auth.models.User
+
+    :return:
+      the IDs of the user's topics
+
+    :rtype: set of int
+    """
+    cache = _get_permissions_cache(user)
+    if "topic_ids" not in cache:
+        cache["topic_ids"] = set(user.topics.values_list("id", flat=True))
+    return cache["topic_ids"]
+
+
+def _get_user_permission_ids(user):
+    """Returns the IDs of all permissions which are directly assigned to the
+    user, i.e. not via groups.  The result is cached in the user instance.
+
+    :param user: the user whose permissions should be returned
+
+    :type user: django.contrib.auth.models.User
+
+    :return:
+      the IDs of the user's own permissions
+
+    :rtype: set of int
+    """
+    cache = _get_permissions_cache(user)
+    if "user_permission_ids" not in cache:
+        cache["user_permission_ids"] = set(user.user_permissions.values_list("id", flat=True))
+    return cache["user_permission_ids"]
+
+
+def _get_department(user):
+    """Returns the department of the user, or a `NoDepartment` if the user
+    doesn't have one.  The result is cached in the user instance.
+
+    :param user: the user whose department should be returned
+
+    :type user: django.contrib.auth.models.User
+
+    :return:
+      the department of the user
+
+    :rtype: `jb_common.models.Department` or `NoDepartment`
+    """
+    cache = _get_permissions_cache(user)
+    if "department" not in cache:
+        cache["department"] = user.jb_user_details.department or NoDepartment()
+    return cache["department"]
+
+
+def _get_cleared_process_ids(user):
+    """Returns the IDs of all processes for which the user has a clearance.  The
+    result is cached in the user instance.
+
+    :param user: the user whose cleared processes should be returned
+
+    :type user: django.contrib.auth.models.User
+
+    :return:
+      the IDs of the processes cleared for the user
+
+    :rtype: set of int
+    """
+    cache = _get_permissions_cache(user)
+    if "cleared_process_ids" not in cache:
+        cache["cleared_process_ids"] = set(samples.models.Process.objects.filter(clearances__user=user).
+                                           values_list("id", flat=True))
+    return cache["cleared_process_ids"]
+
+
+existing_permissions = None
+def _get_class_permission(process_class, prefix):
+    """Returns the full name of a permission of a process class, if it exists.
+    All existing permissions are read from the database only once, until
+    `clear_class_permissions_cache` is called.  Never call this routine from
+    top-level module code because it may cause cyclic imports.
+
+    :param process_class: the process class
+    :param prefix: the prefix of the permission codename, e.g. ``"add"``
+
+    :type process_class: ``class`` (derived from `samples.models.Process`)
+    :type prefix: str
+
+    :return:
+      the permission name in the form :samp:`{app_label}.{codename}`, or
+      ``None`` if the process class has no such permission
+
+    :rtype: str or NoneType
+    """
+    global existing_permissions
+    if existing_permissions is None:
+        existing_permissions = set(Permission.objects.values_list("content_type_id", "codename"))
+    codename = "{0}_{1}".format(prefix, process_class.__name__.lower())
+    if (ContentType.objects.get_for_model(process_class).id, codename) in existing_permissions:
+        return "{app_label}.{codename}".format(app_label=process_class._meta.app_label, codename=codename)
+
+
+def clear_class_permissions_cache():
+    """Forgets the existing permissions read by `_get_class_permission` and the
+    permissions derived from them.  This is called by signal handlers whenever
+    permissions or content types are changed.
+    """
+    global existing_permissions, addable_physical_process_permissions
+    existing_permissions = addable_physical_process_permissions = None
+
+
 def get_editable_sample_series(user):
     """Return a query set with all sample series that the user can edit.  So
     far, it is only used in `split_and_rename.GlobalDataForm`.
@@ -181,6 +332,29 @@ def get_all_addable_physical_process_models():
     return all_addable_physical_process_models
 
 
+addable_physical_process_permissions = None
+def get_addable_physical_process_permissions():
+    """Get the permissions which are needed to add the physical process
+    classes returned by `get_all_addable_physical_process_models`.  Never call
+    this routine from top-level module code because it may cause cyclic
+    imports.
+
+    :return:
+      list of tuples, each consisting of the permission needed to add the
+      process (or ``None`` if everyone may add it), and the dictionary
+      describing the process class as returned by
+      `get_all_addable_physical_process_models`
+
+    :rtype: list of (str or NoneType, dict mapping str to str)
+    """
+    global addable_physical_process_permissions
+    if addable_physical_process_permissions is None:
+        addable_physical_process_permissions = [
+            (_get_class_permission(process_class, "add"), add_data)
+            for process_class, add_data in get_all_addable_physical_process_models().items()]
+    return addable_physical_process_permissions
+
+
 def get_allowed_physical_processes(user):
     """Get a list with all physical process classes (depositions, measurements;
     no sample splits) that the user is allowed to add or edit.  This routine is
@@ -201,10 +375,8 @@ def get_allowed_physical_processes(user):
 
     :rtype: list of dict mapping str to str
     """
-    allowed_physical_processes = []
-    for physical_process_class, add_data in get_all_addable_physical_process_models().items():
-        if has_permission_to_add_physical_process(user, physical_process_class):
-            allowed_physical_processes.append(add_data.copy())
+    allowed_physical_processes = [add_data.copy() for permission, add_data in get_addable_physical_process_permissions()
+                                  if permission is None or user.has_perm(permission)]
     allowed_physical_processes.sort(key=lambda process: process["label"].lower())
     return allowed_physical_processes
 
@@ -382,12 +554,12 @@ def assert_can_fully_view_sample(user, sample):
         sample.
     """
     currently_responsible_person = sample.currently_responsible_person
-    sample_department = currently_responsible_person.jb_user_details.department or NoDepartment()
-    user_department = user.jb_user_details.department or NoDepartment()
+    sample_department = _get_department(currently_responsible_person)
+    user_department = _get_department(user)
     if not sample.topic and sample_department != user_department and not user.is_superuser:
         description = _("You are not allowed to view the sample since the sample doesn't belong to your department.")
         raise PermissionError(user, description, new_topic_would_help=True)
-    if sample.topic and user not in sample.topic.members.all() and currently_responsible_person != user and \
+    if sample.topic_id and sample.topic_id not in _get_topic_ids(user) and currently_responsible_person != user and \
             not user.is_superuser:
         if sample_department != user_department:
             description = _("You are not allowed to view the sample since you are not in the sample's topic, nor belongs the "
@@ -418,8 +590,8 @@ def assert_can_rename_sample(user, sample):
         sample.
     """
     currently_responsible_person = sample.currently_responsible_person
-    sample_department = currently_responsible_person.jb_user_details.department or NoDepartment()
-    user_department = user.jb_user_details.department or NoDepartment()
+    sample_department = _get_department(currently_responsible_person)
+    user_department = _get_department(user)
     if (not user.has_perm("samples.rename_samples") or sample_department != user_department
         or not sample_name_format(sample.name) in get_renamable_name_formats()) \
         and not user.is_superuser:
@@ -506,9 +678,8 @@ def assert_can_add_physical_process(user, process_class):
 
     :raises PermissionError: if the user is not allowed to add a process.
     """
-    codename = "add_{0}".format(process_class.__name__.lower())
-    if Permission.objects.filter(codename=codename, content_type=ContentType.objects.get_for_model(process_class)).exists():
-        permission = "{app_label}.{codename}".format(app_label=process_class._meta.app_label, codename=codename)
+    permission = _get_class_permission(process_class, "add")
+    if permission:
         if not user.has_perm(permission):
             description = _("You are not allowed to add {process_plural_name} because you don't have the "
                             "permission “{permission}”.").format(
@@ -536,12 +707,8 @@ def assert_can_edit_physical_process(user, process):
     codename = "change_{0}".format(process_class.__name__.lower())
     has_edit_all_permission = \
         user.has_perm("{app_label}.{codename}".format(app_label=process_class._meta.app_label, codename=codename))
-    codename = "add_{0}".format(process_class.__name__.lower())
-    if Permission.objects.filter(codename=codename, content_type=ContentType.objects.get_for_model(process_class)).exists():
-        has_add_permission = \
-            user.has_perm("{app_label}.{codename}".format(app_label=process_class._meta.app_label, codename=codename))
-    else:
-        has_add_permission = True
+    add_permission = _get_class_permission(process_class, "add")
+    has_add_permission = user.has_perm(add_permission) if add_permission else True
     if (not has_add_permission or process.operator != user) and not (has_add_permission and not process.finished) and \
             not has_edit_all_permission and not user.is_superuser:
         description = _("You are not allowed to edit the process “{process}” because you are not the operator "
@@ -618,7 +785,7 @@ def assert_can_view_lab_notebook(user, process_class):
     """
     codename = "view_every_{0}".format(process_class.__name__.lower())
     permission_name_to_view_all = "{app_label}.{codename}".format(app_label=process_class._meta.app_label, codename=codename)
-    if Permission.objects.filter(codename=codename, content_type=ContentType.objects.get_for_model(process_class)).exists():
+    if _get_class_permission(process_class, "view_every"):
         has_view_all_permission = user.has_perm(permission_name_to_view_all)
     else:
         has_view_all_permission = user.is_superuser
@@ -651,13 +818,13 @@ def assert_can_view_physical_process(user, process):
     process_class = process.content_type.model_class()
     codename = "view_every_{0}".format(process_class.__name__.lower())
     permission_name_to_view_all = "{app_label}.{codename}".format(app_label=process_class._meta.app_label, codename=codename)
-    if Permission.objects.filter(codename=codename, content_type=ContentType.objects.get_for_model(process_class)).exists():
+    if _get_class_permission(process_class, "view_every"):
         has_view_all_permission = user.has_perm(permission_name_to_view_all)
     else:
         has_view_all_permission = user.is_superuser
     if not has_view_all_permission and process.operator != user and \
             not any(has_permission_to_fully_view_sample(user, sample) for sample in process.samples.all()) and \
-            not samples.models.Clearance.objects.filter(user=user, processes=process).exists():
+            process.id not in _get_cleared_process_ids(user):
         description = _("You are not allowed to view the process “{process}” because neither you have the "
                         "permission “{permission}”, nor you are allowed to view one of the processed samples, "
                         "nor are you the operator, nor is there a clearance for you for this process.").format(
@@ -699,7 +866,7 @@ def assert_can_view_result_process(user, result_process):
             all(not has_permission_to_fully_view_sample(user, sample) for sample in result_process.samples.all()) and \
             all(not has_permission_to_view_sample_series(user, sample_series)
                 for sample_series in result_process.sample_series.all()) and \
-                not samples.models.Clearance.objects.filter(user=user, processes=result_process).exists():
+                result_process.id not in _get_cleared_process_ids(user):
         description = _("You are not allowed to view the result “{result}” because neither did you create this result, "
                         "nor are you allowed to view its connected samples or sample series, nor is there a "
                         "clearance for you for this result.").format(result=result_process)
@@ -721,7 +888,7 @@ def assert_can_add_result_process(user, sample_or_series):
         process to the sample or series
     """
     if sample_or_series.currently_responsible_person != user and sample_or_series.topic and \
-             user not in sample_or_series.topic.members.all() and not user.is_superuser:
+             sample_or_series.topic_id not in _get_topic_ids(user) and not user.is_superuser:
         if isinstance(sample_or_series, samples.models.Sample):
             description = _("You are not allowed to add the result to {sample_or_series} because neither are you the "
                             "currently responsible person for this sample, nor are you a member of its topic.").format(
@@ -745,14 +912,14 @@ def assert_can_edit_sample(user, sample):
     :raises PermissionError: if the user is not allowed to edit the sample
     """
     currently_responsible_person = sample.currently_responsible_person
-    sample_department = currently_responsible_person.jb_user_details.department or NoDepartment()
-    user_department = user.jb_user_details.department or NoDepartment()
+    sample_department = _get_department(currently_responsible_person)
+    user_department = _get_department(user)
     if not sample.topic and sample_department != user_department and not user.is_superuser:
         description = _("You are not allowed to edit the sample since the sample doesn't belong to your department.")
         raise PermissionError(user, description, new_topic_would_help=True)
     topic_manager_permission = get_topic_manager_permission()
     if sample.topic and currently_responsible_person != user and not user.is_superuser and not \
-        (user in sample.topic.members.all() and topic_manager_permission in user.user_permissions.all()):
+        (sample.topic_id in _get_topic_ids(user) and topic_manager_permission.id in _get_user_permission_ids(user)):
         description = _("You are not allowed to edit the sample “{name}” (including splitting, declaring dead, and deleting) "
                         "because you are not the currently responsible person for this sample.").format(name=sample)
         raise PermissionError(user, description)
@@ -789,7 +956,7 @@ def assert_can_view_sample_series(user, sample_series):
     :raises PermissionError: if the user is not allowed to view the sample
         series
     """
-    if sample_series.currently_responsible_person != user and  user not in sample_series.topic.members.all()and \
+    if sample_series.currently_responsible_person != user and sample_series.topic_id not in _get_topic_ids(user) and \
             not user.is_superuser:
         description = _("You are not allowed to view the sample series “{name}” because neither are "
                         "you the currently responsible person for it, nor are you in its topic.").format(name=sample_series)
@@ -875,7 +1042,7 @@ def assert_can_edit_topic(user, topic=None):
                 .format(name=translate_permission("jb_common.add_topic"))
             raise PermissionError(user, description)
     else:
-        if user in topic.members.all():
+        if topic.id in _get_topic_ids(user):
             if not user.has_perm("jb_common.change_topic") and \
                     topic.manager != user:
                 description = _("You are not allowed to change this topic because you don't have the permission "
@@ -24,6 +24,7 @@ ADD_SAMPLES_VIEW = ""
 CACHE_ROOT = "/tmp/juliabase_cache"
 CRAWLER_LOGS_ROOT = ""
 CRAWLER_LOGS_WHITELIST = []
+FEED_FAN_OUT_ON_READ = False
 INITIALS_FORMATS = {"user": {"pattern": r"[A-Z]{2,4}|[A-Z]{2,3}\d|[A-Z]{2}\d{2}",
                              "description": _("The initials start with two uppercase letters.  "
                                               "They contain uppercase letters and digits only.  Digits are at the end.")},
@@ -35,6 +36,9 @@ INITIALS_FORMATS = {"user": {"pattern": r"[A-Z]{2,4}|[A-Z]{2,3}\d|[A-Z]{2}\d{2}"
                     }
 MERGE_CLEANUP_FUNCTION = ""
 NAME_PREFIX_TEMPLATES = []
+OAI_PMH_PAGE_SIZE = 500
+PARSED_DATA_CACHE_SIZE = 256 * 1024**2
+PLOT_RENDERING_PROCESSES = 0
 SAMPLE_NAME_FORMATS = {"provisional": {"possible_renames": {"default"}},
                        "default":     {"pattern": r"[-A-Za-z_/0-9#()]*"}}
 THUMBNAIL_WIDTH = 400
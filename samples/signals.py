@@ -16,8 +16,9 @@
 
 
 """The samples database app.  This module contains the signal listeners.  Most
-of them are for cache expiring, but `expire_feed_entries` cleans up the feed
-entries queue.
+of them are for cache expiring, but `expire_feed_entries` and
+`delete_orphaned_feed_entries` clean up the feed entries queue, and
+`clean_parsed_data_cache` cleans up the cache of parsed plot data.
 
 
 Caching in JuliaBase-Samples
@@ -55,14 +56,24 @@ main menu page.  We implement a three-level cache:
 
 These three levels are tried from top to bottom.
 
+Additionally, the bodies of lab notebook pages are cached for every process
+class, month, and language.  Every month of a lab notebook has a generation
+counter of its own, so that a changed process makes only the pages of its month
+obsolete.
+
 
 Cache invalidation
 ..................
 
 Of course, the server must never serve outdated data to the user.  In order to
-prevent that, every change in the database triggers deletion of those cache
-items which have become obsolete.  This is very difficult to achive because
-JuliaBase-Samples contains so many inter-model dependencies (partly indirect).
+prevent that, every change in the database makes those cache items obsolete
+which depend on it.  For this, samples and processes have a generation counter
+in the cache which is part of the cache keys of their items (see
+:py:func:`jb_common.utils.base.get_cache_generations`).  Touching a sample or
+process increases its counter atomically, so its outdated items are simply
+never read again and expire eventually.  Still, finding out what needs to be
+touched is very difficult because JuliaBase-Samples contains so many
+inter-model dependencies (partly indirect).
 
 It may also be possible to compare timestamps in order to detect obsolete cache
 items, however, calculating these timestamps is not much easier and required
@@ -75,10 +86,10 @@ affected by changes in the first models.  There is not even a good general
 strategy for this.  I myself made a big table with paper and pencil.
 
 The best approach is to have in mind the six models that need to be “touched”
-in order to delete cache items or to update a last-modified timestamp:
+in order to obsolete cache items or to update a last-modified timestamp:
 
-1. ``Sample``.  This contains both a ``last_modified`` timestamp and a list of
-   cache items.
+1. ``Sample``.  This contains both a ``last_modified`` timestamp and a cache
+   generation.
 
 2. ``Process``.  The same as with ``Sample``.
 
@@ -162,15 +173,22 @@ is greater than 1:
 
 
 import datetime, hashlib
+from functools import partial
+from pathlib import Path
+from django.conf import settings
+from django.db import transaction
 from django.db.models import signals
 import django.utils.timezone
 from django.dispatch import receiver
-from django.contrib.auth.models import User
+from django.contrib.auth.models import User, Permission
 import django.contrib.contenttypes.management
 from django.contrib.contenttypes.models import ContentType
 from jb_common import models as jb_common_app
 import jb_common.signals
+import jb_common.utils.base
 from samples import models as samples_app
+import samples.permissions
+import samples.utils.plot_rendering
 
 
 @receiver(signals.m2m_changed, sender=samples_app.Sample.watchers.through)
@@ -287,30 +305,73 @@ def touch_user_samples_and_processes(sender, instance, created, **kwargs):
             sample_series.save()
 
 
+@receiver(signals.post_save)
+def render_process_plots(sender, instance, raw, **kwargs):
+    """Queues the rendering of the plots of a process after it was saved, so
+    that the plot view finds them ready.  See
+    :py:mod:`samples.utils.plot_rendering`.
+    """
+    if settings.PLOT_RENDERING_PROCESSES and not raw and isinstance(instance, samples_app.Process):
+        transaction.on_commit(partial(samples.utils.plot_rendering.schedule_process_plots, instance.actual_instance))
+
+
+@receiver(signals.post_delete, sender=samples_app.Process)
+def touch_lab_notebooks_of_deleted_process(sender, instance, **kwargs):
+    """Makes the cached lab notebook pages obsolete which showed a deleted
+    process.  Note that deleting a derived process deletes its ``Process``
+    instance, too, so this is triggered for all processes.
+    """
+    instance.touch_lab_notebooks(instance.timestamp)
+
+
 @receiver(signals.m2m_changed, sender=samples_app.Sample.processes.through)
 def touch_process_samples(sender, instance, action, reverse, model, pk_set, **kwargs):
     """Touch samples and processes when the relation between both changes.
     For example, if the samples connected with a process are changed, both the
-    process and all affected samples are marked as “modified”.
+    process and all affected samples are marked as “modified”.  Moreover, the
+    affected histories of the samples are touched.
     """
     if reverse:
         # `instance` is a process
         instance.save()
         if action == "pre_clear":
             for sample in instance.samples.all():
+                sample.touch_history(instance.timestamp)
                 sample.save()
         elif action in ["post_add", "post_remove"]:
             for sample in samples_app.Sample.objects.in_bulk(pk_set).values():
+                sample.touch_history(instance.timestamp)
                 sample.save()
     else:
         # `instance` is a sample; shouldn't actually occur in JuliaBase's code
-        instance.save()
         if action == "pre_clear":
-            for process in instance.processes.all():
-                process.save(with_relations=False)
+            processes = instance.processes.all()
         elif action in ["post_add", "post_remove"]:
-            for process in samples_app.Process.objects.in_bulk(pk_set).values():
-                process.save(with_relations=False)
+            processes = samples_app.Process.objects.in_bulk(pk_set).values()
+        else:
+            processes = []
+        if processes:
+            instance.touch_history(min(process.timestamp for process in processes))
+        instance.save()
+        for process in processes:
+            process.save(with_relations=False)
+
+
+def touch_sample_series_histories(sample_series, samples):
+    """Touches the histories of the given samples which are affected by the
+    results of the given sample series.
+
+    :param sample_series: the sample series
+    :param samples: the samples that are added to or removed from the series, or
+      that are members of it
+
+    :type sample_series: `samples.models.SampleSeries`
+    :type samples: iterable of `samples.models.Sample`
+    """
+    first_result = sample_series.results.order_by("timestamp").first()
+    if first_result:
+        for sample in samples:
+            sample.touch_history(first_result.timestamp)
 
 
 @receiver(signals.m2m_changed, sender=samples_app.SampleSeries.samples.through)
@@ -321,40 +382,62 @@ def touch_sample_series_samples(sender, instance, action, reverse, model, pk_set
     """
     if reverse:
         # `instance` is a sample; shouldn't actually occur in JuliaBase's code
-        instance.save()
         if action == "pre_clear":
-            for sample_series in instance.series.all():
-                sample_series.save()
+            all_sample_series = instance.series.all()
         elif action in ["post_add", "post_remove"]:
-            for sample_series in samples_app.SampleSeries.objects.in_bulk(pk_set).values():
-                sample_series.save()
+            all_sample_series = samples_app.SampleSeries.objects.in_bulk(pk_set).values()
+        else:
+            all_sample_series = []
+        for sample_series in all_sample_series:
+            touch_sample_series_histories(sample_series, [instance])
+        instance.save()
+        for sample_series in all_sample_series:
+            sample_series.save()
     else:
         # `instance` is a sample series
         instance.save()
         if action == "pre_clear":
-            for sample in instance.samples.all():
-                sample.save()
+            samples = instance.samples.all()
         elif action in ["post_add", "post_remove"]:
-            for sample in samples_app.Sample.objects.in_bulk(pk_set).values():
-                sample.save()
+            samples = samples_app.Sample.objects.in_bulk(pk_set).values()
+        else:
+            samples = []
+        touch_sample_series_histories(instance, samples)
+        for sample in samples:
+            sample.save()
 
 
 @receiver(signals.m2m_changed, sender=samples_app.SampleSeries.results.through)
 def touch_sample_series_results(sender, instance, action, reverse, model, pk_set, **kwargs):
     """Touch sample series when the relation between both changes.  Note that
     we never touch results here because they don't cache information about
-    their relationship to series.
+    their relationship to series.  However, the histories of the samples in the
+    series are touched.
     """
     if reverse:
         # `instance` is a result
         if action == "pre_clear":
-            for sample_series in instance.sample_series.all():
-                sample_series.save(touch_samples=True)
+            all_sample_series = instance.sample_series.all()
         elif action in ["post_add", "post_remove"]:
-            for sample_series in samples_app.SampleSeries.objects.in_bulk(pk_set).values():
-                sample_series.save(touch_samples=True)
+            all_sample_series = samples_app.SampleSeries.objects.in_bulk(pk_set).values()
+        else:
+            all_sample_series = []
+        for sample_series in all_sample_series:
+            for sample in sample_series.samples.all():
+                sample.touch_history(instance.timestamp)
+            sample_series.save(touch_samples=True)
     else:
         # `instance` is a sample series
+        if action == "pre_clear":
+            results = instance.results.all()
+        elif action in ["post_add", "post_remove"]:
+            results = samples_app.Result.objects.in_bulk(pk_set).values()
+        else:
+            results = []
+        if results:
+            timestamp = min(result.timestamp for result in results)
+            for sample in instance.samples.all():
+                sample.touch_history(timestamp)
         instance.save()
 
 
@@ -388,6 +471,7 @@ def touch_my_samples_list_by_topic_memberships(sender, instance, action, reverse
     now = django.utils.timezone.now()
     if reverse:
         # `instance` is a user
+        samples.permissions.clear_permissions_cache(instance)
         user_details = instance.samples_user_details
         user_details.my_samples_list_timestamp = now
         user_details.save()
@@ -444,6 +528,33 @@ def touch_display_settings_by_group_or_permission(sender, instance, action, reve
             instance.samples_user_details.touch_display_settings()
 
 
+@receiver(signals.post_save, sender=Permission)
+@receiver(signals.post_delete, sender=Permission)
+@receiver(signals.post_save, sender=ContentType)
+@receiver(signals.post_delete, sender=ContentType)
+@receiver(signals.post_migrate)
+def clear_class_permissions_cache(sender, **kwargs):
+    """Clears the cache of existing permissions in `samples.permissions`.
+    Note that ``post_migrate`` is needed, too, because Django creates the
+    permissions of new models with ``bulk_create``, which sends no
+    ``post_save`` signals.
+    """
+    samples.permissions.clear_class_permissions_cache()
+
+
+@receiver(signals.m2m_changed, sender=samples_app.Clearance.processes.through)
+@receiver(signals.post_delete, sender=samples_app.Clearance)
+def clear_permissions_cache_by_clearance(sender, instance, reverse=False, **kwargs):
+    """Clears the permissions cache of the user of a changed clearance, so that
+    the cleared processes are read again in the same request.  The permissions
+    cache lives in the user instance, so only the instance attached to the
+    clearance is affected.  This is the one which matters in
+    `samples.utils.views.enforce_clearance`.
+    """
+    if not reverse and samples_app.Clearance.user.is_cached(instance):
+        samples.permissions.clear_permissions_cache(instance.user)
+
+
 @receiver(jb_common.signals.maintain)
 def expire_feed_entries(sender, **kwargs):
     """Deletes all feed entries which are older than six weeks.
@@ -451,3 +562,23 @@ def expire_feed_entries(sender, **kwargs):
     now = django.utils.timezone.now()
     six_weeks_ago = now - datetime.timedelta(weeks=6)
     samples_app.FeedEntry.objects.filter(timestamp__lt=six_weeks_ago).delete()
+
+
+@receiver(jb_common.signals.maintain)
+def delete_orphaned_feed_entries(sender, **kwargs):
+    """Deletes all feed entries about samples of which all samples have been
+    deleted.  They are phony, and they are skipped in the feed anyway.
+    """
+    for model in (samples_app.FeedNewSamples, samples_app.FeedMovedSamples, samples_app.FeedCopiedMySamples,
+                  samples_app.FeedEditedSamples):
+        model.objects.filter(samples__isnull=True).delete()
+
+
+@receiver(jb_common.signals.maintain)
+def clean_parsed_data_cache(sender, **kwargs):
+    """Cleans up the file cache of
+    :py:func:`samples.utils.plots.read_cached_columns`.
+    """
+    if settings.PARSED_DATA_CACHE_SIZE:
+        jb_common.utils.base.clean_artefact_cache(Path(settings.CACHE_ROOT)/"parsed_data",
+                                                  settings.PARSED_DATA_CACHE_SIZE)
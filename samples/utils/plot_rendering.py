@@ -0,0 +1,296 @@
+# This file is part of JuliaBase, see http://www.juliabase.org.
+# Copyright © 2008–2022 Forschungszentrum Jülich GmbH, Jülich, Germany
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Rendering of process plots.  Plots may be rendered in a pool of worker
+processes into the blob storage, so that the plot view merely streams finished
+files.  The number of worker processes is given by the setting
+``PLOT_RENDERING_PROCESSES``.  If it is zero, there is no pool, and plots are
+rendered synchronously within the request.
+
+Rendering is triggered when a process is saved (see
+:py:func:`samples.signals.render_process_plots`), and by the plot view if the
+plot is requested before it is ready.  The blob path of a plot contains a hash
+of all timestamps the plot depends on, so that a finished plot never needs to
+be invalidated.  All renderings of a plot live in one directory; once a new
+one is in place, the superseded ones are deleted.
+"""
+
+import os.path, hashlib, threading, multiprocessing, uuid, logging, concurrent.futures
+from io import BytesIO
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import translation
+import jb_common.utils.blobs
+from jb_common.utils.base import get_file_timestamps
+from samples import models
+from samples.utils.plots import PlotError
+
+
+logger = logging.getLogger(__name__)
+
+def render_plot(process, plot_id, thumbnail, datafile_name):
+    """Renders a plot of a process with Matplotlib.
+
+    :param process: the process the plot of which should be rendered
+    :param plot_id: the ID of the plot.  This is mostly ``""`` because most
+        measurement models have only one graphics.
+    :param thumbnail: whether to render an SVG thumbnail rather than a PDF
+    :param datafile_name: the datafile(s) of the plot, as returned by the
+        process' ``get_datafile_name``
+
+    :type process: `samples.models.Process`
+    :type plot_id: str
+    :type thumbnail: bool
+    :type datafile_name: Path or list of Path
+
+    :return:
+      the plot, with the current position at the very beginning
+
+    :rtype: BytesIO
+
+    :raises PlotError: if the plot could not be generated
+    """
+    try:
+        output = BytesIO()
+        if thumbnail:
+            figure = Figure(frameon=False, figsize=(4.2, 3.15))
+            canvas = FigureCanvasAgg(figure)
+            axes = figure.add_subplot(111)
+            axes.set_position((0.17, 0.16, 0.78, 0.78))
+            axes.grid(True)
+            process.draw_plot(axes, plot_id, datafile_name, for_thumbnail=True)
+            canvas.print_figure(output, format="svg")
+        else:
+            figure = Figure()
+            canvas = FigureCanvasAgg(figure)
+            axes = figure.add_subplot(111)
+            axes.grid(True)
+            axes.set_title(str(process))
+            process.draw_plot(axes, plot_id, datafile_name, for_thumbnail=False)
+            # FixMe: Activate this line with Matplotlib 1.1.0.
+#                figure.tight_layout()
+            canvas.print_figure(output, format="pdf")
+    except ValueError as e:
+        raise PlotError("Plot could not be generated: " + e.args[0])
+    output.seek(0)
+    return output
+
+
+def get_plot_artefact_path(process, plot_id, thumbnail, datafile_names):
+    """Returns the path of a rendered plot in the blob storage.  It contains the
+    current language and a hash of all timestamps the plot depends on.  The
+    directory of the path is the same for all renderings of the plot.
+
+    :param process: the process the plot of which is requested
+    :param plot_id: the ID of the plot
+    :param thumbnail: whether the SVG thumbnail rather than the PDF is meant
+    :param datafile_names: the datafiles of the plot
+
+    :type process: `samples.models.Process`
+    :type plot_id: str
+    :type thumbnail: bool
+    :type datafile_names: list of Path
+
+    :return:
+      the path of the plot in the blob storage
+
+    :rtype: str
+
+    :raises OSError: if one of the datafiles is not found
+    """
+    timestamps = [] if thumbnail else [sample.last_modified for sample in process.samples.all()]
+    timestamps.append(process.last_modified)
+    timestamps.extend(get_file_timestamps(datafile_names))
+    hash_ = hashlib.sha1()
+    hash_.update(";".join(str(timestamp) for timestamp in sorted(timestamps)).encode())
+    plot_file = process.calculate_plot_locations(plot_id)["thumbnail_file" if thumbnail else "plot_file"]
+    return os.path.join(plot_file, hash_.hexdigest()[:10] + os.path.splitext(plot_file)[1])
+
+
+def plot_artefact_exists(path):
+    """Returns whether the rendered plot exists in the blob storage.
+
+    :param path: path of the plot in the blob storage
+
+    :type path: str
+
+    :rtype: bool
+    """
+    return jb_common.utils.blobs.storage.exists_many([path])[path]
+
+
+def get_plot_error(path):
+    """Returns the error message of a failed rendering job.
+
+    :param path: path of the plot in the blob storage
+
+    :type path: str
+
+    :return:
+      the error message, or ``None`` if no rendering of this plot has failed
+
+    :rtype: str or NoneType
+    """
+    return cache.get("plot-error:" + path)
+
+
+executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    """Returns the pool of worker processes, creating it if necessary.  The
+    workers are spawned rather than forked so that they don't inherit database
+    connections or locks of the parent.
+
+    :return:
+      the process pool
+
+    :rtype: concurrent.futures.ProcessPoolExecutor
+    """
+    global executor
+    with _executor_lock:
+        if executor is None:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                settings.PLOT_RENDERING_PROCESSES, mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup)
+        return executor
+
+
+def _delete_superseded_plot_artefacts(path):
+    """Deletes all renderings of a plot but the one at ``path``.  Temporary files
+    of renderings in progress are left alone.
+
+    :param path: the path of the current plot in the blob storage
+
+    :type path: str
+    """
+    storage = jb_common.utils.blobs.storage
+    directory, filename = os.path.split(path)
+    extension = os.path.splitext(filename)[1]
+    for sibling in storage.list(directory):
+        if sibling != filename and os.path.splitext(sibling)[1] == extension:
+            try:
+                storage.unlink(os.path.join(directory, sibling))
+            except FileNotFoundError:
+                pass
+
+
+def _render_plot_artefact(process_id, plot_id, thumbnail, language, path):
+    """Renders a plot into the blob storage.  This is run in the worker
+    processes.  The file is written under a temporary name first, so that
+    readers never see a partial plot.  Afterwards, superseded renderings of the
+    plot are deleted.  If rendering fails, the error message is stored in the
+    cache for the plot view, so that it doesn't queue the plot again.
+
+    :param process_id: the ID of the process
+    :param plot_id: the ID of the plot
+    :param thumbnail: whether to render an SVG thumbnail rather than a PDF
+    :param language: the language code to render the plot in
+    :param path: the path of the plot in the blob storage
+
+    :type process_id: int
+    :type plot_id: str
+    :type thumbnail: bool
+    :type language: str
+    :type path: str
+    """
+    storage = jb_common.utils.blobs.storage
+    try:
+        if plot_artefact_exists(path):
+            return
+        with translation.override(language):
+            process = models.Process.objects.get(pk=process_id).actual_instance
+            try:
+                stream = render_plot(process, plot_id, thumbnail, process.get_datafile_name(plot_id))
+            except (PlotError, OSError) as e:
+                cache.set("plot-error:" + path, str(e) or "Plot could not be generated.", 60 * 60)
+                return
+        temporary_path = "{}.{}".format(path, uuid.uuid4())
+        file_ = storage.open(temporary_path, "w")
+        try:
+            file_.write(stream.getvalue())
+        finally:
+            file_.close()
+        storage.move(temporary_path, path)
+        _delete_superseded_plot_artefacts(path)
+    except Exception:
+        logger.exception("Rendering of plot %s failed", path)
+        cache.set("plot-error:" + path, "Plot could not be generated.", 60 * 60)
+    finally:
+        cache.delete("plot-rendering:" + path)
+
+
+def schedule_plot_rendering(process, plot_id, thumbnail, path, language=None):
+    """Queues the rendering of a plot, unless it is already queued.
+
+    :param process: the process the plot of which should be rendered
+    :param plot_id: the ID of the plot
+    :param thumbnail: whether to render an SVG thumbnail rather than a PDF
+    :param path: the path of the plot in the blob storage, as returned by
+        `get_plot_artefact_path`
+    :param language: the language code to render the plot in; defaults to the
+        current language
+
+    :type process: `samples.models.Process`
+    :type plot_id: str
+    :type thumbnail: bool
+    :type path: str
+    :type language: str
+
+    :return:
+      whether plots are rendered in the background; if ``False``, the caller
+      has to render the plot itself
+
+    :rtype: bool
+    """
+    if not settings.PLOT_RENDERING_PROCESSES:
+        return False
+    if cache.add("plot-rendering:" + path, True, 10 * 60):
+        _get_executor().submit(_render_plot_artefact, process.id, plot_id, thumbnail,
+                               language or translation.get_language(), path)
+    return True
+
+
+def schedule_process_plots(process):
+    """Queues the rendering of the default plot of a process, both thumbnail and
+    PDF, in all languages.  Plots with a non-empty plot ID are rendered on
+    first request.
+
+    :param process: the process the plot of which should be rendered
+
+    :type process: `samples.models.Process`
+    """
+    if not settings.PLOT_RENDERING_PROCESSES:
+        return
+    try:
+        datafile_name = process.get_datafile_name("")
+    except NotImplementedError:
+        return
+    if datafile_name is None:
+        return
+    datafile_names = datafile_name if isinstance(datafile_name, list) else [datafile_name]
+    for language, __ in settings.LANGUAGES:
+        with translation.override(language):
+            for thumbnail in (True, False):
+                try:
+                    path = get_plot_artefact_path(process, "", thumbnail, datafile_names)
+                except OSError:
+                    return
+                schedule_plot_rendering(process, "", thumbnail, path, language)
@@ -16,7 +16,21 @@
 
 
 
-import codecs
+"""Helpers for reading the raw datafiles of plots.  The datafiles are parsed
+with NumPy.  Well-formed data is read by NumPy's C parser; if it encounters
+unparsable cells or short rows, the data is parsed once more cell by cell, so
+that unparsable cells become NaN and short rows raise a `PlotError`.
+
+Parsed columns may be cached with `read_cached_columns`, so that all variants
+of a plot (thumbnail, PDF, languages) parse their datafile only once.
+"""
+
+import io, os, re, mmap, hashlib, uuid
+from contextlib import contextmanager
+from pathlib import Path
+import numpy
+from django.conf import settings
+from jb_common.utils.base import evict_least_recently_used
 
 
 class PlotError(Exception):
@@ -27,7 +41,131 @@ class PlotError(Exception):
     pass
 
 
-def read_plot_file_beginning_at_line_number(filename, columns, start_line_number, end_line_number=None, separator=None):
+@contextmanager
+def _datafile_content(filename, memory_map):
+    """Context manager for the raw content of a datafile.
+
+    :param filename: full path to the data file
+    :param memory_map: whether the file should be memory-mapped instead of
+        being read into memory
+
+    :type filename: str or Path
+    :type memory_map: bool
+
+    :return:
+      the content of the file
+
+    :rtype: bytes or mmap.mmap
+
+    :raises PlotError: if the file could not be opened
+    """
+    try:
+        datafile = open(filename, "rb")
+    except OSError:
+        raise PlotError("datafile could not be opened")
+    with datafile:
+        if memory_map:
+            try:
+                content = mmap.mmap(datafile.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped.
+                content = b""
+        else:
+            content = datafile.read()
+    try:
+        yield content
+    finally:
+        if isinstance(content, mmap.mmap):
+            content.close()
+
+
+def _line_offsets(content):
+    """Returns the offsets of the beginnings of all lines.
+
+    :param content: the content of the datafile
+
+    :type content: bytes or mmap.mmap
+
+    :return:
+      the offsets of all lines; the item with index *i* is the offset of the
+      line with the line number *i* + 1
+
+    :rtype: numpy.ndarray
+    """
+    if not len(content):
+        return numpy.zeros(1, dtype=int)
+    newlines = numpy.flatnonzero(numpy.frombuffer(content, dtype=numpy.uint8) == ord("\n"))
+    return numpy.concatenate(([0], newlines + 1))
+
+
+def _parse_columns_per_cell(text, columns, separator):
+    """Parses the selected columns cell by cell.  This is the fallback of
+    `_parse_columns` for data which NumPy cannot parse.
+
+    :param text: the data lines
+    :param columns: the columns that should be read
+    :param separator: the separator which separates the values from each other
+
+    :type text: str
+    :type columns: list of int
+    :type separator: str or None
+
+    :return:
+      the columns
+
+    :rtype: list of numpy.ndarray
+
+    :raises PlotError: if a line contains too few columns
+    """
+    result = [[] for i in range(len(columns))]
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        cells = line.strip().split(separator)
+        for column, result_array in zip(columns, result):
+            try:
+                value = float(cells[column].replace(",", "."))
+            except IndexError:
+                raise PlotError("datafile contained too few columns")
+            except ValueError:
+                value = float("nan")
+            result_array.append(value)
+    return [numpy.array(result_array, dtype=float) for result_array in result]
+
+
+def _parse_columns(text, columns, separator):
+    """Parses the selected columns of the data lines.  Empty lines are skipped,
+    decimal commas are allowed, and unparsable cells are returned as NaN.
+
+    :param text: the data lines
+    :param columns: the columns that should be read
+    :param separator: the separator which separates the values from each other
+
+    :type text: str
+    :type columns: list of int
+    :type separator: str or None
+
+    :return:
+      the columns
+
+    :rtype: list of numpy.ndarray
+
+    :raises PlotError: if a line contains too few columns
+    """
+    if separator != ",":
+        text = text.replace(",", ".")
+    if not text.strip():
+        return [numpy.empty(0) for column in columns]
+    try:
+        data = numpy.loadtxt(io.StringIO(text), dtype=float, comments=None, delimiter=separator, usecols=columns,
+                             ndmin=2)
+    except ValueError:
+        return _parse_columns_per_cell(text, columns, separator)
+    return list(data.T)
+
+
+def read_plot_file_beginning_at_line_number(filename, columns, start_line_number, end_line_number=None, separator=None,
+                                            memory_map=False):
     """Read a datafile and returns the content of selected columns beginning at
     start_line_number.  You shouldn't use this function directly. Use the
     specific functions instead.
@@ -39,50 +177,38 @@ def read_plot_file_beginning_at_line_number(filename, columns, start_line_number
          The default is ``None``, means till end of file.
     :param separator: the separator which separates the values from each other.
         Default is ``None``
+    :param memory_map: whether the file should be memory-mapped instead of
+        being read into memory; this is worthwhile for big files of which only
+        a small part is read
 
     :type filename: str
     :type columns: list of int
     :type start_line_number: int
     :type end_line_number: int or None
     :type separator: str or None
+    :type memory_map: bool
 
     :return:
-      List of all columns.  Every column is represented as a list of floating
-      point values.
+      List of all columns.  Every column is represented as an array of
+      floating point values.
 
-    :rtype: list of list of float
+    :rtype: list of numpy.ndarray
 
     :raises PlotError: if something wents wrong with interpreting the file (I/O,
         unparseble data)
     """
-    start_values = False
-    try:
-        datafile = codecs.open(filename, encoding="cp1252")
-    except IOError:
-        raise PlotError("datafile could not be opened")
-    result = [[] for i in range(len(columns))]
-    for line_number, line in enumerate(datafile, start=1):
-        if start_values:
-            if end_line_number and line_number > end_line_number:
-                break
-            if not line.strip():
-                continue
-            cells = line.strip().split(separator)
-            for column, result_array in zip(columns, result):
-                try:
-                    value = float(cells[column].replace(",", "."))
-                except IndexError:
-                    raise PlotError("datafile contained too few columns")
-                except ValueError:
-                    value = float("nan")
-                result_array.append(value)
-        elif line_number == start_line_number - 1:
-            start_values = True
-    datafile.close()
-    return result
-
-
-def read_plot_file_beginning_after_start_value(filename, columns, start_value, end_value="", separator=None):
+    with _datafile_content(filename, memory_map) as content:
+        line_offsets = _line_offsets(content)
+        def offset(line_number):
+            return int(line_offsets[line_number - 1]) if line_number <= len(line_offsets) else len(content)
+        start = offset(max(start_line_number, 1))
+        end = offset(end_line_number + 1) if end_line_number else len(content)
+        text = content[start:end].decode("cp1252", errors="replace") if end > start else ""
+    return _parse_columns(text, columns, separator)
+
+
+def read_plot_file_beginning_after_start_value(filename, columns, start_value, end_value="", separator=None,
+                                               memory_map=False):
     """Read a datafile and return the content of selected columns after the
     start_value was detected.  You shouldn't use this function directly. Use
     the specific functions instead.
@@ -95,44 +221,94 @@ def read_plot_file_beginning_after_start_value(filename, columns, start_value, e
         end.  The default is the empty string
     :param separator: the separator which separates the values from each
         other.  Default is ``None``
+    :param memory_map: whether the file should be memory-mapped instead of
+        being read into memory
 
     :type filename: str
     :type columns: list of int
     :type start_value: str
     :type end_value: str
     :type separator: str or None
+    :type memory_map: bool
 
     :return:
-      List of all columns.  Every column is represented as a list of floating
-      point values.
+      List of all columns.  Every column is represented as an array of
+      floating point values.
 
-    :rtype: list of list of float
+    :rtype: list of numpy.ndarray
 
     :raises PlotError: if something wents wrong with interpreting the file (I/O,
         unparseble data)
     """
-    start_values = False
-    try:
-        datafile = codecs.open(filename, encoding="cp1252")
-    except IOError:
-        raise PlotError("datafile could not be opened")
-    result = [[] for i in range(len(columns))]
-    for line in datafile:
-        if start_values:
-            if end_value and line.lower().startswith(end_value):
+    start_value = start_value.lower()
+    with _datafile_content(filename, memory_map) as content:
+        start = None
+        for line_start in _line_offsets(content):
+            line_end = content.find(b"\n", line_start)
+            line_end = len(content) if line_end == -1 else line_end + 1
+            if content[line_start:line_end].decode("cp1252", errors="replace").lower().startswith(start_value):
+                start = line_end
                 break
-            if not line.strip():
-                continue
-            cells = line.strip().split(separator)
-            for column, result_array in zip(columns, result):
-                try:
-                    value = float(cells[column].replace(",", "."))
-                except IndexError:
-                    raise PlotError("datafile contained too few columns")
-                except ValueError:
-                    value = float("nan")
-                result_array.append(value)
-        elif line.lower().startswith(start_value.lower()):
-            start_values = True
-    datafile.close()
-    return result
+        text = content[start:].decode("cp1252", errors="replace") if start is not None else ""
+    if end_value:
+        match = re.search("^" + re.escape(end_value), text.lower(), re.MULTILINE)
+        if match:
+            text = text[:match.start()]
+    return _parse_columns(text, columns, separator)
+
+
+def read_cached_columns(filename, reader, *args, **kwargs):
+    """Returns the columns of a datafile, using a cache of parsed data.  The
+    cache consists of ``.npy`` files in ``CACHE_ROOT`` which are keyed by the
+    path and the mtime of the datafile and by the reader call.  Thus, it is
+    shared by all variants of a plot.  Its size is limited by the setting
+    ``PARSED_DATA_CACHE_SIZE``; if it is exceeded, the least recently used
+    files are removed.
+
+    :param filename: full path to the data file
+    :param reader: the function which parses the datafile; it is called with
+        ``filename`` and all further parameters, and must return columns of
+        equal length
+    :param args: further positional parameters for ``reader``
+    :param kwargs: further keyword parameters for ``reader``
+
+    :type filename: Path
+    :type reader: callable
+
+    :return:
+      List of all columns.  Every column is represented as an array of
+      floating point values.
+
+    :rtype: list of numpy.ndarray
+
+    :raises PlotError: if ``reader`` raises it
+    """
+    if not settings.PARSED_DATA_CACHE_SIZE:
+        return list(reader(filename, *args, **kwargs))
+    try:
+        mtime = os.stat(filename).st_mtime_ns
+    except OSError:
+        return list(reader(filename, *args, **kwargs))
+    hash_ = hashlib.sha1()
+    hash_.update(repr((str(filename), mtime, reader.__module__, reader.__qualname__, args, sorted(kwargs.items())))
+                 .encode())
+    directory = Path(settings.CACHE_ROOT)/"parsed_data"
+    path = directory/(hash_.hexdigest() + ".npy")
+    try:
+        data = numpy.load(path, mmap_mode="r")
+    except (FileNotFoundError, ValueError):
+        pass
+    else:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return list(data)
+    data = numpy.asarray(reader(filename, *args, **kwargs), dtype=float)
+    os.makedirs(directory, exist_ok=True)
+    temporary_path = directory/"{}.{}.part".format(path.name, uuid.uuid4())
+    with open(temporary_path, "wb") as cache_file:
+        numpy.save(cache_file, data)
+    os.replace(temporary_path, path)
+    evict_least_recently_used(directory, settings.PARSED_DATA_CACHE_SIZE)
+    return list(data)
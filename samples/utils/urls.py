@@ -20,7 +20,7 @@ from django.apps import apps
 from django.urls import re_path, get_callable
 from jb_common.utils.base import camel_case_to_underscores
 from samples.views import lab_notebook
-import samples.views.main
+import samples.views.main, samples.views.json_client
 
 
 class PatternGenerator:
@@ -70,6 +70,10 @@ class PatternGenerator:
         is generated using a generic view function (which is mostly
         sufficient).
 
+        If the “add” view is a class-based ``EditView``, an additional URL for
+        adding many processes at once is generated, see
+        :py:func:`samples.views.json_client.bulk_add`.
+
         :param class_name: Name of the physical process class,
             e.g. ``"ThicknessMeasurement"``.
         :param identifying_field: If applicable, name of the model field which
@@ -121,6 +125,10 @@ class PatternGenerator:
         if "add" in views:
             self.url_patterns.append(re_path(r"^{}/add/$".format(url_name), edit_view_callable,
                                              {normalized_id_field: None}, "add_" + class_name_with_underscores))
+            if hasattr(module, "EditView"):
+                self.url_patterns.append(re_path(r"^{}/bulk_add/$".format(url_name), samples.views.json_client.bulk_add,
+                                                 {"view_class": module.EditView, normalized_id_field: None},
+                                                 "bulk_add_" + class_name_with_underscores))
         if "edit" in views:
             self.url_patterns.append(re_path(r"^{}/(?P<{}>.+)/edit/$".format(url_name, normalized_id_field),
                                              edit_view_callable, name="edit_" + class_name_with_underscores))
@@ -19,12 +19,16 @@
 views package.
 """
 
-import copy, re, csv
+import copy, re, csv, json, io, itertools, datetime
 from io import StringIO
+try:
+    import pyarrow, pyarrow.parquet
+except ImportError:
+    pyarrow = None
 from django.conf import settings
 from django.core.cache import cache
 from django.db.models import Q
-from django.http import Http404, HttpResponse
+from django.http import Http404, StreamingHttpResponse
 from django.utils.translation import gettext_lazy as _, gettext
 from django.contrib.contenttypes.models import ContentType
 import django.utils.text
@@ -32,14 +36,14 @@ from jb_common import mimeparse
 from samples import models, permissions
 from samples.utils import sample_names
 from samples.views.table_export import build_column_group_list, ColumnGroupsForm, \
-    ColumnsForm, generate_table_rows, flatten_tree, OldDataForm, SwitchRowForm
+    ColumnsForm, generate_table_rows, prepare_row_tree, OldDataForm, SwitchRowForm
 import jb_common.utils.base
 
 
 __all__ = ("AmbiguityException", "lookup_sample", "convert_id_to_int",
            "successful_response", "remove_samples_from_my_samples", "StructuredSeries", "StructuredTopic",
-           "build_structured_sample_list", "extract_preset_sample", "digest_process", "restricted_samples_query",
-           "enforce_clearance", "table_export", "median", "average")
+           "build_structured_sample_list", "extract_preset_sample", "digest_process", "digest_processes",
+           "restricted_samples_query", "enforce_clearance", "table_export", "median", "average")
 
 
 class AmbiguityException(Exception):
@@ -414,22 +418,64 @@ def digest_process(process, user, local_context={}):
 
     :rtype: dict mapping str to ``object``
     """
-    process = process.actual_instance
-    cache_key = process.get_cache_key(user.jb_user_details.get_data_hash(), local_context)
-    cached_context = jb_common.utils.base.get_from_cache(cache_key) if cache_key else None
-    if cached_context is None:
-        process_context = process.get_context_for_user(user, local_context)
+    return digest_processes([(process, local_context)], user)[0]
+
+
+def digest_processes(processes, user, generations=None):
+    """Convert many processes to process contexts.  This is the batched version
+    of `digest_process`.  All cache keys are computed first, and then fetched
+    from the cache in one go.  Only the misses are rendered, and they are
+    written back to the cache in one go, too.  Thus, the number of cache round
+    trips does not depend on the number of processes.
+
+    The cache keys contain the cache generations of the processes (see
+    :py:func:`jb_common.utils.base.get_cache_generations`), so that items of
+    modified processes are not found anymore.
+
+    :param processes: the processes to be digest, each together with its local
+      sample context (see `digest_process`)
+    :param user: current user
+    :param generations: the current cache generations of the processes, if the
+      caller has already fetched them
+
+    :type processes: iterable of (`samples.models.Process`, dict mapping str to
+      ``object``)
+    :type user: django.contrib.auth.models.User
+    :type generations: dict mapping str to int
+
+    :return:
+      the process contexts of the given processes, in the same order
+
+    :rtype: list of dict mapping str to ``object``
+    """
+    user_settings_hash = user.jb_user_details.get_data_hash()
+    processes = [(process.actual_instance, local_context) for process, local_context in processes]
+    if generations is None:
+        generations = jb_common.utils.base.get_cache_generations({"process:{0}".format(process.id)
+                                                                  for process, __ in processes})
+    cache_keys = []
+    for process, local_context in processes:
+        cache_key = process.get_cache_key(user_settings_hash, local_context)
         if cache_key:
-            keys_list_key = "process-keys:{0}".format(process.id)
-            with jb_common.utils.base.cache_key_locked("process-lock:{0}".format(process.id)):
-                keys = cache.get(keys_list_key, [])
-                keys.append(cache_key)
-                cache.set(keys_list_key, keys, settings.CACHES["default"].get("TIMEOUT", 300) + 10)
-                cache.set(cache_key, process_context)
-    else:
-        cached_context.update(local_context)
-        process_context = process.get_context_for_user(user, cached_context)
-    return process_context
+            cache_key = "{0}.{1}".format(cache_key, generations["process:{0}".format(process.id)])
+        cache_keys.append(cache_key)
+    cached_contexts = jb_common.utils.base.get_many_from_cache(cache_key for cache_key in cache_keys if cache_key)
+    process_contexts = []
+    new_cache_items = {}
+    for (process, local_context), cache_key in zip(processes, cache_keys):
+        # ``pop`` because the same cache item must not be personalised twice.
+        cached_context = cached_contexts.pop(cache_key, None) if cache_key else None
+        if cached_context is None:
+            process_context = process.get_context_for_user(user, local_context)
+            if cache_key:
+                new_cache_items[cache_key] = process_context
+        else:
+            cached_context.update(local_context)
+            process_context = process.get_context_for_user(user, cached_context)
+        process_contexts.append(process_context)
+    if new_cache_items:
+        cache.set_many(new_cache_items)
+    return process_contexts
 
 
 def restricted_samples_query(user):
@@ -484,8 +530,7 @@ def enforce_clearance(user, clearance_processes, destination_user, sample, clear
         clearance, __ = models.Clearance.objects.get_or_create(user=destination_user, sample=sample)
     base_query = sample.processes.filter(finished=True)
     processes = base_query if not cutoff_timestamp else base_query.filter(timestamp__lte=cutoff_timestamp)
-    for process in processes:
-        process = process.actual_instance
+    for process in models.Process.resolve_actual_instances(processes):
         if isinstance(process, models.Result) and permissions.has_permission_to_view_result_process(user, process):
             clearance.processes.add(process)
         elif isinstance(process, models.PhysicalProcess) and \
@@ -498,6 +543,134 @@ def enforce_clearance(user, clearance_processes, destination_user, sample, clear
                           split_origin.timestamp)
 
 
+class _PseudoBuffer:
+    """File-like object which returns what is written to it.  It lets a
+    ``csv.writer`` generate the lines of a streamed response.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _stream_csv(table_rows):
+    """Generates the lines of a CSV table export.
+
+    :param table_rows: the rows of the table, the headings first
+
+    :type table_rows: iterator over list of object
+
+    :return:
+      the lines of the CSV file
+
+    :rtype: iterator over str
+    """
+    writer = csv.writer(_PseudoBuffer(), dialect=csv.excel_tab)
+    for row in table_rows:
+        yield writer.writerow(row)
+
+
+def _stream_json(table_rows):
+    """Generates a JSON table export.  It is a list of dictionaries, one for
+    each row, mapping the column headings to the non-empty cells.
+
+    :param table_rows: the rows of the table, the headings first
+
+    :type table_rows: iterator over list of object
+
+    :return:
+      the chunks of the JSON document
+
+    :rtype: iterator over str
+    """
+    head_row = next(table_rows)
+    yield "["
+    for i, row in enumerate(table_rows):
+        yield ("," if i else "") + json.dumps({head_row[j]: cell for j, cell in enumerate(row) if cell},
+                                              cls=jb_common.utils.base.JSONEncoder)
+    yield "]"
+
+
+class _ChunkedBuffer(io.RawIOBase):
+    """Write-only file-like object which collects what is written to it until
+    it is taken out with `pop`.  It lets a Parquet writer generate the chunks of
+    a streamed response.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+_parquet_row_group_size = 10000
+"""Number of rows in one row group of a Parquet table export.  Only one row group
+is kept in memory while streaming the export."""
+
+
+def _get_arrow_type(value_type):
+    """Returns the Arrow type for the values of a table export column.
+
+    :param value_type: the type of the column's values, see
+        :py:meth:`samples.views.table_export.Column.get_value_type`
+
+    :type value_type: type
+
+    :return:
+      the Arrow type
+
+    :rtype: ``pyarrow.DataType``
+    """
+    if value_type is datetime.datetime:
+        return pyarrow.timestamp("us", tz="UTC" if settings.USE_TZ else None)
+    return {bool: pyarrow.bool_(), int: pyarrow.int64(), float: pyarrow.float64(), datetime.date: pyarrow.date32(),
+            str: pyarrow.string()}[value_type]
+
+
+def _stream_parquet(table_rows, value_types):
+    """Generates a Parquet table export.  In contrast to the CSV export, the
+    columns are typed, and empty cells become null values.  The rows are
+    written in row groups of `_parquet_row_group_size` rows.
+
+    :param table_rows: the rows of the table, the headings first
+    :param value_types: the types of the values in the columns, see
+        :py:meth:`samples.views.table_export.Column.get_value_type`
+
+    :type table_rows: iterator over list of object
+    :type value_types: list of type
+
+    :return:
+      the chunks of the Parquet file
+
+    :rtype: iterator over bytes
+    """
+    head_row = next(table_rows)
+    schema = pyarrow.schema([(heading, _get_arrow_type(value_type))
+                             for heading, value_type in zip(head_row, value_types)])
+    converters = [{float: float, str: str}.get(value_type, lambda value: value) for value_type in value_types]
+    buffer = _ChunkedBuffer()
+    writer = pyarrow.parquet.ParquetWriter(buffer, schema)
+    rows = list(itertools.islice(table_rows, _parquet_row_group_size))
+    while rows:
+        arrays = [pyarrow.array([None if cell is None or cell == "" else convert(cell) for cell in cells], type=field.type)
+                  for cells, convert, field in zip(zip(*rows), converters, schema)]
+        writer.write_batch(pyarrow.record_batch(arrays, schema=schema))
+        yield buffer.pop()
+        rows = list(itertools.islice(table_rows, _parquet_row_group_size))
+    writer.close()
+    yield buffer.pop()
+
+
 def table_export(request, data, label_column_heading):
     """Helper function which does almost all work needed for a CSV table
     export view.  This is not a view per se, however, it is called by views,
@@ -505,7 +678,15 @@ def table_export(request, data, label_column_heading):
     `sample.export`.
 
     This function return the data in JSON format if this is requested by the
-    ``Accept`` header field in the HTTP request.
+    ``Accept`` header field in the HTTP request.  If pyarrow is installed,
+    Parquet (``application/vnd.apache.parquet``) with typed columns can be
+    requested, too.
+
+    The final export is streamed to the client.  If the children of `data` are
+    :py:class:`~samples.data_tree.LazyChildren`, the row trees are created
+    twice, once for determining the columns and once while streaming the rows,
+    so that memory consumption doesn't grow with the number of rows.  See
+    :py:mod:`samples.views.table_export` for details.
 
     :param request: the current HTTP Request object
     :param data: the root node of the data tree
@@ -529,10 +710,20 @@ def table_export(request, data, label_column_heading):
         root_without_children.descriptive_name = None
         data.children = [root_without_children]
     get_data = request.GET if any(key.startswith("__old_data") for key in request.GET) else None
-    requested_mime_type = mimeparse.best_match({"text/csv", "application/json"}, request.META.get("HTTP_ACCEPT", "text/csv"))
-    data.find_unambiguous_names()
-    data.complete_items_in_children()
-    column_groups, columns = build_column_group_list(data)
+    mime_types = {"text/csv", "application/json"}
+    if pyarrow:
+        mime_types.add("application/vnd.apache.parquet")
+    requested_mime_type = mimeparse.best_match(mime_types, request.META.get("HTTP_ACCEPT", "text/csv"))
+    label_column = []
+    def row_trees(collect_labels=False):
+        # Lazy children yield the same rows in both passes (see
+        # ``LazyChildren``), so that every row keeps its label and its switch
+        # row form.
+        for row_tree in data.children:
+            if collect_labels:
+                label_column.append(row_tree.descriptive_name)
+            yield prepare_row_tree(row_tree)
+    column_groups, columns = build_column_group_list(row_trees(collect_labels=True))
     single_column_group = {column_groups[0].name} if len(column_groups) == 1 else set()
     table = switch_row_forms = None
     selected_column_groups = single_column_group
@@ -549,29 +740,37 @@ def table_export(request, data, label_column_heading):
         selected_column_groups = single_column_group or column_groups_form.cleaned_data["column_groups"]
         if columns_form.is_valid():
             selected_columns = columns_form.cleaned_data["columns"]
-            label_column = [row.descriptive_name for row in data.children]
-            table = generate_table_rows(flatten_tree(data), columns, columns_form.cleaned_data["columns"],
-                                        label_column, label_column_heading)
+            table_rows = generate_table_rows(row_trees(), columns, columns_form.cleaned_data["columns"],
+                                             label_column, label_column_heading)
             start_column_index = 1 if any(label_column) else 0
             if not(previous_columns) and selected_columns:
+                table = list(table_rows)
                 switch_row_forms = [SwitchRowForm(prefix=str(i), initial={"active": any(row[start_column_index:])})
                                     for i, row in enumerate(table)]
             else:
-                switch_row_forms = [SwitchRowForm(get_data, prefix=str(i)) for i in range(len(table))]
-            all_switch_row_forms_valid = all([switch_row_form.is_valid() for switch_row_form in switch_row_forms])
-            if all_switch_row_forms_valid and \
-                    previous_column_groups == selected_column_groups and previous_columns == selected_columns:
-                reduced_table = [row for i, row in enumerate(table) if switch_row_forms[i].cleaned_data["active"] or i == 0]
-                if requested_mime_type == "application/json":
-                    data = [{reduced_table[0][i]: cell for i, cell in enumerate(row) if cell} for row in reduced_table[1:]]
-                    return jb_common.utils.base.respond_in_json(data)
-                else:
-                    response = HttpResponse(content_type="text/csv; charset=utf-8")
-                    response['Content-Disposition'] = \
-                        "attachment; filename=juliabase--{0}.txt".format(django.utils.text.slugify(data.descriptive_name))
-                    writer = csv.writer(response, dialect=csv.excel_tab)
-                    writer.writerows(reduced_table)
-                return response
+                switch_row_forms = [SwitchRowForm(get_data, prefix=str(i)) for i in range(len(label_column) + 1)]
+                all_switch_row_forms_valid = all([switch_row_form.is_valid() for switch_row_form in switch_row_forms])
+                if all_switch_row_forms_valid and \
+                        previous_column_groups == selected_column_groups and previous_columns == selected_columns:
+                    reduced_table_rows = (row for i, row in enumerate(table_rows)
+                                          if switch_row_forms[i].cleaned_data["active"] or i == 0)
+                    if requested_mime_type == "application/json":
+                        return StreamingHttpResponse(_stream_json(reduced_table_rows), content_type="application/json")
+                    elif requested_mime_type == "application/vnd.apache.parquet":
+                        value_types = [str] if start_column_index else []
+                        value_types.extend(columns[i].get_value_type() for i in selected_columns)
+                        response = StreamingHttpResponse(_stream_parquet(reduced_table_rows, value_types),
+                                                         content_type="application/vnd.apache.parquet")
+                        response['Content-Disposition'] = "attachment; filename=juliabase--{0}.parquet".format(
+                            django.utils.text.slugify(data.descriptive_name))
+                        return response
+                    else:
+                        response = StreamingHttpResponse(_stream_csv(reduced_table_rows),
+                                                         content_type="text/csv; charset=utf-8")
+                        response['Content-Disposition'] = \
+                            "attachment; filename=juliabase--{0}.txt".format(django.utils.text.slugify(data.descriptive_name))
+                        return response
+                table = list(table_rows)
     if selected_column_groups != previous_column_groups:
         columns_form = ColumnsForm(column_groups, columns, selected_column_groups, initial={"columns": selected_columns})
     old_data_form = OldDataForm(initial={"column_groups": selected_column_groups, "columns": selected_columns})
@@ -22,7 +22,8 @@ samples form, whereas the mixin class doesn't do this.
 """
 
 import re
-from django.db.models import Max
+from django.db import connections
+from django.db.models import Max, Model, signals
 from django.contrib.auth.decorators import login_required
 from django.contrib.contenttypes.models import ContentType
 from django.utils.decorators import method_decorator
@@ -34,6 +35,7 @@ from django.utils.text import capfirst
 import django.forms as forms
 from django.forms.models import modelform_factory
 from django.forms.utils import ValidationError
+from django.forms.forms import NON_FIELD_ERRORS
 from jb_common.utils.base import camel_case_to_underscores, is_json_requested, format_enumeration, int_or_zero
 from samples import permissions
 from . import forms as utils
@@ -295,13 +297,40 @@ class ProcessWithoutSamplesView(TemplateView):
 
         :rtype: ``django.http.HttpResponse``
         """
-        Reporter(request.user).report_physical_process(
-            self.process, self.forms["edit_description"].cleaned_data if self.forms["edit_description"] else None)
+        self.report_process()
         success_report = _("{process} was successfully changed in the database."). \
             format(process=self.process) if self.id else \
             _("{process} was successfully added to the database.").format(process=self.process)
         return successful_response(request, success_report, json_response=self.process.pk)
 
+    def report_process(self):
+        """Reports the saved process to the feeds of all interested users.
+        """
+        Reporter(self.request.user).report_physical_process(
+            self.process, self.forms["edit_description"].cleaned_data if self.forms["edit_description"] else None)
+
+    def get_error_message(self):
+        """Collects the errors of all forms into one string.  This is used for
+        clients which don't get the re-rendered HTML form, see
+        :py:func:`samples.views.json_client.bulk_add`.
+
+        :Return:
+          all form errors, each one prefixed with the HTML name of its field
+
+        :rtype: str
+        """
+        messages = []
+        def collect_errors(forms):
+            for form in forms:
+                if isinstance(form, (list, tuple)):
+                    collect_errors(form)
+                elif form is not None and form.is_bound:
+                    for field_name, errors in form.errors.items():
+                        name = form.add_prefix(field_name) if field_name != NON_FIELD_ERRORS else form.prefix
+                        messages.append("{}: {}".format(name, " ".join(errors)) if name else " ".join(errors))
+        collect_errors(self.forms.values())
+        return "; ".join(messages)
+
     def get_title(self):
         """Creates the title of the response.  This is used in the ``<title>``
         tag and the ``<h1>`` tag at the top of the page.
@@ -545,6 +574,12 @@ class SubprocessesMixin(ProcessWithoutSamplesView):
 
     in the template so that the user can set the number of subprocesses.
 
+    If the subprocess model has no many-to-many fields and no parent models,
+    and doesn't override ``save()``, the subprocesses are inserted with one
+    ``bulk_create``.  The ``pre_save`` and ``post_save`` signals are still
+    sent for every subprocess, before and after the insertion, respectively.
+    Otherwise, the subprocesses are saved one by one.
+
     This mixin must come before the main view class in the list of parents.
     """
 
@@ -593,11 +628,26 @@ class SubprocessesMixin(ProcessWithoutSamplesView):
     def save_to_database(self):
         process = super().save_to_database()
         getattr(process, self.subprocess_field).all().delete()
+        subprocesses = []
         for form in self.forms["subprocesses"]:
             subprocess = form.save(commit=False)
             setattr(subprocess, self.process_field, process)
-            subprocess.save()
-            form.save_m2m()
+            subprocesses.append(subprocess)
+        database = self.sub_model.objects.db
+        if self.sub_model._meta.many_to_many or self.sub_model._meta.parents or \
+           self.sub_model.save is not Model.save or \
+           not connections[database].features.can_return_rows_from_bulk_insert:
+            for form, subprocess in zip(self.forms["subprocesses"], subprocesses):
+                subprocess.save()
+                form.save_m2m()
+        else:
+            for subprocess in subprocesses:
+                signals.pre_save.send(self.sub_model, instance=subprocess, raw=False, using=database,
+                                      update_fields=None)
+            self.sub_model.objects.bulk_create(subprocesses)
+            for subprocess in subprocesses:
+                signals.post_save.send(self.sub_model, instance=subprocess, created=True, update_fields=None,
+                                       raw=False, using=database)
         return process
 
 
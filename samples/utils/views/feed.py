@@ -19,6 +19,8 @@
 the database was changed in one way or another.
 """
 
+import uuid
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 import jb_common.models
 from samples import models, permissions
@@ -50,6 +52,13 @@ class Reporter:
     on which feed entries they already have received, just create a new
     instance of ``Reporter``.
 
+    If the setting ``FEED_FAN_OUT_ON_READ`` is ``True``, the recipients are not
+    determined here.  Instead, the entries are stored with their audiences
+    (watchers of samples, members of topics etc.), and the feed view
+    determines the entries of a user when the feed is read.  The rule that no
+    user gets two entries from one ``Reporter`` is then applied by the feed
+    view, too.
+
     Mostly, you can call the method directly without binding the instance of
     ``Reporter`` to a name, as in::
 
@@ -66,9 +75,17 @@ class Reporter:
     :ivar originator: the user responsible for the databse change reported by
       the feed entry of this instance of ``Reporter``.
 
+    :ivar audiences: the audiences of the next generated feed entry if
+      ``FEED_FAN_OUT_ON_READ`` is ``True``; the field `entry` is not yet set
+
+    :ivar report: the ID shared by all feed entries of this instance of
+      ``Reporter`` if ``FEED_FAN_OUT_ON_READ`` is ``True``
+
     :type interested_users: set of django.contrib.auth.models.User
     :type already_informed_users: set of django.contrib.auth.models.User
     :type originator: django.contrib.auth.models.User
+    :type audiences: list of `samples.models.FeedAudience`
+    :type report: uuid.UUID
     """
 
     def __init__(self, originator):
@@ -82,6 +99,8 @@ class Reporter:
         self.interested_users = set()
         self.already_informed_users = set()
         self.originator = originator
+        self.audiences = []
+        self.report = uuid.uuid4()
 
     def __connect_with_users(self, entry, sending_model=None):
         """Take an already generated feed entry and set its recipients to all
@@ -99,6 +118,18 @@ class Reporter:
         :type entry: `samples.models.FeedEntry`
         :type sending_model: class, descendant of ``models.Model``
         """
+        if settings.FEED_FAN_OUT_ON_READ:
+            models.FeedEntry.objects.filter(pk=entry.pk).update(
+                report=self.report, sending_model=ContentType.objects.get_for_model(sending_model) if sending_model else None)
+            self.audiences.extend(models.FeedAudience(user=user) for user in self.interested_users)
+            if self.audiences:
+                for audience in self.audiences:
+                    audience.entry, audience.timestamp = entry, entry.timestamp
+                models.FeedAudience.objects.bulk_create(self.audiences)
+            else:
+                entry.delete()
+            self.interested_users, self.audiences = set(), []
+            return
         self.interested_users -= self.already_informed_users
         if sending_model:
             self.interested_users &= {user_details.user for user_details in
@@ -124,11 +155,33 @@ class Reporter:
         :type samples: list of `samples.models.Sample`
         :type important: bool
         """
+        if settings.FEED_FAN_OUT_ON_READ:
+            self.audiences.extend(models.FeedAudience(sample=sample, important=important) for sample in samples)
+        else:
+            self.interested_users.update(self.__get_watchers(samples, important))
+
+    def __get_watchers(self, samples, important=True):
+        """
+        :param samples: the samples involved in the database change
+        :param important: whether the news is marked as being important;
+            defaults to ``True``
+
+        :type samples: list of `samples.models.Sample`
+        :type important: bool
+
+        :return:
+          all users that have one of ``samples`` on their “My Samples” list,
+          may fully view it, and want to get news of this level of importance
+
+        :rtype: set of django.contrib.auth.models.User
+        """
+        watchers = set()
         for sample in samples:
             for user in sample.watchers.all():
                 if (important or not user.samples_user_details.only_important_news) and \
                         permissions.has_permission_to_fully_view_sample(user, sample):
-                    self.interested_users.add(user)
+                    watchers.add(user)
+        return watchers
 
     def __add_watchers(self, process_or_sample_series, important=True):
         """Add users interested in news about the given process or sample
@@ -160,8 +213,25 @@ class Reporter:
 
         :type topic: `jb_common.models.Topic`
         """
-        self.interested_users.update(user for user in topic.members.iterator()
-                                     if not user.samples_user_details.only_important_news)
+        if settings.FEED_FAN_OUT_ON_READ:
+            self.audiences.append(models.FeedAudience(topic=topic, important=False))
+        else:
+            self.interested_users.update(user for user in topic.members.iterator()
+                                         if not user.samples_user_details.only_important_news)
+
+    def __add_subscribers(self, process_class):
+        """Add all users who subscribed to news about the given process class to
+        the set of users connected with the next generated feed entry by
+        `__connect_with_users`.
+
+        :param process_class: the content type of the physical process
+
+        :type process_class: django.contrib.contenttypes.models.ContentType
+        """
+        if settings.FEED_FAN_OUT_ON_READ:
+            self.audiences.append(models.FeedAudience(process_class=process_class))
+        else:
+            self.interested_users.update(user_details.user for user_details in process_class.subscribed_users.all())
 
     def __get_subscribers(self, sample_series):
         """
@@ -174,16 +244,9 @@ class Reporter:
           all user who watch a sample in this sample series, and therefore, the
           sample series itself, too
 
-        :rtype: list of `models.UserDetails`
+        :rtype: set of django.contrib.auth.models.User
         """
-        # This is a hack but I think it's okay.  I save
-        # ``self.interested_users``, fill it with the subscribers, and restore
-        # the old value for ``self.interested_users`` again.
-        interested_users = self.interested_users
-        self.__add_watchers(sample_series)
-        subscribers = self.interested_users
-        self.interested_users = interested_users
-        return subscribers
+        return self.__get_watchers(sample_series.samples.all())
 
     def report_new_samples(self, samples):
         """Generate one feed entry for new samples.  If more than one sample
@@ -511,7 +574,8 @@ class Reporter:
         """
         entry = models.FeedStatusMessage.objects.create(originator=self.originator, process_class=process_class,
                                                         status=status_message)
-        self.interested_users = {user_details.user for user_details in process_class.subscribed_users.all()}
+        self.interested_users = set()
+        self.__add_subscribers(process_class)
         self.__connect_with_users(entry)
 
     def report_withdrawn_status_message(self, process_class, status_message):
@@ -527,7 +591,8 @@ class Reporter:
         """
         entry = models.FeedWithdrawnStatusMessage.objects.create(
             originator=self.originator, process_class=process_class, status=status_message)
-        self.interested_users = {user_details.user for user_details in process_class.subscribed_users.all()}
+        self.interested_users = set()
+        self.__add_subscribers(process_class)
         self.__connect_with_users(entry)
 
     def report_task(self, task, edit_description=None):
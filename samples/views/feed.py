@@ -18,17 +18,21 @@
 """Generating an Atom 1.0 feed with the user's news.
 """
 
-import datetime, time
+import datetime, time, urllib.parse, heapq, itertools, functools, operator, hashlib
 import xml.etree.ElementTree as ElementTree
 import django.contrib.auth.models
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import Q
 from django.template import loader
-from django.http import HttpResponse
+from django.http import HttpResponse, Http404
 from django.shortcuts import get_object_or_404
-from django.utils.translation import gettext_lazy as _, gettext
+from django.utils.translation import gettext_lazy as _, gettext, get_language
 from django.views.decorators.cache import cache_page
 from django.conf import settings
 import django.urls
-from jb_common.utils.base import get_really_full_name, camel_case_to_underscores
+from jb_common.utils.base import get_really_full_name, camel_case_to_underscores, get_many_from_cache, \
+    get_cache_generations
 from jb_common import __version__
 from samples import permissions, models
 import samples.utils.views as utils
@@ -118,9 +122,268 @@ def format_timestamp(timestamp):
     return timestamp.strftime("%Y-%m-%dT%H:%M:%S") + get_timezone_string(timestamp)
 
 
+entries_per_page = 50
+"""Maximal number of entries in one page of the feed.  Older entries are found
+by following the ``rel="next"`` link of the feed (:RFC:`5005`).
+"""
+
+audience_chunk_size = 200
+"""Number of audiences read at once from each stream if
+``FEED_FAN_OUT_ON_READ`` is ``True``.
+"""
+
+orphan_prone_entry_classes = (models.FeedNewSamples, models.FeedMovedSamples, models.FeedCopiedMySamples,
+                              models.FeedEditedSamples)
+"""Feed entry classes which are orphaned, i.e. phony, if all of their samples
+have been deleted.  Such entries are skipped in the feed, and removed by
+:py:func:`samples.signals.delete_orphaned_feed_entries`, which must be kept in
+sync with this tuple.
+"""
+
+
+def get_feed_entries(user, number, before=None):
+    """Returns the newest feed entries of a user.
+
+    :param user: the user fetching the feed
+    :param number: the maximal number of entries to return
+    :param before: the timestamp and ID of the last entry of the previous
+        page; only older entries are returned
+
+    :type user: django.contrib.auth.models.User
+    :type number: int
+    :type before: (datetime.datetime, int) or NoneType
+
+    :return:
+      the feed entries, newest first; they are not the actual instances
+
+    :rtype: list of `samples.models.FeedEntry`
+    """
+    if settings.FEED_FAN_OUT_ON_READ:
+        return get_entries_fanned_out_on_read(user, number, before)
+    entries = user.feed_entries.select_related("originator").order_by("-timestamp", "-id")
+    if user.samples_user_details.only_important_news:
+        entries = entries.filter(important=True)
+    if before:
+        timestamp, id_ = before
+        entries = entries.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=id_))
+    return list(entries[:number])
+
+
+def _get_audience_conditions(user):
+    """Returns the conditions for the audiences of all feed entries the user may
+    be interested in.
+
+    :param user: the user fetching the feed
+
+    :type user: django.contrib.auth.models.User
+
+    :return:
+      one condition for each kind of audience, i.e. the watched samples, the
+      topics, the subscribed process classes, and the user themselves; and the
+      condition which all audiences must fulfil
+
+    :rtype: list of ``Q``, ``Q``
+    """
+    user_details = user.samples_user_details
+    conditions = [Q(sample__in=user.my_samples.values("pk")),
+                  Q(process_class__in=user_details.subscribed_feeds.values("pk")),
+                  Q(user=user)]
+    if user_details.only_important_news:
+        return conditions, Q(important=True)
+    else:
+        conditions.append(Q(topic__in=user.topics.values("pk")))
+        return conditions, Q()
+
+
+def _get_audience_streams(user, before):
+    """Returns the audiences of all feed entries the user may be interested in,
+    newest first.  There is one stream for each kind of audience, i.e. the
+    watched samples, the topics, the subscribed process classes, and the user
+    themselves.  Every stream is read from its index in chunks.
+
+    :param user: the user fetching the feed
+    :param before: the timestamp and ID of the last entry of the previous page
+
+    :type user: django.contrib.auth.models.User
+    :type before: (datetime.datetime, int) or NoneType
+
+    :return:
+      the streams of the audiences; each audience is a tuple of timestamp,
+      entry ID, and sample ID
+
+    :rtype: list of iterator over (datetime.datetime, int, int or NoneType)
+    """
+    conditions, common_condition = _get_audience_conditions(user)
+    def stream(condition):
+        query = models.FeedAudience.objects.filter(condition, common_condition).order_by("-timestamp", "-entry"). \
+            values_list("timestamp", "entry", "sample")
+        last_audience = before
+        while True:
+            chunk_query = query
+            if last_audience:
+                timestamp, id_ = last_audience[:2]
+                chunk_query = query.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, entry__lt=id_))
+            chunk = list(chunk_query[:audience_chunk_size])
+            yield from chunk
+            if len(chunk) < audience_chunk_size:
+                break
+            last_audience = chunk[-1]
+    return [stream(condition) for condition in conditions]
+
+
+def _get_visible_entries(user, audiences):
+    """Returns the feed entries of the given audiences which are actually meant
+    for the user.  Audiences of samples which the user may not fully view are
+    ignored, the user's own entries are skipped, and so are entries of models
+    the user has not subscribed to.
+
+    :param user: the user fetching the feed
+    :param audiences: the audiences as returned by `_get_audience_streams`
+
+    :type user: django.contrib.auth.models.User
+    :type audiences: list of (datetime.datetime, int, int or NoneType)
+
+    :return:
+      the visible entries, in the order of the audiences
+
+    :rtype: list of `samples.models.FeedEntry`
+    """
+    samples = models.Sample.objects.select_related("topic", "currently_responsible_person"). \
+        in_bulk({sample_id for __, __, sample_id in audiences if sample_id is not None})
+    visible_sample_ids = {sample_id for sample_id, sample in samples.items()
+                          if permissions.has_permission_to_fully_view_sample(user, sample)}
+    entry_ids = list(dict.fromkeys(entry_id for __, entry_id, sample_id in audiences
+                                   if sample_id is None or sample_id in visible_sample_ids))
+    entries = models.FeedEntry.objects.select_related("originator").in_bulk(entry_ids)
+    subscribed_feeds = set(user.samples_user_details.subscribed_feeds.values_list("pk", flat=True))
+    return [entries[entry_id] for entry_id in entry_ids if entries[entry_id].originator != user and
+            (entries[entry_id].sending_model_id is None or entries[entry_id].sending_model_id in subscribed_feeds)]
+
+
+def get_entries_fanned_out_on_read(user, number, before=None):
+    """Returns the newest feed entries of a user if ``FEED_FAN_OUT_ON_READ`` is
+    ``True``.  The audience streams of the user are merged by timestamp, and
+    the entries are filtered in batches until there are enough of them.  Of the
+    entries of one report (see `samples.models.FeedEntry.report`), only the
+    first one visible to the user is returned.
+
+    For the parameters and the return value, see `get_feed_entries`.
+    """
+    audiences = heapq.merge(*_get_audience_streams(user, before), key=lambda audience: audience[:2], reverse=True)
+    conditions, common_condition = _get_audience_conditions(user)
+    entries, visible_entry_ids, shown_reports = [], set(), set()
+    while len(entries) < number:
+        batch = list(itertools.islice(audiences, 2 * number))
+        if not batch:
+            break
+        visible_entries = [entry for entry in _get_visible_entries(user, batch) if entry.id not in visible_entry_ids]
+        visible_entry_ids.update(entry.id for entry in visible_entries)
+        reports = {entry.report for entry in visible_entries} - shown_reports - {None}
+        first_entries = {}
+        if reports:
+            report_audiences = models.FeedAudience.objects.filter(
+                functools.reduce(operator.or_, conditions), common_condition, entry__report__in=reports). \
+                values_list("timestamp", "entry", "sample")
+            for entry in _get_visible_entries(user, report_audiences):
+                if entry.report not in first_entries or entry.id < first_entries[entry.report].id:
+                    first_entries[entry.report] = entry
+        for entry in visible_entries:
+            if entry.report:
+                if entry.report in shown_reports:
+                    continue
+                shown_reports.add(entry.report)
+                entry = first_entries[entry.report]
+            entries.append(entry)
+            if len(entries) == number:
+                break
+    return entries
+
+
+def get_entry_cache_keys(entries, user):
+    """Returns the cache keys of the rendered feed entries.  Feed entries never
+    change, so a key contains the SHA-1 hash of the entry and the language,
+    and, for entries with `user_dependent_content`, the user.  If the entry
+    shows objects which may change, the key also contains a hash of their
+    cache generations, see
+    :py:meth:`samples.models.FeedEntry.get_content_generation_names`.
+
+    :param entries: the feed entries; they need not be the actual instances
+    :param user: the user fetching the feed
+
+    :type entries: list of `samples.models.FeedEntry`
+    :type user: django.contrib.auth.models.User
+
+    :return:
+      the cache keys of the entries
+
+    :rtype: dict mapping int to str
+    """
+    entry_ids_by_class = {}
+    for entry in entries:
+        entry_class = ContentType.objects.get_for_id(entry.content_type_id).model_class()
+        entry_ids_by_class.setdefault(entry_class, []).append(entry.id)
+    generation_names = {}
+    for entry_class, entry_ids in entry_ids_by_class.items():
+        generation_names.update(entry_class.get_content_generation_names(entry_ids))
+    generations = get_cache_generations(set(itertools.chain.from_iterable(generation_names.values())))
+    cache_keys = {}
+    for entry in entries:
+        cache_key = "feed-entry:{}:{}".format(entry.sha1_hash, get_language())
+        if ContentType.objects.get_for_id(entry.content_type_id).model_class().user_dependent_content:
+            cache_key += ":{}".format(user.pk)
+        if entry.id in generation_names:
+            hash_ = hashlib.sha1(";".join(str(generations[name]) for name in generation_names[entry.id]).encode())
+            cache_key += ":" + hash_.hexdigest()[:10]
+        cache_keys[entry.id] = cache_key
+    return cache_keys
+
+
+def render_entries(entries, user):
+    """Returns metadata and rendered content of the given feed entries.  They
+    are taken from the cache if possible.  For all others, the actual
+    instances are resolved in bulk.  Orphaned entries are skipped.
+
+    :param entries: the feed entries; they need not be the actual instances
+    :param user: the user fetching the feed
+
+    :type entries: list of `samples.models.FeedEntry`
+    :type user: django.contrib.auth.models.User
+
+    :return:
+      the entries with the metadata as returned by
+      :py:meth:`samples.models.FeedEntry.get_metadata` and the content as an
+      HTML string
+
+    :rtype: list of (`samples.models.FeedEntry`, dict mapping str to str, str)
+    """
+    cache_keys = get_entry_cache_keys(entries, user)
+    rendered_entries = get_many_from_cache(cache_keys.values())
+    missing_entries = models.FeedEntry.resolve_actual_instances(
+        entry for entry in entries if cache_keys[entry.id] not in rendered_entries)
+    orphaned_entry_ids = set()
+    for entry_class in orphan_prone_entry_classes:
+        entry_ids = {entry.id for entry in missing_entries if isinstance(entry, entry_class)}
+        if entry_ids:
+            orphaned_entry_ids |= entry_ids - set(entry_class.objects.filter(id__in=entry_ids, samples__isnull=False).
+                                                  values_list("id", flat=True))
+    new_rendered_entries = {}
+    for entry in missing_entries:
+        if entry.id in orphaned_entry_ids:
+            continue
+        metadata = {key: str(value) for key, value in entry.get_metadata().items()}
+        template = loader.get_template("samples/" + camel_case_to_underscores(entry.__class__.__name__) + ".html")
+        context_dict = {"entry": entry}
+        context_dict.update(entry.get_additional_template_context(user))
+        new_rendered_entries[cache_keys[entry.id]] = metadata, template.render(context_dict)
+    cache.set_many(new_rendered_entries)
+    rendered_entries.update(new_rendered_entries)
+    return [(entry,) + rendered_entries[cache_keys[entry.id]] for entry in entries
+            if cache_keys[entry.id] in rendered_entries]
+
+
 @cache_page(600)
 def show(request, username, user_hash):
-    """View which doesn't generate an HTML page but an Atom 1.0 feed with
+    """View which doesn't generate an HTML page but an Atom 1.0 feed with
     current news for the user.
 
     The problem we have to deal with here is that the feed-reading program
@@ -130,6 +393,10 @@ def show(request, username, user_hash):
     to the URL in the query string.  This should be enough security for this
     purpose.
 
+    The feed contains the newest `entries_per_page` entries.  Older entries
+    are paginated by the query string parameter ``before``, which contains
+    the timestamp and the ID of the last entry of the previous page.
+
     :param request: the current HTTP Request object
     :param username: the login name of the user for which the news should be
         delivered
@@ -149,12 +416,21 @@ def show(request, username, user_hash):
     permissions.assert_can_view_feed(user_hash, user)
     feed_absolute_url = request.build_absolute_uri(django.urls.reverse(
         "samples:show_feed", kwargs={"username": username, "user_hash": user_hash}))
+    before = None
+    if "before" in request.GET:
+        timestamp, __, id_ = request.GET["before"].rpartition(",")
+        try:
+            before = datetime.datetime.fromisoformat(timestamp), int(id_)
+        except ValueError:
+            raise Http404("Invalid “before” parameter.")
+    entries = get_feed_entries(user, entries_per_page + 1, before)
+    next_page_entry = entries[entries_per_page - 1] if len(entries) > entries_per_page else None
+    entries = entries[:entries_per_page]
     feed = ElementTree.Element("feed", xmlns="http://www.w3.org/2005/Atom")
     feed.attrib["xml:base"] = request.build_absolute_uri("/")
     ElementTree.SubElement(feed, "id").text = feed_absolute_url
     ElementTree.SubElement(feed, "title").text = \
         _("JuliaBase news for {user_name}").format(user_name=get_really_full_name(user))
-    entries = [entry.actual_instance for entry in user.feed_entries.all()]
     if entries:
         ElementTree.SubElement(feed, "updated").text = format_timestamp(entries[0].timestamp)
     else:
@@ -163,24 +439,16 @@ def show(request, username, user_hash):
     if settings.ADMINS:
         ElementTree.SubElement(author, "name").text, ElementTree.SubElement(author, "email").text = settings.ADMINS[0]
     ElementTree.SubElement(feed, "link", rel="self", href=feed_absolute_url)
+    if next_page_entry:
+        ElementTree.SubElement(feed, "link", rel="next", href=feed_absolute_url + "?" + urllib.parse.urlencode(
+            {"before": "{},{}".format(next_page_entry.timestamp.isoformat(), next_page_entry.id)}))
     ElementTree.SubElement(feed, "generator", version=__version__).text = "JuliaBase"
     ElementTree.SubElement(feed, "icon").text = request.build_absolute_uri("/static/juliabase/juliabase_logo.png")
-    only_important = user.samples_user_details.only_important_news
-    for entry in entries:
-        if only_important and not entry.important:
-            continue
-        if isinstance(entry, (models.FeedNewSamples, models.FeedMovedSamples, models.FeedCopiedMySamples,
-                              models.FeedEditedSamples)):
-            # Remove orphaned entries (i.e. whose samples have been deleted)
-            # because they are a) phony and b) cause tracebacks.
-            if entry.samples.count() == 0:
-                entry.delete()
-                continue
+    for entry, metadata, content in render_entries(entries, user):
         entry_element = ElementTree.SubElement(feed, "entry")
         ElementTree.SubElement(entry_element, "id").text = \
             "tag:{0},{1}:{2}".format(request.build_absolute_uri("/").partition("//")[2][:-1],
                                      entry.timestamp.strftime("%Y-%m-%d"), entry.sha1_hash)
-        metadata = entry.get_metadata()
         ElementTree.SubElement(entry_element, "title").text = metadata["title"]
         ElementTree.SubElement(entry_element, "updated").text = format_timestamp(entry.timestamp)
         author = ElementTree.SubElement(entry_element, "author")
@@ -191,12 +459,9 @@ def show(request, username, user_hash):
             entry_element, "category", term=metadata["category term"], label=metadata["category label"])
         if "link" in metadata:
             ElementTree.SubElement(entry_element, "link", rel="alternate", href=request.build_absolute_uri(metadata["link"]))
-        template = loader.get_template("samples/" + camel_case_to_underscores(entry.__class__.__name__) + ".html")
-        content = ElementTree.SubElement(entry_element, "content")
-        context_dict = {"entry": entry}
-        context_dict.update(entry.get_additional_template_context(user))
-        content.text = template.render(context_dict)
-        content.attrib["type"] = "html"
+        content_element = ElementTree.SubElement(entry_element, "content")
+        content_element.text = content
+        content_element.attrib["type"] = "html"
 #    indent(feed)
     return HttpResponse("""<?xml version="1.0"?>\n"""
                         """<?xml-stylesheet type="text/xsl" href="/static/samples/xslt/atom2html.xslt"?>\n"""
@@ -21,11 +21,13 @@ directly, it is not really useful what they get there.  Note that the whole
 communication to the remote client happens in JSON format.
 """
 
-import sys, copy
-from django.db.utils import IntegrityError
+import sys, copy, json
+from django.db import transaction
+from django.db.utils import IntegrityError, DatabaseError
 from django.db.models import Q
 from django.conf import settings
-from django.http import Http404
+from django.http import Http404, QueryDict
+from django.utils.datastructures import MultiValueDict
 from django.utils.translation import gettext as _
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
@@ -370,6 +372,87 @@ def change_my_samples(request):
     return respond_in_json(changed_sample_ids)
 
 
+def _build_form_data(item):
+    """Converts one item of a bulk import into the POST data that the add view
+    of the process would get in a single submission.
+
+    :param item: the JSON object of one process
+
+    :type item: dict mapping str to object
+
+    :return:
+      the POST data
+
+    :rtype: QueryDict
+    """
+    data = QueryDict(mutable=True)
+    for key, value in item.items():
+        values = value if isinstance(value, list) else [value]
+        data.setlist(key, [str(single_value) for single_value in values if single_value is not None])
+    return data
+
+
+@login_required
+@never_cache
+@require_http_methods(["POST"])
+@ensure_csrf_cookie
+def bulk_add(request, view_class, **kwargs):
+    """Adds many processes of one class at once.  The URL is generated by
+    :py:class:`samples.utils.urls.PatternGenerator` next to the add view of the
+    process class.  Every item is validated by the forms of the process' add
+    view, exactly as in a single submission.  All valid items are saved in one
+    transaction, each one in a savepoint of its own together with its feed
+    entries, so that an item which violates a database constraint fails
+    alone.
+
+    :param request: The current HTTP Request object.  Its body is a JSON array
+        of objects, each containing the POST data of one new process.
+    :param view_class: the class-based add/edit view of the process class
+    :param kwargs: the keyword arguments of the URL pattern of the add view
+
+    :type request: HttpRequest
+    :type view_class: ``class`` (derived from
+      `samples.utils.views.ProcessView`)
+    :type kwargs: dict
+
+    :return:
+      A list with one entry per item, in the same order.  It is the ID of the
+      new process, or a :samp:`({error code}, {error message})` pair if the
+      item could not be added.
+
+    :rtype: HttpResponse
+    """
+    try:
+        items = json.loads(request.body)
+    except ValueError:
+        raise JSONRequestException(5, "The request body is not valid JSON.")
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise JSONRequestException(5, "The request body must be a JSON array of objects.")
+    results = len(items) * [None]
+    views = []
+    for i, item in enumerate(items):
+        item_request = copy.copy(request)
+        item_request.POST = _build_form_data(item)
+        item_request._files = MultiValueDict()
+        view = view_class()
+        view.setup(item_request, **kwargs)
+        if view.is_all_valid() and view.is_referentially_valid():
+            views.append((i, view))
+        else:
+            results[i] = (1, view.get_error_message())
+    with transaction.atomic():
+        for i, view in views:
+            try:
+                with transaction.atomic():
+                    view.process = view.save_to_database()
+                    view.report_process()
+            except DatabaseError as error:
+                results[i] = (5, str(error))
+            else:
+                results[i] = view.process.pk
+    return respond_in_json(results)
+
+
 def _is_folded(process_id, folded_process_classes, exceptional_processes, switch):
     """Helper routine to determine whether the process is folded or not. Is the switch
     parameter is ``True``, the new status is saved.
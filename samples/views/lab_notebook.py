@@ -23,19 +23,29 @@ methods of physical process models, and the layout work is done in the
 Furthermore, if you'd like to add a lab notebook function, you must add its URL
 explicitly to ``urls.py``.  See :py:mod:`samples.utils.urls` for further
 information.
+
+The rendered months are cached for all users.  Therefore, the templates are
+rendered without ``request`` and ``user`` in their context, and they must not
+depend on who is looking at them.  A cached month is only made obsolete if a
+process in it is saved or deleted, see
+:py:meth:`samples.models.Process.touch_lab_notebooks`.  So if you change
+things which are shown in the lab notebook without saving the process, e.g.
+layers of a deposition or the name of a sample mentioned in its comments, the
+lab notebook shows the old data until one of its processes is saved again.
 """
 
 import datetime, re
 from urllib.parse import quote_plus
-from django.http import Http404, HttpResponse
+from django.http import Http404, HttpResponseBase
 from django.shortcuts import render
 import django.urls
-from django.template import loader, RequestContext
+from django.template import loader
 import django.forms as forms
-from django.utils.translation import gettext_lazy as _, gettext
+from django.utils.translation import gettext_lazy as _, gettext, get_language
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from jb_common.utils.base import help_link, HttpResponseSeeOther, get_all_models, camel_case_to_underscores, \
-    capitalize_first_letter
+    capitalize_first_letter, get_cache_generations, get_from_cache
 from samples import permissions
 import samples.utils.views as utils
 
@@ -129,6 +139,10 @@ def show(request, process_name, year_and_month):
     physical process.  In ``urls.py``, you must give the entry for this view
     the name ``"lab_notebook_<camel_case_process_name>"``.
 
+    The rendered month is cached for every language, and shared by all users.
+    It is made obsolete by
+    :py:meth:`samples.models.Process.touch_lab_notebooks`.
+
     :param request: the current HTTP Request object
     :param process_name: the class name of the model of the physical process,
         e.g. ``"LargeAreaDeposition"``
@@ -150,7 +164,7 @@ def show(request, process_name, year_and_month):
     permissions.assert_can_view_lab_notebook(request.user, process_class)
     if not year_and_month:
         try:
-            timestamp = process_class.objects.latest().timestamp
+            timestamp = process_class.objects.filter(content_type__in=process_class.get_content_types()).latest().timestamp
         except process_class.DoesNotExist:
             timestamp = datetime.datetime.today()
         return HttpResponseSeeOther("{0}/{1}".format(timestamp.year, timestamp.month))
@@ -163,10 +177,14 @@ def show(request, process_name, year_and_month):
                 kwargs={"year_and_month": "{year}/{month}".format(**year_month_form.cleaned_data)}))
     else:
         year_month_form = YearMonthForm(initial={"year": year, "month": month})
-    template = loader.get_template("samples/lab_notebook_" + process_name + ".html")
-    template_context = RequestContext(request, process_class.get_lab_notebook_context(year, month))
-    template_context["request"] = request
-    html_body = template.render(template_context.flatten())
+    generation_name = process_class.get_lab_notebook_generation_name(year, month)
+    generation = get_cache_generations([generation_name])[generation_name]
+    cache_key = "{0}:{1}:{2}".format(generation_name, get_language(), generation)
+    html_body = get_from_cache(cache_key)
+    if html_body is None:
+        template = loader.get_template("samples/lab_notebook_" + process_name + ".html")
+        html_body = template.render(process_class.get_lab_notebook_context(year, month))
+        cache.set(cache_key, html_body)
     previous_url, next_url = get_previous_next_urls(process_name, namespace, year, month)
     try:
         export_url = django.urls.reverse(
@@ -211,7 +229,7 @@ def export(request, process_name, year_and_month):
     result = utils.table_export(request, data, _("process"))
     if isinstance(result, tuple):
         column_groups_form, columns_form, table, switch_row_forms, old_data_form = result
-    elif isinstance(result, HttpResponse):
+    elif isinstance(result, HttpResponseBase):
         return result
     title = _("Table export for “{name}”").format(name=data.descriptive_name)
     return render(request, "samples/table_export.html", {"title": title, "column_groups": column_groups_form,
@@ -21,7 +21,7 @@ better place to be (yet).
 
 from django.shortcuts import render, get_object_or_404
 from samples import models, permissions
-from django.http import HttpResponsePermanentRedirect, Http404
+from django.http import HttpResponsePermanentRedirect, HttpResponseBase, Http404
 from django.views.decorators.http import require_http_methods
 import django.urls
 import django.forms as forms
@@ -324,7 +324,7 @@ def export_process(request, process_id):
     result = utils.table_export(request, data, _("sample"))
     if isinstance(result, tuple):
         column_groups_form, columns_form, table, switch_row_forms, old_data_form = result
-    elif isinstance(result, HttpResponse):
+    elif isinstance(result, HttpResponseBase):
         return result
     title = _("Table export for “{name}”").format(name=data.descriptive_name)
     return render(request, "samples/table_export.html", {"title": title, "column_groups": column_groups_form,
@@ -18,49 +18,59 @@
 """View for showing a plot as a PDF file.
 """
 
-import os.path, mimetypes
-from io import BytesIO
 from functools import partial
-from matplotlib.backends.backend_agg import FigureCanvasAgg
-from matplotlib.figure import Figure
-from django.shortcuts import get_object_or_404
-from django.http import Http404
+from django.shortcuts import get_object_or_404, render
+from django.http import Http404, HttpResponse
 from django.contrib.auth.decorators import login_required
-from django.conf import settings
-from jb_common.utils.base import get_cached_bytes_stream, static_response
+from django.utils.cache import add_never_cache_headers
+from jb_common.utils.base import get_cached_bytes_stream, static_response, blob_response
 from samples import models, permissions
 import samples.utils.views as utils
 from samples.utils.plots import PlotError
+from samples.utils.plot_rendering import render_plot, get_plot_artefact_path, \
+    plot_artefact_exists, get_plot_error, schedule_plot_rendering
+
+
+placeholder_thumbnail = """<?xml version="1.0" encoding="utf-8"?>
+<svg xmlns="http://www.w3.org/2000/svg" width="302.4pt" height="226.8pt" viewBox="0 0 302.4 226.8">
+  <rect x="0" y="0" width="302.4" height="226.8" fill="#f5f5f5"/>
+  <text x="151.2" y="113.4" text-anchor="middle" font-family="sans-serif" font-size="14" fill="#888">…</text>
+</svg>
+"""
 
 
 def generate_plot(process, plot_id, thumbnail, datafile_name):
     try:
-        output = BytesIO()
-        if thumbnail:
-            figure = Figure(frameon=False, figsize=(4.2, 3.15))
-            canvas = FigureCanvasAgg(figure)
-            axes = figure.add_subplot(111)
-            axes.set_position((0.17, 0.16, 0.78, 0.78))
-            axes.grid(True)
-            process.draw_plot(axes, plot_id, datafile_name, for_thumbnail=True)
-            canvas.print_figure(output, format="svg")
-        else:
-            figure = Figure()
-            canvas = FigureCanvasAgg(figure)
-            axes = figure.add_subplot(111)
-            axes.grid(True)
-            axes.set_title(str(process))
-            process.draw_plot(axes, plot_id, datafile_name, for_thumbnail=False)
-            # FixMe: Activate this line with Matplotlib 1.1.0.
-#                figure.tight_layout()
-            canvas.print_figure(output, format="pdf")
+        return render_plot(process, plot_id, thumbnail, datafile_name)
     except PlotError as e:
         raise Http404(str(e) or "Plot could not be generated.")
-    except ValueError as e:
-        raise Http404("Plot could not be generated: " + e.args[0])
+
+
+def placeholder_response(request, process, thumbnail):
+    """Returns a placeholder for a plot which is still being rendered.  For
+    thumbnails, this is a blank SVG image; for PDFs, it is a page which reloads
+    itself until the plot is ready.
+
+    :param request: the current HTTP Request object
+    :param process: the process the plot of which is being rendered
+    :param thumbnail: whether a thumbnail was requested
+
+    :type request: HttpRequest
+    :type process: `samples.models.Process`
+    :type thumbnail: bool
+
+    :return:
+      the HTTP response object with the placeholder
+
+    :rtype: HttpResponse
+    """
+    if thumbnail:
+        response = HttpResponse(placeholder_thumbnail, content_type="image/svg+xml")
     else:
-        output.seek(0)
-        return output
+        response = render(request, "samples/plot_rendering.html", {"title": str(process)}, status=202)
+    response["Retry-After"] = "2"
+    add_never_cache_headers(response)
+    return response
 
 
 @login_required
@@ -87,16 +97,21 @@ def show_plot(request, process_id, plot_id, thumbnail):
     process = get_object_or_404(models.Process, pk=utils.convert_id_to_int(process_id))
     process = process.actual_instance
     permissions.assert_can_view_physical_process(request.user, process)
-    plot_filepath = process.calculate_plot_locations(plot_id)["thumbnail_file" if thumbnail else "plot_file"]
     datafile_name = process.get_datafile_name(plot_id)
     if datafile_name is None:
         raise Http404("No such plot available.")
-    timestamps = [] if thumbnail else [sample.last_modified for sample in process.samples.all()]
-    timestamps.append(process.last_modified)
     datafile_names = datafile_name if isinstance(datafile_name, list) else [datafile_name]
     if not all(filename.exists() for filename in datafile_names):
         raise Http404("One of the raw datafiles was not found.")
-    stream = get_cached_bytes_stream(plot_filepath, partial(generate_plot, process, plot_id, thumbnail, datafile_name),
-                                     datafile_names, timestamps)
-    return static_response(stream, None if thumbnail else process.get_plotfile_basename(plot_id) + ".pdf",
-                           mimetypes.guess_type(plot_filepath)[0])
+    served_filename = None if thumbnail else process.get_plotfile_basename(plot_id) + ".pdf"
+    content_type = "image/svg+xml" if thumbnail else "application/pdf"
+    path = get_plot_artefact_path(process, plot_id, thumbnail, datafile_names)
+    if plot_artefact_exists(path):
+        return blob_response(request, path, served_filename, content_type)
+    error = get_plot_error(path)
+    if error:
+        raise Http404(error)
+    if schedule_plot_rendering(process, plot_id, thumbnail, path):
+        return placeholder_response(request, process, thumbnail)
+    stream = get_cached_bytes_stream(path, partial(generate_plot, process, plot_id, thumbnail, datafile_name))
+    return static_response(stream, served_filename, content_type)
@@ -22,20 +22,21 @@
 # behavior of this function, keep in mind that you have to check the signal for
 # modification purposes.
 
-import os, datetime, subprocess
+import datetime
 from io import BytesIO
 from functools import partial
+import PIL.Image
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.db.models import Q
 import django.utils.timezone
-from django.http import HttpResponse
+from django.http import HttpResponseBase
 from django.shortcuts import render, get_object_or_404
 from django.utils.translation import gettext_lazy as _, gettext, pgettext_lazy
 from django.utils.text import capfirst
 from django.forms.utils import ValidationError
 import django.forms as forms
-from jb_common.utils.base import static_response, get_cached_bytes_stream, help_link
+from jb_common.utils.base import static_response, blob_response, get_cached_bytes_stream, help_link
 import jb_common.utils.base
 import jb_common.utils.blobs
 from samples import models, permissions
@@ -585,16 +586,24 @@ def show_image(request, process_id):
     result = get_object_or_404(models.Result, pk=utils.convert_id_to_int(process_id))
     permissions.assert_can_view_result_process(request.user, result)
     image_locations = result.get_image_locations()
-    return static_response(jb_common.utils.blobs.storage.open(image_locations["image_file"]),
-                           image_locations["sluggified_filename"])
+    return blob_response(request, image_locations["image_file"], image_locations["sluggified_filename"])
 
 
 def generate_thumbnail(result, image_filename):
-    image_file = jb_common.utils.blobs.storage.export(image_filename)
-    content = subprocess.check_output(["convert", str(image_file) + ("[0]" if result.image_type == "pdf" else ""),
-                                       "-resize", "{0}x{0}".format(settings.THUMBNAIL_WIDTH), "png:-"])
-    os.unlink(image_file)
-    return BytesIO(content)
+    content = b"".join(jb_common.utils.blobs.storage.iter_chunks(image_filename))
+    size = (settings.THUMBNAIL_WIDTH, settings.THUMBNAIL_WIDTH)
+    if result.image_type == "pdf":
+        return BytesIO(jb_common.utils.base.run_converter(
+            ["convert", "pdf:{input}[0]", "-resize", "{0}x{0}".format(settings.THUMBNAIL_WIDTH), "png:-"], content))
+    image = PIL.Image.open(BytesIO(content))
+    image.draft("RGB", size)
+    image.thumbnail(size)
+    if image.mode not in {"1", "L", "LA", "P", "RGB", "RGBA", "I"}:
+        image = image.convert("RGB")
+    output = BytesIO()
+    image.save(output, "PNG")
+    output.seek(0)
+    return output
 
 
 @login_required
@@ -647,7 +656,7 @@ def export(request, process_id):
     result = utils.table_export(request, data, _("row"))
     if isinstance(result, tuple):
         column_groups_form, columns_form, table, switch_row_forms, old_data_form = result
-    elif isinstance(result, HttpResponse):
+    elif isinstance(result, HttpResponseBase):
         return result
     title = _("Table export for “{name}”").format(name=data.descriptive_name)
     return render(request, "samples/table_export.html", {"title": title, "column_groups": column_groups_form,
@@ -34,7 +34,7 @@ import django.urls
 import django.forms as forms
 from django.core.cache import cache
 from django.db.models import Q
-from django.http import Http404, HttpResponse
+from django.http import Http404, HttpResponseBase
 from django.shortcuts import render, get_object_or_404
 from django.utils.translation import gettext_lazy as _, gettext, ngettext
 from django.views.decorators.http import condition
@@ -43,7 +43,8 @@ from django.forms.utils import ValidationError
 import jb_common.search
 from jb_common.signals import storage_changed
 from jb_common.utils.base import format_enumeration, unquote_view_parameters, HttpResponseSeeOther, is_json_requested, \
-    respond_in_json, get_all_models, mkdirs, cache_key_locked, get_from_cache, int_or_zero, help_link
+    respond_in_json, get_all_models, mkdirs, get_cache_generations, get_from_cache, get_many_from_cache, int_or_zero, \
+    help_link
 from jb_common.utils.views import UserField, TopicField
 from samples import models, permissions, data_tree
 import samples.utils.views as utils
@@ -303,11 +304,21 @@ class SamplesAndProcesses:
 
     :ivar process_lists: Data of child samples
 
+    :ivar generation: cache generation of the sample the process contexts are
+      up to date with
+
+    :ivar process_generations: cache generations of the processes the process
+      contexts were generated with
+
     :type process_lists: list of `SamplesAndProcesses`
 
     :type process_contexts: list of dict mapping str to ``object``
 
     :type process_ids: set of int
+
+    :type generation: int
+
+    :type process_generations: dict mapping int to int
     """
 
     @staticmethod
@@ -315,6 +326,9 @@ class SamplesAndProcesses:
         """Returns the data structure used in the template to display the
         sample with all its processes.
 
+        If the cached data structure is outdated, it is updated rather than
+        re-built from scratch.  See `update_process_contexts` for details.
+
         :param sample_name: the sample or alias of the sample to display
         :param user: the currently logged-in user
         :param post_data: the POST dictionary if it was an HTTP POST request, or
@@ -331,26 +345,26 @@ class SamplesAndProcesses:
         :rtype: `SamplesAndProcesses`
         """
         sample, clearance = utils.lookup_sample(sample_name, user, with_clearance=True)
-        cache_key = "sample:{0}-{1}".format(sample.pk, user.jb_user_details.get_data_hash())
+        generation_name = "sample:{0}".format(sample.pk)
+        generation = get_cache_generations([generation_name])[generation_name]
+        cache_key = "samples-and-processes:{0}-{1}".format(sample.pk, user.jb_user_details.get_data_hash())
         # The following ``10`` is the expectation value of the number of
         # processes.  To get accurate results, use
         # ``samples.processes.count()`` instead.  However, this would slow down
         # JuliaBase.
         samples_and_processes = get_from_cache(cache_key, hits=10)
         if samples_and_processes is None:
-            samples_and_processes = SamplesAndProcesses(sample, clearance, user, post_data)
-            keys_list_key = "sample-keys:{0}".format(sample.pk)
-            with cache_key_locked("sample-lock:{0}".format(sample.pk)):
-                keys = cache.get(keys_list_key, [])
-                keys.append(cache_key)
-                cache.set(keys_list_key, keys, settings.CACHES["default"].get("TIMEOUT", 300) + 10)
-                cache.set(cache_key, samples_and_processes)
+            samples_and_processes = SamplesAndProcesses(sample, clearance, user, post_data, generation)
+            cache.set(cache_key, samples_and_processes)
             samples_and_processes.remove_noncleared_process_contexts(user, clearance)
         else:
+            if samples_and_processes.generation != generation:
+                samples_and_processes.update_process_contexts(sample, user, generation)
+                cache.set(cache_key, samples_and_processes)
             samples_and_processes.personalize(user, clearance, post_data)
         return samples_and_processes
 
-    def __init__(self, sample, clearance, user, post_data):
+    def __init__(self, sample, clearance, user, post_data, generation):
         """Class constructor.
 
         :param sample: the sample to which the processes belong
@@ -359,59 +373,112 @@ class SamplesAndProcesses:
         :param user: the currently logged-in user
         :param post_data: the POST data if it was an HTTP POST request, and
             ``None`` otherwise
+        :param generation: the current cache generation of the sample
 
         :type sample: `samples.models.Sample`
         :type clearance: `samples.models.Clearance`
         :type user: django.contrib.auth.models.User
         :type post_data: QueryDict or NoneType
+        :type generation: int
         """
         # This will be filled with more, once child samples are displayed, too.
         self.sample_context = {"sample": sample}
         self.update_sample_context_for_user(user, clearance, post_data)
         self.process_contexts = []
-        self.process_ids = set()
-        def collect_process_contexts(local_context=None):
-            """Constructs the list of process context dictionaries.  This
-            internal helper function directly populates
-            ``self.process_contexts``.  It consists of three parts: First, we
-            ascend through the ancestors of the sample to the first parent.
-            Then, for every ancestor and for the sample itself, the relevant
-            processes are found in form of a QuerySet, paying attention to
-            a possible clearance and to the so-called “cutoff timestamps”.  And
-            finally, we iterate over the QuerySet and get the process
-            context dictionary, possibly from the cache.
-
-            :param local_context: Information about the current sample to
-                process.  This is important when we walk through the ancestors
-                and need to keep track of where we are currently.  In
-                particular, this is used for sample splits because they must
-                know which is the current sample, which is the main sample
-                which will be actually displayed etc.
-
-            :type local_context: dict mapping str to ``object``
-            """
-            if local_context is None:
-                local_context = self.sample_context.copy()
-                local_context.update({"original_sample": sample, "latest_descendant": None, "cutoff_timestamp": None})
-            split = local_context["sample"].split_origin
-            if split:
-                new_local_context = local_context.copy()
-                new_local_context["sample"] = split.parent
-                new_local_context["latest_descendant"] = local_context["sample"]
-                new_local_context["cutoff_timestamp"] = split.timestamp
-                collect_process_contexts(new_local_context)
-            processes = models.Process.objects. \
-                filter(Q(samples=local_context["sample"]) | Q(result__sample_series__samples=local_context["sample"])). \
-                distinct()
-            if local_context["cutoff_timestamp"]:
-                processes = processes.filter(timestamp__lte=local_context["cutoff_timestamp"])
-            for process in processes:
-                process_context = utils.digest_process(process, user, local_context)
-                self.process_contexts.append(process_context)
-                self.process_ids.add(process.id)
-        collect_process_contexts()
+        self.process_generations = {}
+        self.update_process_contexts(sample, user, generation)
         self.process_lists = []
 
+    def update_process_contexts(self, sample, user, generation):
+        """Brings the process contexts up to date with the database.  Process
+        contexts of processes which have not changed since the last call are
+        re-used.  Only new processes, and processes with a new cache generation,
+        are digested, and spliced into ``self.process_contexts`` at their
+        timestamp positions.  Process contexts of processes which don't belong
+        to the sample anymore are removed.
+
+        Note that the user-dependent fields of the sample context are not
+        updated here; call `personalize` for this.
+
+        :param sample: the current instance of the sample
+        :param user: the currently logged-in user
+        :param generation: the current cache generation of the sample
+
+        :type sample: `samples.models.Sample`
+        :type user: django.contrib.auth.models.User
+        :type generation: int
+        """
+        self.sample_context["sample"] = sample
+        def get_process_ids(sample, cutoff_timestamp=None):
+            """Returns the IDs of the processes of ``sample``, in chronological
+            order, up to ``cutoff_timestamp`` if given.
+            """
+            process_ids = models.Process.objects. \
+                filter(Q(samples=sample) | Q(result__sample_series__samples=sample)).distinct()
+            if cutoff_timestamp:
+                process_ids = process_ids.filter(timestamp__lte=cutoff_timestamp)
+            return list(process_ids.values_list("id", flat=True))
+        # First, we ascend through the ancestors of the sample to the first
+        # parent, and build the local contexts.  They contain information about
+        # the sample the processes belong to.  In particular, this is used for
+        # sample splits because they must know which is the current sample,
+        # which is the main sample which will be actually displayed etc.
+        own_local_context = self.sample_context.copy()
+        own_local_context.update({"original_sample": sample, "latest_descendant": None, "cutoff_timestamp": None})
+        local_context = own_local_context
+        ancestors = []
+        for split in sample.get_ancestor_splits():
+            local_context = local_context.copy()
+            local_context.update({"sample": split.parent, "latest_descendant": local_context["sample"],
+                                  "cutoff_timestamp": split.timestamp})
+            ancestors.append((split, local_context))
+        ancestors.reverse()
+        # Then, the processes of the ancestors up to the respective split are
+        # taken from the history cache if possible.  These histories are shared
+        # by all pieces of a split.
+        history_generations = get_cache_generations("sample-history:{0}".format(split.id) for split, __ in ancestors)
+        history_keys = {split.id: "sample-history:{0}.{1}".format(split.id, history_generations[
+            "sample-history:{0}".format(split.id)]) for split, __ in ancestors}
+        histories = get_many_from_cache(history_keys.values())
+        new_histories = {}
+        processes = []
+        for split, local_context in ancestors:
+            history_key = history_keys[split.id]
+            process_ids = histories.get(history_key)
+            if process_ids is None:
+                process_ids = new_histories[history_key] = get_process_ids(split.parent, split.timestamp)
+            processes.extend((process_id, local_context) for process_id in process_ids)
+        if new_histories:
+            cache.set_many(new_histories)
+        # And finally, the processes of the sample itself.
+        processes.extend((process_id, own_local_context) for process_id in get_process_ids(sample))
+        generations = get_cache_generations({"process:{0}".format(process_id) for process_id, __ in processes})
+        old_process_contexts = {(process_context["process"].id, process_context["sample"].pk): process_context
+                                for process_context in self.process_contexts}
+        new_process_generations = {process_id: generations["process:{0}".format(process_id)]
+                                   for process_id, __ in processes}
+        outdated_processes = [(process_id, local_context) for process_id, local_context in processes
+                              if (process_id, local_context["sample"].pk) not in old_process_contexts or
+                              self.process_generations.get(process_id) != new_process_generations[process_id]]
+        actual_instances = {process.id: process for process in models.Process.resolve_actual_instances(
+            models.Process.objects.filter(id__in={process_id for process_id, __ in outdated_processes}))}
+        new_process_contexts = iter(utils.digest_processes(
+            [(actual_instances[process_id], local_context) for process_id, local_context in outdated_processes],
+            user, generations))
+        outdated_processes = set((process_id, local_context["sample"].pk)
+                                 for process_id, local_context in outdated_processes)
+        self.process_contexts = []
+        for process_id, local_context in processes:
+            if (process_id, local_context["sample"].pk) in outdated_processes:
+                process_context = next(new_process_contexts)
+            else:
+                process_context = old_process_contexts[process_id, local_context["sample"].pk]
+                process_context.update(local_context)
+            self.process_contexts.append(process_context)
+        self.process_ids = {process_id for process_id, __ in processes}
+        self.process_generations = new_process_generations
+        self.generation = generation
+
     def update_sample_context_for_user(self, user, clearance, post_data):
         """Updates the sample data in this data structure according to the
         current user.  If the ``SamplesAndProcesses`` object was taken from the
@@ -442,7 +509,6 @@ class SamplesAndProcesses:
             else IsMySampleForm(post_data, prefix=str(sample.pk))
         self.sample_context.update({"is_my_sample_form": self.is_my_sample_form, "clearance": clearance})
         try:
-            # FixMe: calling get_allowed_processes is too expensive
             get_allowed_processes(self.user, sample)
             self.sample_context["can_add_process"] = True
         except permissions.PermissionError:
@@ -994,7 +1060,7 @@ def advanced_search(request):
                     export_result = utils.table_export(request, data_node, "")
                     if isinstance(export_result, tuple):
                         column_groups_form, columns_form, table, switch_row_forms, old_data_form = export_result
-                    elif isinstance(export_result, HttpResponse):
+                    elif isinstance(export_result, HttpResponseBase):
                         return export_result
             search_performed = True
         root_form = jb_common.search.SearchModelForm(
@@ -1034,7 +1100,7 @@ def export(request, sample_name):
     result = utils.table_export(request, data, _("process"))
     if isinstance(result, tuple):
         column_groups_form, columns_form, table, switch_row_forms, old_data_form = result
-    elif isinstance(result, HttpResponse):
+    elif isinstance(result, HttpResponseBase):
         return result
     title = _("Table export for “{name}”").format(name=data.descriptive_name)
     return render(request, "samples/table_export.html", {"title": title, "column_groups": column_groups_form,
@@ -27,7 +27,7 @@ import hashlib, datetime
 from django import forms
 from django.contrib.auth.decorators import login_required
 from django.forms.utils import ValidationError
-from django.http import HttpResponse
+from django.http import HttpResponseBase
 import django.utils.timezone
 from django.shortcuts import render, get_object_or_404
 from django.utils.translation import gettext_lazy as _, gettext, ngettext
@@ -236,7 +236,7 @@ def show(request, name):
     """
     sample_series = get_object_or_404(models.SampleSeries, name=name)
     permissions.assert_can_view_sample_series(request.user, sample_series)
-    result_processes = [utils.digest_process(result, request.user) for result in sample_series.results.all()]
+    result_processes = utils.digest_processes([(result, {}) for result in sample_series.results.all()], request.user)
     can_edit = permissions.has_permission_to_edit_sample_series(request.user, sample_series)
     can_add_result = permissions.has_permission_to_add_result_process(request.user, sample_series)
 
@@ -420,7 +420,7 @@ def export(request, name):
     result = utils.table_export(request, data, _("sample"))
     if isinstance(result, tuple):
         column_groups_form, columns_form, table, switch_row_forms, old_data_form = result
-    elif isinstance(result, HttpResponse):
+    elif isinstance(result, HttpResponseBase):
         return result
     title = _("Table export for “{name}”").format(name=data.descriptive_name)
     return render(request, "samples/table_export.html", {"title": title, "column_groups": column_groups_form,
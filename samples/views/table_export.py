@@ -52,8 +52,11 @@ The ``column_groups`` resembles the union of the nodes in all row trees,
 without duplicates.  So, the first row tree is walked through, and each of its
 nodes is put into the ``column_groups`` list directly.  Then, the next tree is
 scanned, but only *new* nodes (i.e., with a so-far unknown ``name``) are added,
-and so forth.  I try to make the order within ``column_groups`` senseful,
-however in theory, it doesn't matter really.
+and so forth.  A new node is inserted right after the column group of the node
+preceding it in its row tree, so that the order within ``column_groups`` is
+senseful.  However in theory, it doesn't matter really.  The known names are
+kept in a dictionary, and the order in a linked list, so that this takes linear
+time in the number of nodes.
 
 The second data structure for columns is simply called ``columns``, and it is
 built parallely to ``column_groups`` in `build_column_group_list`.  Whenever a
@@ -74,25 +77,43 @@ below).
 Generating the final table
 ..........................
 
-The last needed data structure is a list of all rows, generated by
-`flatten_tree`.  Every row is represented by a dictionary with str keys being
-names of column groups.  They are mapped to another dictionary mapping key
-names to values.  This list of rows is generated by `flatten_tree`.
+Every row tree is converted by `flatten_row_tree` into a dictionary with str
+keys being names of column groups.  They are mapped to another dictionary
+mapping key names to values.
 
 Finally we're ready to generate the table with `generate_table_rows`: For each
 row, the list of indices is used to find the value for the respective column by
 using the ``columns`` list, which contains a `Column` instance, which is able
 to retrieve the final table cell value through the `Column.get_value` method.
 
-This way, the table is represented by a list of rows, and each row a list of
-cells.  Every cell item is a Python object.  The zeroth row contains the
-headings (unicodes), the zeroth column the labels for the column (e.g., in case
-of exporting a sample series, the sample names, also unicodes).
+This way, the table is represented by an iterator over rows, and each row a
+list of cells.  Every cell item is a Python object.  The zeroth row contains
+the headings (unicodes), the zeroth column the labels for the column (e.g., in
+case of exporting a sample series, the sample names, also unicodes).
 
 This very simple data structure can be used directly to show a preview table in
 HTML, or to create the CSV data by sending it through an instance of an
 `csv.writer`.
 
+Two passes
+..........
+
+The row trees are walked through twice: once by `build_column_group_list`, and
+once by `generate_table_rows`.  Both passes keep only one row tree at a time.
+The first one retains only the node names and item keys, the second one turns
+every row into a table row right away.  Thus, if the row trees are created on
+the fly (see :py:class:`samples.data_tree.LazyChildren`), a table export can be
+streamed to the client with bounded memory, no matter how many rows it has.
+
+Besides the item keys, the first pass records the types of the item values.
+This way, `Column.get_value_type` knows the type of a column before the first
+row is generated, which is needed for typed output formats like Parquet.
+
+There is no xlsx output.  An xlsx file is a ZIP archive which the common
+writers (e.g. openpyxl) assemble in a file or in memory, so it could not be
+streamed with bounded memory like the other formats.  Spreadsheet programs
+can open the CSV or Parquet output instead.
+
 Making models fit for data export
 .................................
 
@@ -106,6 +127,7 @@ database model classes will show you how to use it (they are all very
 strightforward).
 """
 
+import datetime, decimal
 from django.forms.utils import ValidationError
 from django.utils.translation import gettext_lazy as _, gettext
 import django.forms as forms
@@ -119,10 +141,8 @@ class ColumnGroup:
     separation (e.g. by vertical lines) between column groups.
 
     Instances of this class will be in a list returned by
-    `build_column_group_list`.  This list serves two purposes: First, it is
-    used internally in ``build_column_group_list`` for avoiding inserting a
-    node name twice.  And secondly, it is used to create the multi selection
-    boxes in the HTML view for the user.
+    `build_column_group_list`.  This list is used to create the multi
+    selection boxes in the HTML view for the user.
 
     :ivar name: name of the column group which directly corresponds to the name
       of the respective `DataNode`.  It must never contain a TAB character
@@ -150,9 +170,8 @@ class ColumnGroup:
         return repr(self.name)
 
     def __eq__(self, other):
-        """Equation operator.  I need this function because in
-        `build_column_group_list`, I must be able to test easily whether a
-        given column group is contained in a given list.
+        """Equation operator.  Column groups are equal if they have the same
+        name.
 
         :param other: the instance to compare with
 
@@ -189,6 +208,11 @@ class Column:
       `key`, however, if this is ambiguous because another key in another
       column groups has the same name, it is made unique by appending ``" {node
       name}"`` to it.
+
+    :ivar value_types: the types of all values found for this column in the
+      first pass of the export, see `get_value_type`
+
+    :type value_types: set of type
     """
 
     def __init__(self, column_group_name, key):
@@ -203,6 +227,7 @@ class Column:
         """
         self.column_group_names = [column_group_name]
         self.key = self.heading = key
+        self.value_types = set()
 
     def append_name(self, column_group_name):
         """Append the name of a column group with a shared key.  If the
@@ -236,29 +261,79 @@ class Column:
         :type row: dict mapping str to dict mapping str to object
 
         :return:
-          the cell value of this column in the given row; ``None`` if the
-          respective column group is not available for the given row
+          the cell value of this column in the given row; ``""`` if the
+          respective column group or key is not available for the given row
 
         :rtype: object
         """
         for column_group_name in self.column_group_names:
             if column_group_name in row:
-                return row[column_group_name][self.key]
+                return row[column_group_name].get(self.key, "")
         return ""
 
+    def get_value_type(self):
+        """Return the common type of the values of this column.  Numbers of
+        different types are unified to ``float``.  If the values have no common
+        type that a typed table format can represent, their string
+        representations are exported, so ``str`` is returned.  Empty cells
+        don't count.
+
+        :return:
+          the type of the values of this column; one of ``bool``, ``int``,
+          ``float``, ``datetime.datetime``, ``datetime.date``, and ``str``
+
+        :rtype: type
+        """
+        value_types = self.value_types - {type(None)}
+        if len(value_types) == 1:
+            value_type = next(iter(value_types))
+            if value_type in {bool, int, float, datetime.datetime, datetime.date}:
+                return value_type
+        if value_types and value_types <= {int, float, decimal.Decimal}:
+            return float
+        return str
+
+
+def prepare_row_tree(row_tree):
+    """Makes the node names of a row tree unambiguous, see
+    :py:meth:`samples.data_tree.DataNode.find_unambiguous_names`.  This is
+    done only once for every tree, so that row trees which are walked through
+    in both passes keep their names.
+
+    :param row_tree: a top-level child of the ``DataNode`` tree
+
+    :type row_tree: `samples.data_tree.DataNode`
 
-def build_column_group_list(root):
+    :return:
+      the row tree
+
+    :rtype: `samples.data_tree.DataNode`
+    """
+    if not getattr(row_tree, "names_unambiguous", False):
+        row_tree.find_unambiguous_names(renaming_offset=0)
+        row_tree.names_unambiguous = True
+    return row_tree
+
+
+def build_column_group_list(row_trees):
     """Extract from the ``CVSNode`` tree the column group list and the column
     list.  The column group list can be used to show the user the columns in a
     structured form, and to export the data in ODF or Excel format.  The
     columns are used for any export, ODF, Excel, and CSV.
 
-    :param root: The root node of the ``DataNode`` tree.  It must be a complete
-        tree, i.e. the top-level children are considered the row tree.  The
-        node names must have been made unambiguous within a row tree already
-        using :py:meth:`samples.data_tree.DataNode.find_unambiguous_names`.
+    This is the first pass of the export.  The row trees are walked through
+    only once, and only the names and item keys of their nodes are kept.
+    Nodes with the same name may have different item keys (see
+    :py:meth:`samples.data_tree.DataNode.complete_items_in_children`), so the
+    columns of a column group are the keys of its first node, followed by the
+    keys found only in later nodes of the same name.
+
+    :param row_trees: The row trees, i.e. the top-level children of the
+        ``DataNode`` tree.  The node names must have been made unambiguous
+        within a row tree already using `prepare_row_tree`.  It may be an
+        iterator.
 
-    :type root: `DataNode`
+    :type row_trees: iterable of `DataNode`
 
     :return:
       the column groups, the column list
@@ -266,26 +341,30 @@ def build_column_group_list(root):
     :rtype: list of `ColumnGroup`, list of `Column`
     """
 
-    def walk_row_tree(node, top_level=True):
-        """Extract all node names from a ``DataNode`` tree.  This routine calls
-        itself recursively to walk through the tree.  Note that the inner order
-        of the nodes (e.g. the chronological order of processes) is preserved
-        by this method.
+    def walk_row_tree(row_tree):
+        """Extract all nodes from a ``DataNode`` tree.  Note that the inner
+        order of the nodes (e.g. the chronological order of processes) is
+        preserved by this method.
 
-        :param node: the root node of the (sub-)tree to be analysed
+        :param row_tree: the root node of the tree to be analysed
 
-        :type node: `DataNode`
+        :type row_tree: `DataNode`
 
         :return:
-          all node names
+          all nodes in depth-first order, each together with whether it is the
+          root of the row tree
 
-        :rtype: list of str
+        :rtype: iterator over (`DataNode`, bool)
         """
-        node.top_level = top_level
-        name_list = [node]
-        for child in node.children:
-            name_list.extend(walk_row_tree(child, top_level=False))
-        return name_list
+        yield row_tree, True
+        stack = [iter(row_tree.children)]
+        while stack:
+            for node in stack[-1]:
+                yield node, False
+                stack.append(iter(node.children))
+                break
+            else:
+                stack.pop()
 
     def disambig_key_names(columns):
         """Helper function for making all column headings unambiguous.  When
@@ -314,72 +393,101 @@ def build_column_group_list(root):
         for column in columns:
             if column.key in duplicates:
                 column.disambig()
-    columns = []
+    # Column groups in the order of their creation, together with the item
+    # keys of their first node and whether it is a top-level node.
+    new_column_groups = []
+    # Maps node names to the index of their column group in
+    # `new_column_groups`.
+    column_group_indices = {}
+    # The final order of the column groups is a linked list: It maps the index
+    # of a column group in `new_column_groups` to the index of the following
+    # one.  -1 is the head.
+    successors = {-1: None}
+    key_sets = {}
+    # Maps node names to dictionaries which map item keys to the types of the
+    # values.
+    value_types = {}
+    predecessor = -1
+    for row, row_tree in enumerate(row_trees):
+        for node, top_level in walk_row_tree(row_tree):
+            name = node.name
+            keys = [(item.key, item.origin) for item in node.items]
+            key_sets.setdefault(name, set()).update(keys)
+            node_value_types = value_types.setdefault(name, {})
+            for item in node.items:
+                node_value_types.setdefault(item.key, set()).add(type(item.value))
+            if row > 0 and name in column_group_indices:
+                predecessor = column_group_indices[name]
+            else:
+                index = len(new_column_groups)
+                new_column_groups.append((ColumnGroup(name), keys, top_level))
+                column_group_indices.setdefault(name, index)
+                successors[index] = successors[predecessor]
+                successors[predecessor] = index
+                predecessor = index
     column_groups = []
+    index = successors[-1]
+    while index is not None:
+        column_groups.append(new_column_groups[index][0])
+        index = successors[index]
+    columns = []
     shared_columns = {}
-    position = 0
-    for row, row_tree in enumerate(root.children):
-        for node in walk_row_tree(row_tree):
-            if row > 0 and node in column_groups:
-                position = column_groups.index(node)
-            else:
-                name = node.name
-                column_group = ColumnGroup(name)
-                i = len(columns)
-                for item in node.items:
-                    if node.top_level and item.origin:
-                        shared_key = (item.origin, item.key)
-                        if shared_key in shared_columns:
-                            column_group.key_indices[item.key] = shared_columns[shared_key]
-                            columns[shared_columns[shared_key]].append_name(name)
-                            continue
-                        else:
-                            shared_columns[shared_key] = i
-                    column_group.key_indices[item.key] = i
-                    columns.append(Column(name, item.key))
-                    i += 1
-                column_groups.insert(position, column_group)
-            position += 1
+    for column_group, keys, top_level in new_column_groups:
+        name = column_group.name
+        missing_keys = key_sets[name] - set(keys)
+        keys.extend(sorted(missing_keys, key=lambda key: (str(key[0]), key[1] or "")))
+        for key, origin in keys:
+            if top_level and origin:
+                shared_key = (origin, key)
+                if shared_key in shared_columns:
+                    column_group.key_indices[key] = shared_columns[shared_key]
+                    columns[shared_columns[shared_key]].append_name(name)
+                    columns[shared_columns[shared_key]].value_types.update(value_types[name][key])
+                    continue
+                else:
+                    shared_columns[shared_key] = len(columns)
+            column_group.key_indices[key] = len(columns)
+            column = Column(name, key)
+            column.value_types.update(value_types[name][key])
+            columns.append(column)
     disambig_key_names(columns)
     return column_groups, columns
 
 
-def flatten_tree(root):
-    """Walk through a ``DataNode`` tree and convert it to a list of nested
-    dictionaries for easy cell value lookup.  The resulting data structure is
-    used in :py:meth:`Column.get_value`.
+def flatten_row_tree(row_tree):
+    """Convert a row tree to nested dictionaries for easy cell value lookup.
+    The resulting data structure is used in :py:meth:`Column.get_value`.
 
-    :param root: The root node of the ``DataNode`` tree.  It must be a complete
-        tree, i.e. the top-level children are considered the row tree.  The
-        node names must have been made unambiguous within a row tree already
-        using `DataNode.find_unambiguous_names`.
+    :param row_tree: A top-level child of the ``DataNode`` tree.  The node
+        names must have been made unambiguous already using
+        `prepare_row_tree`.
 
-    :type root: `samples.data_tree.DataNode`
+    :type row_tree: `samples.data_tree.DataNode`
 
     :return:
-      list of all rows containg a dictionary mapping node names (loosely
-      corresponding to column group names) to dictionaries mapping key names to
-      cell values
+      dictionary mapping node names (loosely corresponding to column group
+      names) to dictionaries mapping key names to cell values
 
-    :rtype: list of dictionary mapping str to dictionary mapping str to str
+    :rtype: dict mapping str to dict mapping str to object
     """
+    name_dict = {row_tree.name: {item.key: item.value if item.value is not None else "" for item in row_tree.items}}
+    for child in row_tree.children:
+        name_dict.update(flatten_row_tree(child))
+    return name_dict
 
-    def flatten_row_tree(node):
-        name_dict = {node.name: {item.key: item.value if item.value is not None else "" for item in node.items}}
-        for child in node.children:
-            name_dict.update(flatten_row_tree(child))
-        return name_dict
 
-    return [flatten_row_tree(row) for row in root.children]
-
-
-def generate_table_rows(flattened_tree, columns, selected_key_indices, label_column, label_column_heading):
+def generate_table_rows(row_trees, columns, selected_key_indices, label_column, label_column_heading):
     """Generate the final table suited for CSV export and HTML preview.  Note
     that for ODF or Excel output, you should also take the column group list
     into account for better formatting.
 
-    :param flattened_tree: the transformed tree as constructed by
-        `flatten_tree`.
+    This is the second pass of the export.  Every row tree is converted into a
+    table row as soon as it is read from `row_trees`.
+
+    :param row_trees: The row trees, i.e. the top-level children of the
+        ``DataNode`` tree.  The node names must have been made unambiguous
+        within a row tree already using `prepare_row_tree`.  It may be an
+        iterator.
     :param columns: list of columns as constructed by `build_column_group_list`
     :param selected_key_indices: list of the column indices which the user
         selected for output
@@ -397,29 +505,28 @@ def generate_table_rows(flattened_tree, columns, selected_key_indices, label_col
         rows are the samples of the series, and their names are printed in the
         first column.
 
-    :type flattened_tree: list of dictionary mapping str to dictionary mapping
-      str to str
+    :type row_trees: iterable of `samples.data_tree.DataNode`
     :type columns: list of `Column`
     :type selected_key_indices: list of int
     :type label_column: list of str
     :type label_column_heading: str
 
     :return:
-      The table as a nested list.  The outer list are the rows, the inner the
-      columns.  Each cell is a string.
+      The table as an iterator over the rows.  Each row is a list of cells.
+      The first row contains the headings.
 
-    :rtype: list of list of object
+    :rtype: iterator over list of object
     """
     generate_label_column = any(label_column)
     head_row = [label_column_heading] if generate_label_column else []
     head_row.extend([str(columns[key_index].heading) for key_index in selected_key_indices])
-    table_rows = [head_row]
-    for i, row in enumerate(flattened_tree):
+    yield head_row
+    for i, row_tree in enumerate(row_trees):
+        row = flatten_row_tree(row_tree)
         table_row = [label_column[i]] if generate_label_column else []
         for key_index in selected_key_indices:
             table_row.append(columns[key_index].get_value(row))
-        table_rows.append(table_row)
-    return table_rows
+        yield table_row
 
 
 class ColumnGroupsForm(forms.Form):
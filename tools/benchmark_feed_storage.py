@@ -0,0 +1,68 @@
+# This file is part of JuliaBase, see http://www.juliabase.org.
+# Copyright © 2008–2022 Forschungszentrum Jülich GmbH, Jülich, Germany
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Compares the two storage modes of feed entries, see the setting
+``FEED_FAN_OUT_ON_READ``.  It creates a throw-away test database with the
+given number of users watching one sample, reports changes of this sample, and
+measures the costs of writing the entries and of reading one user's feed.  Call
+it from the JuliaBase root directory like this::
+
+    python tools/benchmark_feed_storage.py 1000
+"""
+
+import sys, os, timeit
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings_test")
+import django
+django.setup()
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import override_settings
+from samples import models
+from samples.utils.views import Reporter
+from samples.views.feed import get_feed_entries
+
+
+number_of_watchers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+number_of_reports = 100
+old_database_name = connection.settings_dict["NAME"]
+connection.creation.create_test_db(verbosity=0, autoclobber=True)
+try:
+    call_command("loaddata", "test_main", verbosity=0)
+    originator = User.objects.get(username="juliabase")
+    sample = models.Sample.objects.filter(topic__isnull=False)[0]
+    watchers = [User.objects.create(username="watcher{}".format(i)) for i in range(number_of_watchers)]
+    sample.topic.members.add(*watchers)
+    sample.watchers.add(*watchers)
+    reader = User.objects.get(username="watcher0")
+    print("{} watchers, {} reports:".format(number_of_watchers, number_of_reports))
+    for fan_out_on_read in (False, True):
+        with override_settings(FEED_FAN_OUT_ON_READ=fan_out_on_read):
+            models.FeedEntry.objects.all().delete()
+            queries = []
+            with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+                writing_time = timeit.timeit(lambda: Reporter(originator).report_edited_samples(
+                    [sample], {"description": "edited", "important": True}), number=number_of_reports)
+            rows = models.FeedEntry.users.through.objects.count() + models.FeedAudience.objects.count()
+            assert len(get_feed_entries(reader, 50)) == 50
+            reading_time = min(timeit.repeat(lambda: get_feed_entries(reader, 50), number=1, repeat=5))
+            print("  {:<20} writing: {:8.2f} ms/report, {:6.1f} queries/report, {:7} rows; reading: {:8.2f} ms".format(
+                "fan-out on read" if fan_out_on_read else "fan-out on write", writing_time / number_of_reports * 1000,
+                len(queries) / number_of_reports, rows, reading_time * 1000))
+finally:
+    connection.creation.destroy_test_db(old_database_name, verbosity=0)
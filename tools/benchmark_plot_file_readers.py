@@ -0,0 +1,71 @@
+# This file is part of JuliaBase, see http://www.juliabase.org.
+# Copyright © 2008–2022 Forschungszentrum Jülich GmbH, Jülich, Germany
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Compares the NumPy-based datafile readers in ``samples.utils.plots`` with
+the former line-by-line implementation.  Call it from the JuliaBase root
+directory like this::
+
+    python tools/benchmark_plot_file_readers.py 1000000
+"""
+
+import sys, os, codecs, tempfile, timeit
+import numpy
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
+import django
+django.setup()
+from samples.utils.plots import read_plot_file_beginning_at_line_number
+
+
+def read_line_by_line(filename, columns, start_line_number, separator=None):
+    result = [[] for i in range(len(columns))]
+    with codecs.open(filename, encoding="cp1252") as datafile:
+        for line_number, line in enumerate(datafile, start=1):
+            if line_number < start_line_number or not line.strip():
+                continue
+            cells = line.strip().split(separator)
+            for column, result_array in zip(columns, result):
+                try:
+                    value = float(cells[column].replace(",", "."))
+                except ValueError:
+                    value = float("nan")
+                result_array.append(value)
+    return result
+
+
+number_of_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+numpy.random.seed(8765432)
+with tempfile.NamedTemporaryFile("w", suffix=".dat", encoding="cp1252", delete=False) as datafile:
+    datafile.write("Sample: 14-JS-1\nenergy/eV\tabsorption/cm^-1\tdeviation\n")
+    data = numpy.random.sample((number_of_rows, 3))
+    numpy.savetxt(datafile, data, "%.6f", delimiter="\t")
+    filename = datafile.name
+try:
+    reference = read_line_by_line(filename, [0, 1], 3, "\t")
+    for memory_map in (False, True):
+        result = read_plot_file_beginning_at_line_number(filename, [0, 1], 3, separator="\t", memory_map=memory_map)
+        assert all(numpy.array_equal(column, reference_column) for column, reference_column in zip(result, reference))
+    repetitions = 3
+    timings = {"line by line": lambda: read_line_by_line(filename, [0, 1], 3, "\t"),
+               "NumPy": lambda: read_plot_file_beginning_at_line_number(filename, [0, 1], 3, separator="\t"),
+               "NumPy, memory-mapped": lambda: read_plot_file_beginning_at_line_number(
+                   filename, [0, 1], 3, separator="\t", memory_map=True)}
+    print("{} rows, best of {}:".format(number_of_rows, repetitions))
+    for label, reader in timings.items():
+        print("  {:<22} {:8.3f} s".format(label, min(timeit.repeat(reader, number=1, repeat=repetitions))))
+finally:
+    os.unlink(filename)
@@ -0,0 +1,91 @@
+# This file is part of JuliaBase, see http://www.juliabase.org.
+# Copyright © 2008–2022 Forschungszentrum Jülich GmbH, Jülich, Germany
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Measures the table export of synthetic ``DataNode`` trees with 10², 10³,
+and 10⁴ rows, see :py:mod:`samples.views.table_export`.  Every row is a sample
+with a random process history, so that the number of column groups grows with
+the number of rows, as it does for big sample series.  Lab notebooks are
+modelled by rows which are single processes.  No database is needed.  Call it
+from the JuliaBase root directory like this::
+
+    python tools/benchmark_table_export.py [maximal number of rows]
+"""
+
+import sys, os, random, timeit
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings_test")
+import django
+django.setup()
+from samples.data_tree import DataNode, DataItem
+from samples.views.table_export import prepare_row_tree, build_column_group_list, generate_table_rows
+
+
+process_names = ["5-chamber deposition", "cluster tool deposition", "PDS measurement", "solarsimulator measurement",
+                 "layer thickness measurement", "structuring", "substrate"]
+
+
+def create_process_node(random_, name):
+    node = DataNode(name)
+    node.items = [DataItem("timestamp", "2020-01-01 12:00:00", "process"), DataItem("operator", "juliabase", "process")]
+    node.items.extend(DataItem("{} value {}".format(name, i), random_.random()) for i in range(5))
+    if "deposition" in name:
+        for number in range(random_.randint(1, 4)):
+            layer = DataNode("layer", "layer {}".format(number))
+            layer.items = [DataItem("number", number), DataItem("thickness", random_.random())]
+            node.children.append(layer)
+    return node
+
+
+def create_sample_rows(number_of_rows):
+    random_ = random.Random(number_of_rows)
+    rows = []
+    for i in range(number_of_rows):
+        row = DataNode("sample", "sample {}".format(i))
+        row.items = [DataItem("name", "sample {}".format(i)), DataItem("topic", "topic {}".format(i % 10))]
+        # Varying histories lead to many column groups like “PDS measurement
+        # #7”.
+        row.children = [create_process_node(random_, random_.choice(process_names))
+                        for j in range(random_.randint(1, 30))]
+        rows.append(row)
+    return rows
+
+
+def create_lab_notebook_rows(number_of_rows):
+    random_ = random.Random(number_of_rows)
+    return [create_process_node(random_, "5-chamber deposition") for i in range(number_of_rows)]
+
+
+def export(rows):
+    for row in rows:
+        prepare_row_tree(row)
+    column_groups, columns = build_column_group_list(iter(rows))
+    label_column = [row.descriptive_name for row in rows]
+    for table_row in generate_table_rows(rows, columns, list(range(len(columns))), label_column, "sample"):
+        pass
+    return column_groups, columns
+
+
+maximal_number_of_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+number_of_rows = 100
+while number_of_rows <= maximal_number_of_rows:
+    for kind, create_rows in (("sample series", create_sample_rows), ("lab notebook", create_lab_notebook_rows)):
+        trees = [create_rows(number_of_rows) for i in range(3)]
+        column_groups, columns = export(create_rows(number_of_rows))
+        time = min(timeit.repeat(lambda: export(trees.pop()), number=1, repeat=3))
+        print("{:>6} rows, {:<14} {:5} column groups, {:6} columns: {:9.1f} ms".format(
+            number_of_rows, kind + ",", len(column_groups), len(columns), time * 1000))
+    number_of_rows *= 10
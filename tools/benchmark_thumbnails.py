@@ -0,0 +1,92 @@
+# This file is part of JuliaBase, see http://www.juliabase.org.
+# Copyright © 2008–2022 Forschungszentrum Jülich GmbH, Jülich, Germany
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Measures latency and memory usage of result thumbnails, comparing the
+in-process Pillow pipeline with ImageMagick's ``convert`` as a subprocess.  PDF
+thumbnails are measured through ``run_converter`` only.  Measurements which
+need ``convert`` are skipped if it is not installed.  Call it from the
+JuliaBase root directory like this::
+
+    python tools/benchmark_thumbnails.py
+"""
+
+import sys, os, shutil, subprocess, tempfile, time, resource
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
+import django
+django.setup()
+import numpy, PIL.Image
+from reportlab.pdfgen.canvas import Canvas
+from django.conf import settings
+from jb_common.utils import blobs
+from jb_common.utils.blobs.backends import Filesystem
+from samples.views.result import generate_thumbnail
+
+
+def max_rss(who):
+    """Returns the maximal resident set size in MiB.
+    """
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def measure(label, function, who, repetitions=5):
+    timings = []
+    for i in range(repetitions):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    print("  {:<34} {:8.1f} ms   max. RSS {:7.1f} MiB".format(label, 1000 * min(timings), max_rss(who)))
+
+
+root = tempfile.mkdtemp()
+storage = Filesystem(Path(root))
+numpy.random.seed(8765432)
+image = PIL.Image.fromarray(numpy.random.randint(0, 256, (3000, 4000, 3), dtype=numpy.uint8))
+for image_type in ("jpeg", "png"):
+    image.save(os.path.join(root, "0." + image_type))
+del image
+pdf = BytesIO()
+canvas = Canvas(pdf)
+canvas.drawString(100, 700, "JuliaBase")
+canvas.showPage()
+canvas.save()
+with open(os.path.join(root, "0.pdf"), "wb") as pdf_file:
+    pdf_file.write(pdf.getvalue())
+has_convert = shutil.which("convert") is not None
+try:
+    with mock.patch.object(blobs, "storage", storage):
+        for image_type in ("jpeg", "png", "pdf"):
+            print("{}:".format(image_type.upper()))
+            filename = "0." + image_type
+            if image_type != "pdf":
+                measure("Pillow, in process", lambda: generate_thumbnail(SimpleNamespace(image_type=image_type), filename),
+                        resource.RUSAGE_SELF)
+            elif has_convert:
+                measure("run_converter", lambda: generate_thumbnail(SimpleNamespace(image_type=image_type), filename),
+                        resource.RUSAGE_CHILDREN)
+            if has_convert:
+                measure("convert, subprocess with file", lambda: subprocess.check_output(
+                    ["convert", os.path.join(root, filename) + ("[0]" if image_type == "pdf" else ""),
+                     "-resize", "{0}x{0}".format(settings.THUMBNAIL_WIDTH), "png:-"]), resource.RUSAGE_CHILDREN)
+    if not has_convert:
+        print("ImageMagick's convert was not found; subprocess measurements were skipped.")
+finally:
+    shutil.rmtree(root)